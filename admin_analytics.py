@@ -1,14 +1,39 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import json
 from pathlib import Path
 from mongodb.analytics import get_analytics_data
 from llm import agents
-from mongodb.clustering_pipeline import run_clustering_pipeline
+from mongodb import jobs, cluster_store
 from mongodb.analytics import get_analytics_data
 import sys
 BASE_DIR = Path(__file__).resolve().parent
+JOB_POLL_SECONDS = 2
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def clustering_job_progress(job_id: str):
+    """Polls the running theme update and reloads the page once it ends."""
+    job = jobs.get_job(job_id)
+    if job and job["state"] in ("queued", "running") and jobs.get_running_job("clustering"):
+        st.progress(job.get("progress", 0.0), text=job.get("message", ""))
+        return
+    st.rerun(scope="app")
+
+
+def clustering_job_status():
+    job = jobs.get_latest_job("clustering")
+    if job is None:
+        return
+    if job["state"] in ("queued", "running"):
+        if jobs.get_running_job("clustering"):
+            clustering_job_progress(str(job["_id"]))
+        else:
+            st.warning("The last theme update stopped responding. Start a new one.")
+    elif job["state"] == "failed":
+        st.error(f"Last theme update failed: {job.get('message')}")
+    else:
+        st.caption(f"Themes last updated {job['finished_at']:%Y-%m-%d %H:%M} UTC")
 
 
 def admin_analytics_tab():
@@ -120,7 +145,7 @@ def admin_analytics_tab():
         
         
         if "block_summaries" not in st.session_state:
-            st.session_state.block_summaries = None
+            st.session_state.block_summaries = agents.get_cached_block_summaries()
         if "page_blocks" not in st.session_state:
             st.session_state.page_blocks = 0
             
@@ -128,7 +153,7 @@ def admin_analytics_tab():
 
         if st.button("📈 Generate Summaries"):
             with st.spinner("Analyzing complaints across all blocks..."):
-                st.session_state.block_summaries = agents.summarize_block_issues()
+                st.session_state.block_summaries = agents.refresh_block_summaries()
                 st.session_state.page_blocks = 0
                 
         if st.session_state.block_summaries:
@@ -188,7 +213,6 @@ def admin_analytics_tab():
 
         st.markdown("---")
         
-        json_path = BASE_DIR / "mongodb" / "clusters.json"
 
         col1, col2 = st.columns([4, 1])
         
@@ -198,79 +222,94 @@ def admin_analytics_tab():
 
         with col2:
             st.write("") 
+            full_refit = st.checkbox("Full refit", help="Re-cluster every complaint instead of adding new ones to the existing themes.")
             if st.button("Update Themes"):
-                with st.spinner("Analyzing complaints to identify new themes... This process may take a few minutes."):
-                    try:
-                        run_clustering_pipeline()
-                        st.success("Themes updated successfully!")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error updating themes: {str(e)}")
+                try:
+                    if not jobs.start_job("clustering", {"force_refit": full_refit})["started"]:
+                        st.info("Themes are already being updated.")
+                except Exception as e:
+                    st.error(f"Error updating themes: {str(e)}")
+            clustering_job_status()
 
-        if json_path.exists():
-            try:
-                with open(json_path, "r") as f:
-                    clusters = json.load(f)
-                
-                if not clusters:
-                    st.warning("No clusters found in the file.")
-                else:
-                    ITEMS_PER_PAGE_CLUSTERS = 8
-                    if "page_clusters" not in st.session_state:
-                        st.session_state.page_clusters = 0
-                    
-                    total_pages_c = max(1, (len(clusters) + ITEMS_PER_PAGE_CLUSTERS - 1) // ITEMS_PER_PAGE_CLUSTERS)
-                    
-                    if st.session_state.page_clusters >= total_pages_c:
-                         st.session_state.page_clusters = total_pages_c - 1
-                    
-                    start_c = st.session_state.page_clusters * ITEMS_PER_PAGE_CLUSTERS
-                    end_c = start_c + ITEMS_PER_PAGE_CLUSTERS
-                    current_clusters = clusters[start_c:end_c]
-
-                    cols = st.columns(2)
-                    for i, cluster in enumerate(current_clusters):
-                        with cols[i % 2]:
-                            with st.container():
-                                st.markdown(
-                                    f"""
-                                    <div style="
-                                        border: 1px solid #e0e0e0;
-                                        border-radius: 12px;
-                                        padding: 20px;
-                                        margin-bottom: 20px;
-                                        background-color: #ffffff;
-                                        box-shadow: 0 4px 6px rgba(0,0,0,0.05);
-                                        height: 100%;
-                                        transition: transform 0.2s;
-                                    ">
-                                        <h4 style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; color: #1e293b; font-size: 1.1rem; border-bottom: 2px solid #f1f5f9; padding-bottom: 10px;'>
-                                            {cluster['cluster_name']}
-                                            <span style='background-color: #e2e8f0; color: #475569; padding: 4px 10px; border-radius: 20px; font-size: 0.75em; font-weight: 600;'>
-                                                {cluster['count']} complaints
-                                            </span>
-                                        </h4>
-                                        <p style='color: #475569; font-size: 0.95rem; line-height: 1.6; margin: 0;'>
-                                            {cluster['cluster_summary']}
-                                        </p>
-                                    </div>
-                                    """,
-                                    unsafe_allow_html=True
-                                )
-                    
-                    
-                    if total_pages_c > 1:
-                        c1, c2, c3 = st.columns([1, 2, 1])
-                        with c1:
-                            if st.button("Previous", key="prev_clusters", disabled=st.session_state.page_clusters==0):
-                                st.session_state.page_clusters -= 1
-                                st.rerun()
-                        with c3:
-                            if st.button("Next", key="next_clusters", disabled=st.session_state.page_clusters==total_pages_c-1):
-                                st.session_state.page_clusters += 1
-                                st.rerun()
-                        st.caption(f"Page {st.session_state.page_clusters + 1} of {total_pages_c}")
-            except Exception as e:
-                st.error(f"Error reading clusters file: {str(e)}")
+        run = cluster_store.get_current_run()
+        if run is None:
+            st.warning("No themes found. Please click 'Update Themes' to generate.")
+        elif not run["complaint_count"]:
+            st.warning("No clusters found in the last run.")
         else:
-            st.warning("Clusters file not found. Please click 'Update Themes' to generate.")
\ No newline at end of file
+            ITEMS_PER_PAGE_CLUSTERS = 8
+            if "page_clusters" not in st.session_state:
+                st.session_state.page_clusters = 0
+
+            total_clusters = run["cluster_count"] + (1 if run["noise_count"] else 0)
+            total_pages_c = max(1, (total_clusters + ITEMS_PER_PAGE_CLUSTERS - 1) // ITEMS_PER_PAGE_CLUSTERS)
+
+            if st.session_state.page_clusters >= total_pages_c:
+                 st.session_state.page_clusters = total_pages_c - 1
+
+            page_clusters_list = cluster_store.get_clusters_page(
+                run["_id"], st.session_state.page_clusters, ITEMS_PER_PAGE_CLUSTERS
+            )
+
+            cols = st.columns(2)
+            for i, cluster in enumerate(page_clusters_list):
+                with cols[i % 2]:
+                    with st.container():
+                        st.markdown(
+                            f"""
+                            <div style="
+                                border: 1px solid #e0e0e0;
+                                border-radius: 12px;
+                                padding: 20px;
+                                margin-bottom: 20px;
+                                background-color: #ffffff;
+                                box-shadow: 0 4px 6px rgba(0,0,0,0.05);
+                                height: 100%;
+                                transition: transform 0.2s;
+                            ">
+                                <h4 style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; color: #1e293b; font-size: 1.1rem; border-bottom: 2px solid #f1f5f9; padding-bottom: 10px;'>
+                                    {cluster['cluster_name']}
+                                    <span style='background-color: #e2e8f0; color: #475569; padding: 4px 10px; border-radius: 20px; font-size: 0.75em; font-weight: 600;'>
+                                        {cluster['count']} complaints
+                                    </span>
+                                </h4>
+                                <p style='color: #475569; font-size: 0.95rem; line-height: 1.6; margin: 0;'>
+                                    {cluster['cluster_summary']}
+                                </p>
+                            </div>
+                            """,
+                            unsafe_allow_html=True
+                        )
+
+
+            if total_pages_c > 1:
+                c1, c2, c3 = st.columns([1, 2, 1])
+                with c1:
+                    if st.button("Previous", key="prev_clusters", disabled=st.session_state.page_clusters==0):
+                        st.session_state.page_clusters -= 1
+                        st.rerun()
+                with c3:
+                    if st.button("Next", key="next_clusters", disabled=st.session_state.page_clusters==total_pages_c-1):
+                        st.session_state.page_clusters += 1
+                        st.rerun()
+                st.caption(f"Page {st.session_state.page_clusters + 1} of {total_pages_c}")
+
+            history = cluster_store.get_run_history()
+            if len(history) > 1:
+                with st.expander("Theme history"):
+                    st.dataframe(pd.DataFrame([
+                        {
+                            "Version": r["version"],
+                            "Completed (UTC)": r["completed_at"].strftime("%Y-%m-%d %H:%M"),
+                            "Mode": r["mode"],
+                            "Themes": r["cluster_count"],
+                            "Complaints": r["complaint_count"],
+                            "Uncategorized": r["noise_count"],
+                            "Summaries reused": r.get("stats", {}).get("reused", 0)
+                        }
+                        for r in history
+                    ]), hide_index=True, use_container_width=True)
+                    st.caption(f"Theme sizes, version {history[1]['version']} → {history[0]['version']}")
+                    st.dataframe(pd.DataFrame(cluster_store.compare_runs(history[1], history[0])).rename(
+                        columns={"cluster_name": "Theme", "old": f"v{history[1]['version']}", "new": f"v{history[0]['version']}"}
+                    ), hide_index=True, use_container_width=True)
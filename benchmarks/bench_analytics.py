@@ -0,0 +1,85 @@
+"""
+Compares the old client-side analytics path (fetch every document, count
+in Python) with the $facet aggregation in mongodb.analytics.
+
+    python -m benchmarks.bench_analytics [sizes...] [--dims N]
+
+Uses the MongoDB at BENCH_MONGO_URL when set, otherwise an in-memory
+mongomock collection. mongomock evaluates aggregations in Python, so its
+"speedup" column is meaningless (the $facet path is usually slower there);
+only BENCH_MONGO_URL timings say anything about the server-side win.
+Against mongomock the sizes are capped at MONGOMOCK_MAX_DOCS and the
+documents carry no embeddings unless --dims is given; against a real
+server they carry full-size ones, whose transfer the old path paid for.
+"""
+import os
+import sys
+import time
+
+from mongodb import analytics
+from mongodb.handlers import COMPLAINT_VIEWS
+from benchmarks.synthetic import load_collection
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+MONGOMOCK_SIZES = [1_000, 10_000]
+MONGOMOCK_MAX_DOCS = 20_000
+FULL_DIMS = 3072
+
+
+def get_collection():
+    url = os.getenv("BENCH_MONGO_URL")
+    if url:
+        from pymongo import MongoClient
+        return MongoClient(url)["civipulse_bench"]["complaints"]
+    import mongomock
+    return mongomock.MongoClient()["civipulse_bench"]["complaints"]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    real_server = bool(os.getenv("BENCH_MONGO_URL"))
+    dims = FULL_DIMS if real_server else 0
+    if "--dims" in argv:
+        i = argv.index("--dims")
+        dims = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    sizes = [int(a) for a in argv] or (DEFAULT_SIZES if real_server else MONGOMOCK_SIZES)
+    if not real_server:
+        skipped = [n for n in sizes if n > MONGOMOCK_MAX_DOCS]
+        if skipped:
+            print(f"[WARNING] Skipping {skipped}: mongomock is capped at {MONGOMOCK_MAX_DOCS} documents; set BENCH_MONGO_URL.")
+        sizes = [n for n in sizes if n <= MONGOMOCK_MAX_DOCS]
+        print("[INFO] mongomock run: timings only check that both paths agree, not which is faster.")
+
+    collection = get_collection()
+    analytics.complaints_collection = collection
+
+    print(f"{'docs':>10} {'old (s)':>10} {'view (s)':>10} {'facet (s)':>10} {'speedup':>8}")
+    for n in sizes:
+        load_collection(collection, n, dims)
+
+        old, old_time = timed(
+            lambda: analytics.compute_analytics_from_documents(list(collection.find({})))
+        )
+        _, view_time = timed(
+            lambda: analytics.compute_analytics_from_documents(
+                list(collection.find({}, COMPLAINT_VIEWS["analytics"]))
+            )
+        )
+        new, new_time = timed(analytics.get_analytics_data)
+
+        if old["total_complaints"] != new["total_complaints"]:
+            print(f"[WARNING] Totals differ at {n}: {old['total_complaints']} vs {new['total_complaints']}")
+
+        print(f"{n:>10} {old_time:>10.3f} {view_time:>10.3f} {new_time:>10.3f} {old_time / max(new_time, 1e-9):>7.1f}x")
+
+    collection.drop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
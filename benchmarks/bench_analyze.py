@@ -0,0 +1,54 @@
+"""
+Per-complaint latency of analyze_complaint (classification and embedding
+issued concurrently) against running the two calls back to back, using
+the offline stub client with configurable delays.
+
+    python -m benchmarks.bench_analyze [--classify-delay 1.2] [--embed-delay 0.4] [--n 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ["GEMINI_USE_STUB"] = "1"
+
+from llm import agents, chat
+
+
+def sample_payload(i: int) -> dict:
+    return {
+        "resident_name": f"Resident {i}",
+        "block": "A1",
+        "description": f"Water supply has been irregular for the past week (ref {i})."
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classify-delay", type=float, default=1.2)
+    parser.add_argument("--embed-delay", type=float, default=0.4)
+    parser.add_argument("--n", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    client = chat.client
+    client.generate_delay = args.classify_delay
+    client.embed_delay = args.embed_delay
+
+    start = time.perf_counter()
+    for i in range(args.n):
+        payload = sample_payload(i)
+        agents.build_analysis(payload, agents.classify_complaint(payload), chat.embed_generator(payload["description"]))
+    sequential = (time.perf_counter() - start) / args.n
+
+    start = time.perf_counter()
+    for i in range(args.n, 2 * args.n):
+        agents.analyze_complaint(sample_payload(i))
+    concurrent = (time.perf_counter() - start) / args.n
+
+    print(f"classify={args.classify_delay}s embed={args.embed_delay}s")
+    print(f"sequential: {sequential:.3f}s per complaint (expected ~{args.classify_delay + args.embed_delay:.2f}s)")
+    print(f"concurrent: {concurrent:.3f}s per complaint (expected ~{max(args.classify_delay, args.embed_delay):.2f}s)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+"""
+Wall-clock time to summarize clusters: the previous sequential loop (one
+request, then a fixed 2 s sleep) against _build_output, which sends the
+requests through llm.scheduler in parallel. Uses the offline stub client.
+A second _build_output run, after a few clusters gained a member, shows
+the LLM calls saved by the membership cache (mongodb.cluster_summaries).
+
+    python -m benchmarks.bench_cluster_summaries [--clusters 12] [--delay 0.5] [--quota 30]
+
+--quota makes the stub reject calls beyond that many per minute with a 429
+carrying a retryDelay, which the scheduler waits out instead of failing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ["GEMINI_USE_STUB"] = "1"
+
+from llm.llm_client import gemini_client
+from llm.prompts import CLUSTER_SUMMARY_PROMPT
+from llm.scheduler import LLMScheduler
+from benchmarks.bench_analytics import get_collection
+from mongodb import clustering_pipeline, cluster_summaries
+
+RESPONSE = '{"cluster_name": "Stub theme", "cluster_summary": "Stub summary."}'
+LEGACY_SLEEP = 2
+
+
+def synthetic_clusters(n: int, size: int = 10) -> dict:
+    return {
+        label: [
+            {"id": f"{label}-{i}", "description": f"Complaint {i} about theme {label}", "embedding": None}
+            for i in range(size)
+        ]
+        for label in range(n)
+    }
+
+
+def legacy_summaries(clusters: dict) -> list:
+    """The loop _build_output used before the scheduler."""
+    output = []
+    for label, items in clusters.items():
+        descriptions = "\n- ".join(item["description"] for item in items)
+        response = gemini_client.client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=CLUSTER_SUMMARY_PROMPT.format(descriptions=descriptions)
+        )
+        output.append(json.loads(response.text))
+        time.sleep(LEGACY_SLEEP)
+    return output
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clusters", type=int, default=12)
+    parser.add_argument("--delay", type=float, default=0.5, help="stub generation latency in seconds")
+    parser.add_argument("--quota", type=int, default=None, help="stub requests per minute before a 429")
+    parser.add_argument("--rpm", type=float, default=600, help="scheduler requests per minute")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args(argv)
+
+    stub = gemini_client.client
+    stub.generate_delay = args.delay
+    stub.response = RESPONSE
+    clusters = synthetic_clusters(args.clusters)
+    print(f"{args.clusters} clusters, generate={args.delay}s, quota={args.quota or 'none'}/min, "
+          f"scheduler={args.rpm:.0f}/min x{args.concurrency}")
+
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        legacy_summaries(clusters)
+        print(f"{'sequential + sleep':<20} {time.perf_counter() - start:>8.2f}s")
+
+    stub.quota_per_minute = args.quota
+    stub.calls = {}
+    clustering_pipeline.llm_scheduler = LLMScheduler(args.rpm, args.concurrency)
+    cache = get_collection().database["cluster_summaries"]
+    cache.delete_many({})
+    cluster_summaries.cluster_summaries_collection = cache
+
+    start = time.perf_counter()
+    output, _ = clustering_pipeline._build_output(clusters)
+    elapsed = time.perf_counter() - start
+    failed = sum(entry["cluster_name"] == "Unknown" for entry in output)
+    print(f"{'scheduler':<20} {elapsed:>8.2f}s  stub calls={stub.calls} "
+          f"scheduler={clustering_pipeline.llm_scheduler.stats} failed={failed}")
+
+    for label in list(clusters)[:args.clusters // 3]:
+        clusters[label].append({"id": f"{label}-new", "description": "Another complaint", "embedding": None})
+    stub.calls = {}
+    start = time.perf_counter()
+    clustering_pipeline._build_output(clusters)
+    print(f"{'cached rerun':<20} {time.perf_counter() - start:>8.2f}s  stub calls={stub.calls}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
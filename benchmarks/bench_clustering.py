@@ -0,0 +1,80 @@
+"""
+Full UMAP + DBSCAN refit against the incremental update used by
+run_clustering_pipeline (load the saved model, project the new complaints
+with reducer.transform, assign them to existing clusters, save).
+
+    python -m benchmarks.bench_clustering [sizes...] [--dims 256] [--new 0.01]
+
+Embeddings are synthetic: noisy points around a few dozen topic centres.
+ARI compares the incremental labels with those of a refit on all points.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ["GEMINI_USE_STUB"] = "1"
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from mongodb.cluster_model import ClusterModel
+from mongodb.clustering_pipeline import (
+    UMAP_NEIGHBORS, UMAP_COMPONENTS, UMAP_METRIC, DBSCAN_EPS, DBSCAN_MIN_SAMPLES
+)
+
+DEFAULT_SIZES = [2000, 10000]
+
+
+def clustered_embeddings(n: int, dims: int, topics: int = 40, noise: float = 0.35, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(topics, dims))
+    X = centres[rng.integers(0, topics, n)] + noise * rng.normal(size=(n, dims))
+    return (X / np.linalg.norm(X, axis=1, keepdims=True)).astype(np.float32)
+
+
+def new_model() -> ClusterModel:
+    return ClusterModel(
+        n_neighbors=UMAP_NEIGHBORS, n_components=UMAP_COMPONENTS, metric=UMAP_METRIC,
+        eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES
+    )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--new", type=float, default=0.01, help="fraction of complaints added since the fit")
+    args = parser.parse_args(argv)
+
+    print(f"dims={args.dims}, new complaints={args.new:.0%} of the collection")
+    print(f"{'size':>7} {'new':>6} {'full refit (s)':>15} {'incremental (s)':>16} {'speedup':>8} {'ARI':>6}")
+    for n in args.sizes or DEFAULT_SIZES:
+        n_new = max(1, int(n * args.new))
+        X = clustered_embeddings(n + n_new, args.dims)
+        ids = [str(i) for i in range(n + n_new)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            base = new_model()
+            base.fit(ids[:n], X[:n])
+            base.reducer.transform(X[:2])  # compile numba kernels outside the timing
+            base.save(directory)
+
+            start = time.perf_counter()
+            model = ClusterModel.load(directory)
+            model.add(ids[n:], X[n:])
+            model.save(directory)
+            incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        refit = new_model()
+        refit.fit(ids, X)
+        full = time.perf_counter() - start
+
+        ari = adjusted_rand_score(refit.labels, model.labels)
+        print(f"{n:>7} {n_new:>6} {full:>15.2f} {incremental:>16.2f} {full / incremental:>7.1f}x {ari:>6.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
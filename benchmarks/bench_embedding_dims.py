@@ -0,0 +1,86 @@
+"""
+Storage, exact search latency and top-k recall of truncated (Matryoshka)
+embeddings against the full-size ones, for each EMBEDDING_DIMENSIONS
+candidate. Recall@k is the share of each query's full-size top k that the
+truncated, renormalized vectors still return.
+
+    python -m benchmarks.bench_embedding_dims [--source mongo] [--dims 3072,1536,768] [--k 10]
+
+--source mongo uses the stored complaint embeddings (they must be
+full-size, i.e. before any migration); the default generates clustered
+synthetic vectors whose variance decays across dimensions, as in a
+Matryoshka-trained model. Synthetic recall is only a sanity check, the
+numbers that matter come from our data.
+"""
+import argparse
+import sys
+import time
+
+import bson
+import numpy as np
+
+DEFAULT_DIMS = "3072,1536,768"
+
+
+def synthetic_vectors(n: int, dims: int, themes: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    spectrum = (np.arange(dims) + 1.0) ** -0.5
+    centers = rng.standard_normal((themes, dims)) * spectrum
+    X = centers[rng.integers(themes, size=n)] + 0.6 * rng.standard_normal((n, dims)) * spectrum
+    return (X / np.linalg.norm(X, axis=1, keepdims=True)).astype(np.float32)
+
+
+def mongo_vectors(limit: int) -> np.ndarray:
+    from mongodb.mongo_client import complaints_collection
+    cursor = complaints_collection.find({"embedding": {"$exists": True}}, {"embedding": 1}).limit(limit)
+    embeddings = [c["embedding"] for c in cursor]
+    full = max((len(e) for e in embeddings), default=0)
+    return np.array([e for e in embeddings if len(e) == full], dtype=np.float32)
+
+
+def truncate(X: np.ndarray, dims: int) -> np.ndarray:
+    # llm.chat.truncate_embedding, on the whole matrix.
+    T = X[:, :dims]
+    return np.ascontiguousarray(T / np.linalg.norm(T, axis=1, keepdims=True))
+
+
+def top_k(X: np.ndarray, queries: np.ndarray, k: int) -> tuple:
+    """Exact top k per query (the query itself excluded) and seconds per query."""
+    start = time.perf_counter()
+    scores = X @ X[queries].T
+    scores[queries, np.arange(len(queries))] = -np.inf
+    hits = np.argpartition(-scores, k, axis=0)[:k].T
+    return hits, (time.perf_counter() - start) / len(queries)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["synthetic", "mongo"], default="synthetic")
+    parser.add_argument("--n", type=int, default=20_000, help="vectors to use")
+    parser.add_argument("--dims", default=DEFAULT_DIMS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    candidates = sorted((int(d) for d in args.dims.split(",")), reverse=True)
+    X = mongo_vectors(args.n) if args.source == "mongo" else synthetic_vectors(args.n, candidates[0])
+    if len(X) <= args.k:
+        print(f"[ERROR] Need more than {args.k} full-size embeddings, found {len(X)}.")
+        return
+    full = X.shape[1]
+    candidates = [d for d in candidates if d <= full]
+    queries = np.random.default_rng(1).choice(len(X), size=min(args.queries, len(X)), replace=False)
+    baseline, _ = top_k(X, queries, args.k)
+
+    print(f"source={args.source}, {len(X)} vectors of {full} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'dims':>6} {'BSON/doc (KB)':>14} {'store (MB)':>11} {'search (ms)':>12} {f'recall@{args.k}':>10}")
+    for dims in candidates:
+        T = truncate(X, dims)
+        hits, seconds = top_k(T, queries, args.k)
+        recall = np.mean([len(set(h) & set(b)) / args.k for h, b in zip(hits, baseline)])
+        bson_kb = len(bson.encode({"embedding": T[0].tolist()})) / 1024
+        print(f"{dims:>6} {bson_kb:>14.1f} {T.nbytes / 1e6:>11.0f} {seconds * 1000:>12.2f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
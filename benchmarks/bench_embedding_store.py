@@ -0,0 +1,130 @@
+"""
+Load time and peak RSS of the embedding matrix: the previous path
+(embeddings decoded as lists of floats, then np.array) against opening
+the memory-mapped store in mongodb.embedding_store and scanning it once.
+
+    python -m benchmarks.bench_embedding_store [sizes...] [--dims 768] [--dtypes float32,int8]
+
+Each measurement runs in a fresh child process so its peak RSS is its
+own. The list path needs ~30 bytes per float before numpy sees it, so it
+is skipped above --legacy-max vectors. Store files are written under a
+temporary directory (n x dims x itemsize bytes on disk).
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from mongodb.embedding_store import EmbeddingStore
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+BUILD_CHUNK = 50_000
+
+
+def peak_rss_mb() -> float:
+    # VmHWM starts over at exec; ru_maxrss keeps the parent's high-water mark.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def random_vectors(n: int, dims: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dims), dtype=np.float32)
+
+
+def child_legacy(n: int, dims: int) -> dict:
+    # What get_all_complaints hands over: one list of Python floats per document.
+    embeddings = [row.tolist() for chunk in range(0, n, BUILD_CHUNK)
+                  for row in random_vectors(min(BUILD_CHUNK, n - chunk), dims, chunk)]
+    start = time.perf_counter()
+    X = np.array(embeddings)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = X @ X[0]
+    scan = time.perf_counter() - start
+    rss = peak_rss_mb()
+    return {"load_s": load, "scan_s": scan, "dtype": str(X.dtype), "rss_mb": rss,
+            "matrix_s": load, "matrix_rss_mb": rss, "top": int(np.argmax(scores))}
+
+
+def child_store(directory: str) -> dict:
+    start = time.perf_counter()
+    store = EmbeddingStore(directory)
+    query = store.get(store.ids[0])
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = store.search(query, top_k=5)
+    scan = time.perf_counter() - start
+    search_rss = peak_rss_mb()
+    # Clustering reads the whole matrix: a view for float32, a float32 copy otherwise.
+    start = time.perf_counter()
+    ids, X = store.vectors()
+    float(X[:, 0].sum())
+    matrix = time.perf_counter() - start
+    return {"load_s": load, "scan_s": scan, "dtype": store.dtype, "rss_mb": search_rss,
+            "matrix_s": matrix, "matrix_rss_mb": peak_rss_mb(), "top": hits[0][0]}
+
+
+def run_child(*args) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_embedding_store", "--child", *map(str, args)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def build_store(directory: str, n: int, dims: int, dtype: str) -> float:
+    store = EmbeddingStore(directory, dtype)
+    start = time.perf_counter()
+    for chunk in range(0, n, BUILD_CHUNK):
+        size = min(BUILD_CHUNK, n - chunk)
+        ids = [f"{i:024x}" for i in range(chunk, chunk + size)]
+        store.upsert_many(ids, random_vectors(size, dims, chunk), [{"status": "open", "block": "A1"}] * size)
+    return time.perf_counter() - start
+
+
+def main(argv):
+    if argv and argv[0] == "--child":
+        mode, *rest = argv[1:]
+        result = child_legacy(int(rest[0]), int(rest[1])) if mode == "legacy" else child_store(rest[0])
+        print(json.dumps(result))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--dtypes", default="float32,int8")
+    parser.add_argument("--legacy-max", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    baseline = run_child("legacy", 1, args.dims)["rss_mb"]
+    print(f"dims={args.dims}, interpreter baseline RSS {baseline:.0f} MB")
+    print("load/scan: open and run one similarity search; matrix: the full float32 matrix clustering reads")
+    print(f"{'vectors':>9} {'path':>16} {'build (s)':>10} {'load (s)':>9} {'scan (s)':>9} {'RSS (MB)':>9} "
+          f"{'matrix (s)':>11} {'RSS (MB)':>9} {'data (MB)':>10}")
+    for n in args.sizes or DEFAULT_SIZES:
+        if n <= args.legacy_max:
+            r = run_child("legacy", n, args.dims)
+            print(f"{n:>9} {'lists -> ' + r['dtype']:>16} {'-':>10} {r['load_s']:>9.2f} {r['scan_s']:>9.3f} "
+                  f"{r['rss_mb']:>9.0f} {r['matrix_s']:>11.2f} {r['matrix_rss_mb']:>9.0f} {'-':>10}")
+        for dtype in args.dtypes.split(","):
+            with tempfile.TemporaryDirectory() as directory:
+                build = build_store(directory, n, args.dims, dtype)
+                r = run_child("store", directory)
+                data_mb = EmbeddingStore(directory).stats()["data_mb"]
+            print(f"{n:>9} {'store ' + dtype:>16} {build:>10.1f} {r['load_s']:>9.2f} {r['scan_s']:>9.3f} "
+                  f"{r['rss_mb']:>9.0f} {r['matrix_s']:>11.2f} {r['matrix_rss_mb']:>9.0f} {data_mb:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+"""
+Prompt size and assembly latency of block/cluster summary prompts against
+group size, with and without the token budget from llm.prompt_budget.
+Generation latency is modelled as --ms-per-1k-tokens of prompt.
+
+    python -m benchmarks.bench_prompt_budget [sizes...] [--ms-per-1k-tokens 250]
+"""
+import sys
+import time
+
+from benchmarks.synthetic import make_complaints
+from llm.prompt_budget import select_representative, estimate_tokens, SUMMARY_TOKEN_BUDGET
+from llm.stub_client import stub_embedding
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def main(argv):
+    ms_per_1k = 250.0
+    if "--ms-per-1k-tokens" in argv:
+        i = argv.index("--ms-per-1k-tokens")
+        ms_per_1k = float(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    sizes = [int(a) for a in argv] or DEFAULT_SIZES
+
+    print(f"budget={SUMMARY_TOKEN_BUDGET} tokens, modelled generation={ms_per_1k}ms/1k prompt tokens")
+    print(f"{'size':>7} {'full tokens':>12} {'budget tokens':>14} {'picked':>7} {'select (ms)':>12} "
+          f"{'full gen (s)':>13} {'budget gen (s)':>15}")
+    for n in sizes:
+        descriptions = [c["description"] for c in make_complaints(n, dims=0)]
+        embeddings = [stub_embedding(d, 768) for d in descriptions]
+
+        full_tokens = estimate_tokens("\n".join(descriptions))
+
+        start = time.perf_counter()
+        picked = select_representative(descriptions, embeddings)
+        select_ms = (time.perf_counter() - start) * 1000
+        budget_tokens = estimate_tokens("\n".join(picked))
+
+        print(f"{n:>7} {full_tokens:>12} {budget_tokens:>14} {len(picked):>7} {select_ms:>12.1f} "
+              f"{full_tokens / 1000 * ms_per_1k / 1000:>13.2f} {budget_tokens / 1000 * ms_per_1k / 1000:>15.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,91 @@
+"""
+Latency of aggregate chat questions answered by llm.query_router (one
+MongoDB aggregation) against the RAG path they took before (embedding,
+vector search over the corpus, generation), with the offline stub client.
+
+    python -m benchmarks.bench_query_router [--n 2000] [--embed-delay 0.3] [--generate-delay 1.5]
+
+Uses the MongoDB at BENCH_MONGO_URL when set, otherwise an in-memory
+mongomock collection. The RAG column also shows how many complaints the
+model would have seen, against the true count it was asked for.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ["GEMINI_USE_STUB"] = "1"
+
+import numpy as np
+from google.genai import types
+
+from benchmarks.bench_analytics import get_collection
+from benchmarks.eval_retrieval import emulated_search
+from benchmarks.synthetic import load_collection
+from llm import chat
+from llm.prompts import CHATBOT_PROMPT
+from llm.query_router import parse_query, answer_structured
+from llm.retrieval import rerank_context
+from llm.stub_client import stub_embedding
+from mongodb import analytics
+
+QUERIES = [
+    "How many open complaints in B3?",
+    "Which category has the most high-severity issues?",
+    "How many complaints per block?",
+    "Which block has the most open complaints?",
+    "Number of junk complaints in block A",
+    "Average resolution time for electricity complaints",
+]
+DIMS = 768
+
+
+def rag_answer(query: str, corpus, matrix):
+    chat.embedding_cache.clear()
+    query_vector = chat.embed_generator(query)
+    hits, _ = emulated_search(corpus, matrix, query_vector, chat.extract_block(query))
+    context = rerank_context(query_vector, hits)
+    chat.client.models.generate_content(
+        model="gemini-2.5-flash",
+        config=types.GenerateContentConfig(system_instruction=CHATBOT_PROMPT),
+        contents=chat.build_chat_contents(query, context))
+    return len(context)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--embed-delay", type=float, default=0.3)
+    parser.add_argument("--generate-delay", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    collection = get_collection()
+    load_collection(collection, args.n, dims=0)
+    analytics.complaints_collection = collection
+
+    corpus = [c for c in collection.find({"status": {"$in": ["open", "pending"]}})]
+    for doc in corpus:
+        doc["embedding"] = stub_embedding(doc["description"], DIMS)
+    matrix = np.asarray([doc["embedding"] for doc in corpus], dtype=np.float32)
+
+    chat.client.embed_delay = args.embed_delay
+    chat.client.generate_delay = args.generate_delay
+    chat.client.dimensions = DIMS
+
+    print(f"{args.n} complaints, embed={args.embed_delay}s generate={args.generate_delay}s")
+    print(f"{'query':<52} {'router (ms)':>12} {'rag (ms)':>10} {'docs seen':>10}  answer")
+    for query in QUERIES:
+        parsed = parse_query(query)
+        start = time.perf_counter()
+        answer = answer_structured(parsed) if parsed else "(not routed)"
+        router_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        seen = rag_answer(query, corpus, matrix)
+        rag_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{query:<52} {router_ms:>12.1f} {rag_ms:>10.1f} {seen:>10}  {answer.splitlines()[0]}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,73 @@
+"""
+Recall and latency of the IVF index behind find_similar_complaints versus
+the exact brute-force cosine search it replaced.
+
+    python -m benchmarks.bench_similarity [sizes...] [--dims N] [--queries Q]
+"""
+import sys
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from mongodb.vector_index import IVFIndex
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000]
+TOP_K = 5
+N_PROBES = [4, 8, 16, 32]
+
+
+def make_vectors(n, dims, n_topics=60, seed=0):
+    """Complaints cluster around topics, so draw vectors around centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(n_topics, dims)).astype(np.float32)
+    noise = rng.normal(scale=3.0, size=(n, dims)).astype(np.float32)
+    return centres[rng.integers(0, n_topics, n)] + noise
+
+
+def exact_top_k(vectors, query_row, top_k):
+    similarities = cosine_similarity(vectors[query_row].reshape(1, -1), vectors)[0]
+    similarities[query_row] = -np.inf
+    return set(similarities.argsort()[::-1][:top_k])
+
+
+def main(argv):
+    dims, n_queries = 3072, 50
+    for flag in ("--dims", "--queries"):
+        if flag in argv:
+            i = argv.index(flag)
+            value = int(argv[i + 1])
+            argv = argv[:i] + argv[i + 2:]
+            if flag == "--dims":
+                dims = value
+            else:
+                n_queries = value
+    sizes = [int(a) for a in argv] or DEFAULT_SIZES
+
+    print(f"{'docs':>8} {'method':>12} {'build (s)':>10} {'query (ms)':>11} {'recall@5':>9}")
+    for n in sizes:
+        vectors = make_vectors(n, dims)
+        rng = np.random.default_rng(1)
+        queries = rng.choice(n, n_queries, replace=False)
+
+        start = time.perf_counter()
+        truth = [exact_top_k(vectors, q, TOP_K) for q in queries]
+        exact_ms = (time.perf_counter() - start) / n_queries * 1000
+        print(f"{n:>8} {'exact':>12} {0:>10.2f} {exact_ms:>11.2f} {1:>9.3f}")
+
+        start = time.perf_counter()
+        index = IVFIndex().build(list(range(n)), vectors)
+        build_s = time.perf_counter() - start
+
+        for n_probe in N_PROBES:
+            index.n_probe = n_probe
+            hits = 0
+            start = time.perf_counter()
+            for q, expected in zip(queries, truth):
+                found = {item for item, _ in index.search(vectors[q], TOP_K, exclude=int(q))}
+                hits += len(found & expected)
+            query_ms = (time.perf_counter() - start) / n_queries * 1000
+            print(f"{n:>8} {f'ivf/{n_probe}':>12} {build_s:>10.2f} {query_ms:>11.2f} {hits / (TOP_K * n_queries):>9.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
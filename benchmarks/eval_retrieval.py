@@ -0,0 +1,139 @@
+"""
+Offline evaluation of the chatbot's post-retrieval stage.
+
+Runs the recorded queries in benchmarks/fixtures/chat_queries.json against
+a synthetic corpus, once with every vector search hit in the prompt
+(the previous behaviour) and once through rerank_context, and reports
+prompt tokens, latency and how much the two answers overlap.
+
+Vector search is emulated with exact cosine similarity over the corpus.
+With the stub client the "answer" lists the distinct issues in the
+context, as a summarising model would; pass --live to generate real
+answers with Gemini (GEMINI_API_KEY) instead.
+
+    python -m benchmarks.eval_retrieval [--corpus 2000] [--dims 768] [--ms-per-1k-tokens 250] [--live]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+if "--live" not in sys.argv:
+    os.environ["GEMINI_USE_STUB"] = "1"
+
+import numpy as np
+from google.genai import types
+
+from benchmarks.synthetic import make_complaints
+from llm import chat
+from llm.prompts import CHATBOT_PROMPT
+from llm.prompt_budget import estimate_tokens
+from llm.retrieval import rerank_context, candidate_settings, FETCH_LIMIT
+from llm.stub_client import stub_embedding
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "chat_queries.json")
+
+
+def stub_answer(contents: str) -> str:
+    issues = {
+        re.sub(r"\s*\(ref \d+\)\.?$", "", line.split(": ", 1)[-1])
+        for line in contents.splitlines() if line.startswith("- ")
+    }
+    return "\n".join(sorted(issues))
+
+
+def word_overlap(a: str, b: str) -> float:
+    a, b = set(re.findall(r"\w+", a.lower())), set(re.findall(r"\w+", b.lower()))
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def load_corpus(n: int, dims: int):
+    corpus = [c for c in make_complaints(n, dims=0) if c["status"] == "open"]
+    for i, doc in enumerate(corpus):
+        doc["_id"] = i
+        doc["embedding"] = stub_embedding(doc["description"], dims)
+    matrix = np.asarray([doc["embedding"] for doc in corpus], dtype=np.float32)
+    return corpus, matrix
+
+
+def emulated_search(corpus, matrix, query_vector, block):
+    mask = np.ones(len(corpus), dtype=bool)
+    if block:
+        mask = np.array([doc["block"].startswith(block) for doc in corpus])
+    num_candidates, limit = candidate_settings(int(mask.sum()), len(corpus), FETCH_LIMIT)
+    scores = matrix @ np.asarray(query_vector, dtype=np.float32)
+    scores[~mask] = -np.inf
+    top = np.argsort(-scores, kind="stable")[:limit]
+    hits = [dict(corpus[i], score=float((1 + scores[i]) / 2)) for i in top if np.isfinite(scores[i])]
+    return hits, num_candidates
+
+
+def answer(contents: str, live: bool):
+    start = time.perf_counter()
+    if live:
+        response = chat.client.models.generate_content(
+            model="gemini-2.5-flash",
+            config=types.GenerateContentConfig(system_instruction=CHATBOT_PROMPT),
+            contents=contents)
+        text = response.text
+    else:
+        text = stub_answer(contents)
+    return text, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=250.0)
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args(argv)
+
+    with open(args.fixtures) as f:
+        queries = json.load(f)
+    corpus, matrix = load_corpus(args.corpus, args.dims)
+
+    print(f"{len(queries)} queries, {len(corpus)} open complaints, "
+          f"{'live Gemini' if args.live else f'modelled generation={args.ms_per_1k_tokens}ms/1k tokens'}")
+    print(f"{'query':<45} {'cands':>6} {'docs':>9} {'tokens':>11} {'rerank ms':>10} {'gen s':>13} {'overlap':>8}")
+    totals = np.zeros(4)
+    overlaps = []
+    for entry in queries:
+        query = entry["query"]
+        block = chat.extract_block(query)
+        query_vector = stub_embedding(query, args.dims)
+        hits, num_candidates = emulated_search(corpus, matrix, query_vector, block)
+
+        start = time.perf_counter()
+        context = rerank_context(query_vector, hits)
+        rerank_ms = (time.perf_counter() - start) * 1000
+
+        full_prompt = chat.build_chat_contents(query, hits)
+        reranked_prompt = chat.build_chat_contents(query, context)
+        full_tokens, reranked_tokens = estimate_tokens(full_prompt), estimate_tokens(reranked_prompt)
+
+        full_answer, full_gen = answer(full_prompt, args.live)
+        reranked_answer, reranked_gen = answer(reranked_prompt, args.live)
+        if not args.live:
+            full_gen = full_tokens / 1000 * args.ms_per_1k_tokens / 1000
+            reranked_gen = reranked_tokens / 1000 * args.ms_per_1k_tokens / 1000
+        overlap = word_overlap(full_answer, reranked_answer)
+
+        totals += [full_tokens, reranked_tokens, full_gen, reranked_gen]
+        overlaps.append(overlap)
+        label = f"{query[:40]}{' [' + block + ']' if block else ''}"
+        print(f"{label:<45} {num_candidates:>6} {len(hits):>4}->{len(context):<4} "
+              f"{full_tokens:>5}->{reranked_tokens:<5} {rerank_ms:>10.2f} "
+              f"{full_gen:>6.2f}->{reranked_gen:<5.2f} {overlap:>8.2f}")
+
+    n = len(queries)
+    print(f"\nmean prompt tokens {totals[0] / n:.0f} -> {totals[1] / n:.0f}, "
+          f"mean generation {totals[2] / n:.2f}s -> {totals[3] / n:.2f}s, "
+          f"mean answer overlap {np.mean(overlaps):.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta
+
+BLOCKS = ["A1", "A2", "A3", "A4", "A5", "B1", "B2", "B3", "B4", "B5"]
+CATEGORIES = [
+    "Water Supply", "Cleanliness", "Electricity", "Road Maintenance",
+    "Garbage Management", "Noise Pollution", "Public Safety",
+    "Street Lighting", "Drainage", "Other"
+]
+SEVERITIES = ["low", "medium", "high"]
+STATUSES = ["open", "closed", "junk"]
+PHRASES = [
+    "Water supply has been irregular for the past week",
+    "Garbage has not been collected near the main gate",
+    "Street light outside the building is not working",
+    "Drainage is choked and water is accumulating after rain",
+    "Loud music from the community hall late at night",
+    "Frequent power cuts in the evening hours",
+    "Potholes on the approach road are getting worse",
+    "Stray dogs near the playground are a safety concern",
+]
+
+
+def make_complaints(n: int, dims: int = 3072, seed: int = 42):
+    """
+    Yields synthetic complaints with the same shape as create_complaint
+    documents. Embeddings are random unit-ish vectors of `dims` floats
+    (pass dims=0 to omit them).
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+
+    for i in range(n):
+        created_at = start + timedelta(minutes=rng.randint(0, 500_000))
+        status = rng.choice(STATUSES)
+        doc = {
+            "resident_name": f"Resident {i}",
+            "block": rng.choice(BLOCKS),
+            "description": f"{rng.choice(PHRASES)} (ref {i}).",
+            "category": rng.choice(CATEGORIES),
+            "sentiment": "negative",
+            "severity_level": rng.choice(SEVERITIES),
+            "urgency_score": rng.randint(0, 10),
+            "llm_summary": "Synthetic complaint",
+            "action_recommendation": "Inspect and resolve",
+            "status": status,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(hours=rng.randint(0, 48)),
+        }
+        if status == "closed":
+            doc["resolved_at"] = created_at + timedelta(hours=rng.randint(1, 240))
+        if dims:
+            doc["embedding"] = [rng.uniform(-1, 1) for _ in range(dims)]
+        yield doc
+
+
+def load_collection(collection, n: int, dims: int = 3072, batch_size: int = 1000):
+    collection.delete_many({})
+    batch = []
+    for doc in make_complaints(n, dims):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
@@ -1,16 +1,81 @@
 from mongodb.handlers import (
-    get_complaints_by_status,
+    get_complaints_page,
+    count_complaints_by_status,
     update_complaint_status,
     find_similar_complaints
 )
+from mongodb.cluster_store import NOISE_CLUSTER_ID
 import streamlit as st
 from datetime import datetime, timezone
 import time
 
+ITEMS_PER_PAGE = 6
+
+# column -> (status, field the column is sorted by)
+KANBAN_COLUMNS = {
+    "pending": ("open", "updated_at"),
+    "resolved": ("closed", "resolved_at"),
+    "junk": ("junk", "updated_at"),
+}
+
+
+@st.cache_data(ttl=300)
+def fetch_page_cached(status, sort_field, cursor):
+    return get_complaints_page(status, sort_field, ITEMS_PER_PAGE, after=cursor)
+
 
 @st.cache_data(ttl=300)
-def fetch_complaints_cached(status):
-    return get_complaints_by_status(status)
+def count_complaints_cached(status):
+    return count_complaints_by_status(status)
+
+
+def theme_label(complaint):
+    """The complaint's theme from the latest clustering run, if it has one."""
+    if complaint.get("cluster_name") and complaint.get("cluster_id") != NOISE_CLUSTER_ID:
+        return f" | <b>Theme:</b> {complaint['cluster_name']}"
+    return ""
+
+
+def clear_dashboard_cache():
+    fetch_page_cached.clear()
+    count_complaints_cached.clear()
+
+
+def load_column_page(column):
+    """
+    Each column keeps a stack of keyset cursors in session state; the top of
+    the stack is the cursor of the visible page. Only that page is fetched.
+    """
+    status, sort_field = KANBAN_COLUMNS[column]
+    stack_key = f"cursors_{column}"
+    if stack_key not in st.session_state:
+        st.session_state[stack_key] = [None]
+
+    total_pages = max(1, (count_complaints_cached(status) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
+    if len(st.session_state[stack_key]) > total_pages:
+        st.session_state[stack_key] = [None]
+
+    page = fetch_page_cached(status, sort_field, st.session_state[stack_key][-1])
+    if not page["items"] and len(st.session_state[stack_key]) > 1:
+        st.session_state[stack_key] = [None]
+        page = fetch_page_cached(status, sort_field, None)
+
+    return page, total_pages
+
+
+def pagination_controls(column, page, total_pages, prev_key, next_key):
+    stack_key = f"cursors_{column}"
+    page_number = len(st.session_state[stack_key]) - 1
+    c1, c2, c3 = st.columns([1, 2, 1])
+    with c1:
+        if st.button("Previous", key=prev_key, disabled=page_number == 0):
+            st.session_state[stack_key].pop()
+            st.rerun()
+    with c3:
+        if st.button("Next", key=next_key, disabled=page["next_cursor"] is None):
+            st.session_state[stack_key].append(page["next_cursor"])
+            st.rerun()
+    st.caption(f"Page {page_number + 1} of {total_pages}")
 
 
 def cards_dashboard_tab():
@@ -24,33 +89,17 @@ def cards_dashboard_tab():
     if "refresh_dashboard" not in st.session_state:
         st.session_state.refresh_dashboard = False
 
-    pending = sorted(fetch_complaints_cached("open"), key=lambda c: c.get("updated_at", datetime.now(timezone.utc)), reverse=True)
-    resolved = sorted(fetch_complaints_cached("closed"), key=lambda c: c.get("resolved_at", datetime.now(timezone.utc)), reverse=True)
-    junk = sorted(fetch_complaints_cached("junk"), key=lambda c: c.get("updated_at", datetime.now(timezone.utc)), reverse=True)
-
     def display_status_label(status):
         return {"open": "Pending", "closed": "Resolved", "junk": "Junk"}.get(status, "Unknown")
 
     col1, col2, col3 = st.columns(3)
-    
-    ITEMS_PER_PAGE = 6
-    
-    if "page_pending" not in st.session_state: st.session_state.page_pending = 0
-    if "page_resolved" not in st.session_state: st.session_state.page_resolved = 0
-    if "page_junk" not in st.session_state: st.session_state.page_junk = 0
-
-    def paginate_list(data, page_key):
-        total_pages = max(1, (len(data) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
-        if st.session_state[page_key] >= total_pages:
-            st.session_state[page_key] = max(0, total_pages - 1)
-        start = st.session_state[page_key] * ITEMS_PER_PAGE
-        end = start + ITEMS_PER_PAGE
-        return data[start:end], total_pages
-
-    p_pending, total_pending = paginate_list(pending, "page_pending")
-    p_resolved, total_resolved = paginate_list(resolved, "page_resolved")
-    p_junk, total_junk = paginate_list(junk, "page_junk")
 
+    page_pending, total_pending = load_column_page("pending")
+    page_resolved, total_resolved = load_column_page("resolved")
+    page_junk, total_junk = load_column_page("junk")
+    p_pending = page_pending["items"]
+    p_resolved = page_resolved["items"]
+    p_junk = page_junk["items"]
 
        
     with col1:
@@ -60,13 +109,14 @@ def cards_dashboard_tab():
                 st.markdown(f"<h4>🧑 {c['resident_name']} (Block: {c['block']})</h4>", unsafe_allow_html=True)
                 st.markdown(f"<p><b>Complaint:</b> {c['description']}</p>", unsafe_allow_html=True)
 
-                
+                if c.get("analysis_failed"):
+                    st.warning("Automatic analysis failed for this complaint; review it manually.")
                 summary_text = c["llm_summary"]
                 st.markdown(f"<div class='summary-box'><b>🧾 Complaint Summary:</b> {summary_text}</div>", unsafe_allow_html=True)
 
                 action_text = c.get("action_recommendation", "No action recommendation available.")
                 st.markdown(f"<div class='action-box'><b>🛠 Recommended Action:</b> {action_text}</div>", unsafe_allow_html=True)
-                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}</p>", unsafe_allow_html=True)
+                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}{theme_label(c)}</p>", unsafe_allow_html=True)
                 st.markdown(f"<p><b>Status:</b> {display_status_label(c['status'])}</p>", unsafe_allow_html=True)
                 st.markdown(
                     f"<small><i>Last Updated: {c.get('updated_at', datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M:%S')}</i></small>",
@@ -92,7 +142,7 @@ def cards_dashboard_tab():
                             "closed",
                             {"resolved_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
                 with b2:
                     if st.button("🚮 Move to Junk", key=f"jnk_{c['_id']}", use_container_width=True):
@@ -101,21 +151,12 @@ def cards_dashboard_tab():
                             "junk",
                             {"updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
             st.markdown("")
         
         if total_pending > 1:
-            c1, c2, c3 = st.columns([1, 2, 1])
-            with c1:
-                if st.button("Previous", key="prev_pend", disabled=st.session_state.page_pending==0):
-                    st.session_state.page_pending -= 1
-                    st.rerun()
-            with c3:
-                if st.button("Next", key="next_pend", disabled=st.session_state.page_pending==total_pending-1):
-                    st.session_state.page_pending += 1
-                    st.rerun()
-            st.caption(f"Page {st.session_state.page_pending + 1} of {total_pending}")
+            pagination_controls("pending", page_pending, total_pending, "prev_pend", "next_pend")
 
     with col2:
         st.markdown("<div class='kanban-header'>✅ Resolved</div>", unsafe_allow_html=True)
@@ -129,7 +170,7 @@ def cards_dashboard_tab():
 
                 action_text = c.get("action_recommendation", "No action recommendation available.")
                 st.markdown(f"<div class='action-box'><b>🛠 Recommended Action:</b> {action_text}</div>", unsafe_allow_html=True)
-                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}</p>", unsafe_allow_html=True)
+                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}{theme_label(c)}</p>", unsafe_allow_html=True)
                 st.markdown(f"<p><b>Status:</b> {display_status_label(c['status'])}</p>", unsafe_allow_html=True)
                 st.markdown(
                     f"<small><i>Last Updated: {c.get('resolved_at', datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M:%S')}</i></small>",
@@ -155,7 +196,7 @@ def cards_dashboard_tab():
                             "open",
                             {"updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
                 with b2:
                     if st.button("🚮 Move to Junk", key=f"jnk_r_{c['_id']}", use_container_width=True):
@@ -164,21 +205,12 @@ def cards_dashboard_tab():
                             "junk",
                             {"updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
             st.markdown("")
         
         if total_resolved > 1:
-            c1, c2, c3 = st.columns([1, 2, 1])
-            with c1:
-                if st.button("Previous", key="prev_res", disabled=st.session_state.page_resolved==0):
-                    st.session_state.page_resolved -= 1
-                    st.rerun()
-            with c3:
-                if st.button("Next", key="next_res", disabled=st.session_state.page_resolved==total_resolved-1):
-                    st.session_state.page_resolved += 1
-                    st.rerun()
-            st.caption(f"Page {st.session_state.page_resolved + 1} of {total_resolved}")
+            pagination_controls("resolved", page_resolved, total_resolved, "prev_res", "next_res")
 
     with col3:
         st.markdown("<div class='kanban-header'>🚮 Junk</div>", unsafe_allow_html=True)
@@ -192,7 +224,7 @@ def cards_dashboard_tab():
 
                 action_text = c.get("action_recommendation", "No action recommendation available.")
                 st.markdown(f"<div class='action-box'><b>🛠 Recommended Action:</b> {action_text}</div>", unsafe_allow_html=True)
-                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}</p>", unsafe_allow_html=True)
+                st.markdown(f"<p><b>Category:</b> {c['category']} | <b>Severity:</b> {c['severity_level']}{theme_label(c)}</p>", unsafe_allow_html=True)
                 st.markdown(f"<p><b>Status:</b> {display_status_label(c['status'])}</p>", unsafe_allow_html=True)
                 st.markdown(
                     f"<small><i>Last Updated: {c.get('updated_at', datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M:%S')}</i></small>",
@@ -218,7 +250,7 @@ def cards_dashboard_tab():
                             "open",
                             {"updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
                 with b2:
                     if st.button("✅ Move to Resolve", key=f"res_j_{c['_id']}", use_container_width=True):
@@ -227,21 +259,12 @@ def cards_dashboard_tab():
                             "closed",
                             {"resolved_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)},
                         )
-                        fetch_complaints_cached.clear()
+                        clear_dashboard_cache()
                         st.session_state.refresh_dashboard = True
             st.markdown("")
         
         if total_junk > 1:
-            c1, c2, c3 = st.columns([1, 2, 1])
-            with c1:
-                if st.button("Previous", key="prev_junk", disabled=st.session_state.page_junk==0):
-                    st.session_state.page_junk -= 1
-                    st.rerun()
-            with c3:
-                if st.button("Next", key="next_junk", disabled=st.session_state.page_junk==total_junk-1):
-                    st.session_state.page_junk += 1
-                    st.rerun()
-            st.caption(f"Page {st.session_state.page_junk + 1} of {total_junk}")
+            pagination_controls("junk", page_junk, total_junk, "prev_junk", "next_junk")
 
     if st.session_state.refresh_dashboard:
         with st.spinner("Updating complaint status...."):
@@ -1,10 +1,25 @@
+import os
 import sys
+import logging
 from pathlib import Path
 import streamlit as st
 from llm import chat
+from mongodb.indexes import apply_all as apply_indexes
+from llm.intake import intake_pipeline
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 
 st.set_page_config(page_title="CivicPulse Dashboard", layout="wide")
 
+
+@st.cache_resource
+def bootstrap_database():
+    apply_indexes()
+    intake_pipeline.recover_pending()
+
+
+bootstrap_database()
+
 from report_complaint import report_complaint_tab
 from cards_dasboard import cards_dashboard_tab
 from admin_analytics import admin_analytics_tab
@@ -116,11 +131,9 @@ def chat_tab():
         if not query.strip():
             st.warning("⚠️ Please enter a valid question.")
             return
-        with st.spinner("Thinking..."):
-            response = chat.chatbot(query)
-            with st.container(border=True):
-                st.markdown("#### 💡 AI Response:")
-                st.markdown(response)
+        with st.container(border=True):
+            st.markdown("#### 💡 AI Response:")
+            st.write_stream(chat.chatbot_stream(query))
 
 
 def set_resident():
@@ -1,22 +1,49 @@
+import hashlib
 import json
+import os
 import re
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from dotenv import load_dotenv
 from google.genai import types
 
 from llm.llm_client import gemini_client
 from llm.prompts import ANALYZE_COMPLAINT_PROMPT
-from llm.chat import embed_generator
+from llm.scheduler import llm_scheduler
+from llm.prompt_budget import select_representative, SUMMARY_TOKEN_BUDGET
+from llm.chat import embed_generator, EMBEDDING_VERSION
 from mongodb.handlers import get_all_complaints
+from mongodb.block_summaries import (
+    BLOCK_ORDER,
+    block_label,
+    get_block_watermarks,
+    get_block_summaries,
+    save_block_summary,
+    delete_block_summaries
+)
 
 
 client = gemini_client.client
 
+LLM_CALL_TIMEOUT = 30  # seconds to analyse one complaint
+# Also bounds each request on the wire, so a call analyze_complaint gave up
+# on does not hold an llm_executor worker indefinitely.
+LLM_HTTP_OPTIONS = types.HttpOptions(timeout=LLM_CALL_TIMEOUT * 1000)
+# Shared pool for independent LLM calls made on behalf of one request.
+llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_CALL_WORKERS", 8)), thread_name_prefix="llm"
+)
 
-def analyze_complaint(payload: dict):
+SUMMARY_RETRIES = 3
+SUMMARY_ERROR = "Error generating summary."
+
+
+def classify_complaint(payload: dict) -> dict:
     """
-    Analyzes a resident complaint using the Gemini 2.5 Flash model.
-    Returns structured JSON containing classification and insights.
+    Classifies a resident complaint using the Gemini 2.5 Flash model.
+    Returns the parsed JSON fields, or {"raw_text", "error"} if the model
+    did not return valid JSON.
     """
     contents = f"""
     Resident Name: {payload.get("resident_name")}
@@ -24,88 +51,191 @@ def analyze_complaint(payload: dict):
     Description: {payload.get("description")}
     """
 
+    response = client.models.generate_content(
+        model="gemini-2.5-flash",
+        config=types.GenerateContentConfig(
+            system_instruction=ANALYZE_COMPLAINT_PROMPT,
+            http_options=LLM_HTTP_OPTIONS
+        ),
+        contents=contents
+    )
+
+    text_response = response.text.strip()
+    cleaned_text = re.search(r"\{.*\}", text_response, re.DOTALL)
+
+    if cleaned_text:
+        text_response = cleaned_text.group(0)
+
+    try:
+        return json.loads(text_response)
+    except json.JSONDecodeError:
+        return {"raw_text": text_response, "error": "Invalid JSON output"}
+
+
+def build_analysis(payload: dict, ai_output: dict, embedding) -> dict:
+    return {
+        **payload,
+        **ai_output,
+        "embedding": embedding,
+        "embedding_model": EMBEDDING_VERSION,
+        "status": "open"
+    }
+
+
+def analyze_complaint(payload: dict, timeout: float = LLM_CALL_TIMEOUT):
+    """
+    Analyzes a resident complaint using the Gemini 2.5 Flash model.
+    Returns structured JSON containing classification and insights.
+    Classification and embedding are requested concurrently, so latency is
+    roughly the slower of the two; both must finish within `timeout`
+    seconds. On failure the other call is cancelled if it has not started;
+    a request already in flight ends at its HTTP timeout.
+    """
+    classification = llm_executor.submit(classify_complaint, payload)
+    embedding = llm_executor.submit(embed_generator, payload.get("description"))
+    deadline = time.monotonic() + timeout
+
     try:
-        response = client.models.generate_content(
+        ai_output = classification.result(timeout=timeout)
+        vector = embedding.result(timeout=max(0, deadline - time.monotonic()))
+        return build_analysis(payload, ai_output, vector)
+
+    except TimeoutError:
+        return {"error": f"Complaint analysis timed out after {timeout}s"}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        classification.cancel()
+        embedding.cancel()
+
+
+def _summarize_block(block: str, complaints: list, retries: int) -> dict:
+    embeddings = [c.get("embedding") for c in complaints]
+    descriptions = select_representative(
+        [c.get("description", "") for c in complaints],
+        embeddings if any(e is not None for e in embeddings) else None,
+        token_budget=SUMMARY_TOKEN_BUDGET
+    )
+    all_text = "\n".join(descriptions)
+    prompt = f"""
+        You are an AI civic data analyst for the CivicPulse system.
+        Summarize the main issues and recurring problems reported by residents in Block {block_label(block)}.
+        Be concise (2–3 sentences) and focus on key concerns.
+
+        Complaints:
+        {all_text}
+        """
+
+    try:
+        response = llm_scheduler.call(
+            client.models.generate_content,
             model="gemini-2.5-flash",
             config=types.GenerateContentConfig(
-                system_instruction=ANALYZE_COMPLAINT_PROMPT
+                system_instruction="Summarize civic complaints clearly and briefly."
             ),
-            contents=contents
+            contents=prompt,
+            retries=retries
         )
+        return {"block": block, "summary": response.text.strip()}
 
-        text_response = response.text.strip()
-        cleaned_text = re.search(r"\{.*\}", text_response, re.DOTALL)
-
-        if cleaned_text:
-            text_response = cleaned_text.group(0)
-
-        try:
-            ai_output = json.loads(text_response)
-        except json.JSONDecodeError:
-            ai_output = {"raw_text": text_response, "error": "Invalid JSON output"}
+    except Exception as e:
+        print(f"Error summarizing block {block}: {e}")
+        return {"block": block, "summary": SUMMARY_ERROR}
 
-        embedding = embed_generator(payload.get("description"))
 
-        final_output = {
-            **payload,
-            **ai_output,
-            "embedding": embedding,
-            "status": "open"
-        }
+def _order_blocks(blocks) -> list:
+    ordered = [block for block in BLOCK_ORDER if block in blocks]
+    ordered.extend(block for block in blocks if block not in BLOCK_ORDER)
+    return ordered
 
-        return final_output
 
-    except Exception as e:
-        return {"error": str(e)}
+def _summarize_blocks(block_complaints: dict, retries: int) -> list:
+    # The shared scheduler enforces the rate limit and concurrency cap.
+    with ThreadPoolExecutor(max_workers=llm_scheduler.max_concurrency, thread_name_prefix="block-summary") as executor:
+        futures = [
+            executor.submit(_summarize_block, block, block_complaints[block], retries)
+            for block in _order_blocks(block_complaints)
+        ]
+        return [future.result() for future in futures]
 
 
-def summarize_block_issues():
+def summarize_block_issues(retries: int = SUMMARY_RETRIES):
     """
     Fetch all complaints from MongoDB, group them block-wise,
     and summarize each block's issues using Gemini.
+    Blocks are summarized in parallel through llm_scheduler (rate limited,
+    at most LLM_MAX_CONCURRENCY at a time); results keep BLOCK_ORDER, and a failing block only
+    affects its own entry. Embeddings are not fetched here, so prompts are
+    only de-duplicated by text; refresh_block_summaries also uses them.
     """
-    complaints = get_all_complaints()
+    complaints = get_all_complaints(view="text")
     if not complaints:
         print("No complaints found in database.")
         return []
 
     block_wise_complaints = defaultdict(list)
     for c in complaints:
-        block = c.get("block", "Unknown")
-        block_wise_complaints[block].append(c.get("description", ""))
+        block_wise_complaints[c.get("block")].append(c)
 
-    block_order = ["A1", "A2", "A3", "A4", "A5", "B1", "B2", "B3", "B4"]
-    sorted_blocks = [(block, block_wise_complaints[block]) for block in block_order if block in block_wise_complaints]
-    remaining_blocks = [(b, desc) for b, desc in block_wise_complaints.items() if b not in block_order]
-    sorted_blocks.extend(remaining_blocks)
+    return [
+        {**result, "block": block_label(result["block"])}
+        for result in _summarize_blocks(block_wise_complaints, retries)
+    ]
 
-    block_summaries = []
 
-    for block, descriptions in sorted_blocks:
-        all_text = "\n".join(descriptions)
-        prompt = f"""
-        You are an AI civic data analyst for the CivicPulse system.
-        Summarize the main issues and recurring problems reported by residents in Block {block}.
-        Be concise (2–3 sentences) and focus on key concerns.
-
-        Complaints:
-        {all_text}
-        """
+def _block_input_hash(complaints: list) -> str:
+    digest = hashlib.sha256()
+    for c in sorted(complaints, key=lambda c: str(c["_id"])):
+        digest.update(f"{c['_id']}\0{c.get('description', '')}\0".encode("utf-8"))
+    return digest.hexdigest()
 
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(
-                    system_instruction="Summarize civic complaints clearly and briefly."
-                ),
-                contents=prompt
-            )
 
-            summary_text = response.text.strip()
-            block_summaries.append({"block": block, "summary": summary_text})
+def get_cached_block_summaries() -> list:
+    """
+    Stored block summaries in block order, without calling the LLM.
+    """
+    summaries = {s["_id"]: s for s in get_block_summaries() if s.get("summary")}
+    return [{"block": block_label(block), "summary": summaries[block]["summary"]} for block in _order_blocks(summaries)]
 
-        except Exception as e:
-            print(f"Error summarizing block {block}: {e}")
-            block_summaries.append({"block": block, "summary": "Error generating summary."})
 
-    return block_summaries
+def refresh_block_summaries(force: bool = False, retries: int = SUMMARY_RETRIES) -> list:
+    """
+    Brings the stored block summaries up to date and returns them.
+    Only blocks whose watermark moved are re-read, and of those only the
+    ones whose complaint ids/descriptions actually changed are sent to
+    the LLM; status-only changes just refresh the watermark.
+    """
+    watermarks = get_block_watermarks()
+    cached = {s["_id"]: s for s in get_block_summaries()}
+
+    delete_block_summaries([block for block in cached if block not in watermarks])
+
+    stale = [
+        block for block, watermark in watermarks.items()
+        if force or block not in cached or cached[block].get("watermark") != watermark
+    ]
+    if stale:
+        # {"$in": [None]} also matches complaints without a block field.
+        block_wise_complaints = defaultdict(list)
+        for c in get_all_complaints({"block": {"$in": stale}}, view="vector"):
+            block_wise_complaints[c.get("block")].append(c)
+
+        to_summarize = {}
+        input_hashes = {}
+        for block in stale:
+            input_hashes[block] = _block_input_hash(block_wise_complaints[block])
+            previous = cached.get(block, {})
+            if force or not previous.get("summary") or previous.get("input_hash") != input_hashes[block]:
+                to_summarize[block] = block_wise_complaints[block]
+            else:
+                save_block_summary(block, watermarks[block], input_hashes[block])
+
+        print(f"[INFO] {len(stale)} blocks changed, {len(to_summarize)} need new summaries.")
+        for result in _summarize_blocks(to_summarize, retries):
+            block = result["block"]
+            if result["summary"] == SUMMARY_ERROR:
+                # Keep the previous summary and retry on the next refresh.
+                continue
+            save_block_summary(block, watermarks[block], input_hashes[block], result["summary"])
+
+    return get_cached_block_summaries()
@@ -0,0 +1,108 @@
+"""
+Embeds complaints that have no embedding, or (with --reembed) whose
+embedding was produced by a different model or size than
+chat.EMBEDDING_VERSION.
+
+    python -m llm.backfill_embeddings [--workers 4] [--batch-size 100] [--reembed]
+
+Progress is resumable by construction: each finished batch is written
+back immediately and no longer matches the query, so an interrupted run
+simply picks up the remaining documents when started again.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from llm.chat import embed_batch, EMBEDDING_VERSION, EMBED_BATCH_SIZE
+from mongodb.mongo_client import complaints_collection
+from mongodb.handlers import PENDING_ANALYSIS_STATUS
+
+
+def backfill_query(reembed: bool = False) -> dict:
+    # Complaints still pending analysis are embedded by the intake workers.
+    query = {"status": {"$ne": PENDING_ANALYSIS_STATUS}}
+    if reembed:
+        query["embedding_model"] = {"$ne": EMBEDDING_VERSION}
+    else:
+        query["embedding"] = {"$exists": False}
+    return query
+
+
+def embed_and_store(complaints: list) -> int:
+    embeddings = embed_batch([c.get("description", "") for c in complaints])
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"_id": c["_id"]},
+            {"$set": {
+                "embedding": embedding,
+                "embedding_model": EMBEDDING_VERSION,
+                "embedding_updated_at": now
+            }}
+        )
+        for c, embedding in zip(complaints, embeddings)
+        if embedding is not None
+    ]
+    if updates:
+        complaints_collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+def run_backfill(workers: int = 4, batch_size: int = EMBED_BATCH_SIZE, reembed: bool = False) -> dict:
+    query = backfill_query(reembed)
+    total = complaints_collection.count_documents(query)
+    print(f"[START] {total} complaints to embed with {EMBEDDING_VERSION} ({workers} workers).")
+
+    done = 0
+    last_id = None
+    started = time.perf_counter()
+    in_flight = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            page_query = dict(query)
+            if last_id is not None:
+                page_query["_id"] = {"$gt": last_id}
+            page = list(
+                complaints_collection.find(page_query, {"_id": 1, "description": 1})
+                .sort("_id", 1)
+                .limit(batch_size)
+            )
+            if page:
+                last_id = page[-1]["_id"]
+                in_flight.add(executor.submit(embed_and_store, page))
+
+            # Bound the work queued ahead of the workers.
+            if in_flight and (len(in_flight) >= workers * 2 or not page):
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        done += future.result()
+                    except Exception as e:
+                        print(f"[WARNING] Batch failed: {e}")
+                print(f"[INFO] {done}/{total} embedded ({time.perf_counter() - started:.1f}s)")
+
+            if not page and not in_flight:
+                break
+
+    remaining = complaints_collection.count_documents(query)
+    print(f"[SUCCESS] Embedded {done} complaints; {remaining} left for the next run.")
+    return {"embedded": done, "remaining": remaining}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--reembed", action="store_true", help="re-embed complaints from other models or sizes")
+    args = parser.parse_args(argv)
+    result = run_backfill(args.workers, args.batch_size, args.reembed)
+    return 0 if result["remaining"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,94 +1,373 @@
+import logging
+import os
 import re
+import time
+import random
+import threading
+from collections import OrderedDict
 from llm.llm_client import gemini_client
 from llm.prompts import CHATBOT_PROMPT
+from llm.embedding_cache import EmbeddingCache
+from llm.semantic_cache import SemanticCache, context_fingerprint
+from llm.query_router import route_query, extract_block, block_values, BLOCK_PATTERN
+from llm.retrieval import (
+    candidate_settings, rerank_context, reciprocal_rank_fusion, context_text,
+    FETCH_LIMIT, CONTEXT_MAX_DOCS
+)
 from mongodb.mongo_client import complaints_collection
+from mongodb.indexes import EMBEDDING_DIMENSIONS, FULL_EMBEDDING_DIMENSIONS, VECTOR_INDEX_NAME
+from mongodb.handlers import register_change_listener
+from mongodb import lexical
+from mongodb.inverted_index import tokenize
+from bson import ObjectId
 from typing import List
 from google.genai import types
 
 
 client = gemini_client.client
+logger = logging.getLogger(__name__)
 
-def chatbot(query: str):
-    
-    block = re.search(r'\bblock\s*([A-Z]\d*)\b', query, re.IGNORECASE)
-    block = block.group(1).upper() if block else None
+EMBEDDING_MODEL = "gemini-embedding-001"
+# Identifies how stored embeddings were made (the embedding_model field and
+# cache keys): the model, plus the size when it is reduced from the full 3072.
+EMBEDDING_VERSION = (
+    EMBEDDING_MODEL if EMBEDDING_DIMENSIONS == FULL_EMBEDDING_DIMENSIONS
+    else f"{EMBEDDING_MODEL}/{EMBEDDING_DIMENSIONS}"
+)
+EMBED_TIMEOUT = 30  # seconds per embed_content request
+EMBED_CONFIG = types.EmbedContentConfig(
+    output_dimensionality=None if EMBEDDING_DIMENSIONS == FULL_EMBEDDING_DIMENSIONS else EMBEDDING_DIMENSIONS,
+    http_options=types.HttpOptions(timeout=EMBED_TIMEOUT * 1000)
+)
+EMBED_BATCH_SIZE = 100  # max texts per embed_content request
+EMBED_BATCH_RETRIES = 3
+embedding_cache = EmbeddingCache.from_env()
+semantic_cache = SemanticCache.from_env()
+register_change_listener(lambda complaint_id, block: semantic_cache.invalidate_block(block))
+
+SELECTIVITY_TTL = 60  # seconds a filter's match count is reused
+SELECTIVITY_CACHE_SIZE = 256  # filter combinations kept, least recently used evicted
+_selectivity_cache = OrderedDict()
+_selectivity_lock = threading.Lock()
+
+# "hybrid" fuses lexical matches with vector search; "vector" uses only the latter.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+FAST_PATH_MAX_TERMS = 3
+CONTEXT_STATUSES = ["open", "pending"]
+CONTEXT_PROJECTION = {"_id": 1, "resident_name": 1, "description": 1, "block": 1, "embedding": 1}
+
+def _lexical_filters(block: str) -> dict:
+    return {"status": CONTEXT_STATUSES, "block": block_values(block)}
+
+def fetch_context_documents(complaint_ids: list) -> list:
+    """Loads complaints by id in the given order, with the fields rerank_context uses."""
+    if not complaint_ids:
+        return []
+    found = {
+        str(doc["_id"]): doc
+        for doc in complaints_collection.find(
+            {"_id": {"$in": [ObjectId(i) for i in complaint_ids]}}, CONTEXT_PROJECTION
+        )
+    }
+    return [found[i] for i in complaint_ids if i in found]
+
+def lexical_fast_path(query: str, block: str):
+    """
+    Returns the context documents when every key term of a short query
+    is found together in at most CONTEXT_MAX_DOCS complaints (a name or
+    a specific word such as "transformer"), so no embedding is needed.
+    Returns None otherwise.
+    """
+    text = re.sub(BLOCK_PATTERN, " ", query, flags=re.IGNORECASE)
+    if not 0 < len(tokenize(text)) <= FAST_PATH_MAX_TERMS:
+        return None
+    hits = lexical.search_lexical(text, CONTEXT_MAX_DOCS + 1, _lexical_filters(block), match_all=True)
+    if not hits or len(hits) > CONTEXT_MAX_DOCS:
+        return None
+    fused = reciprocal_rank_fusion([complaint_id for complaint_id, _ in hits])
+    documents = fetch_context_documents([complaint_id for complaint_id, _ in hits])
+    for doc in documents:
+        doc["lexical"] = True
+        doc["rrf_score"] = fused[str(doc["_id"])]
+    return documents
+
+def fuse_lexical(query: str, block: str, vector_hits: list) -> list:
+    """Merges lexical matches into vector hits, ordered by reciprocal rank fusion."""
+    text = re.sub(BLOCK_PATTERN, " ", query, flags=re.IGNORECASE)
+    lexical_ids = [
+        complaint_id for complaint_id, _ in
+        lexical.search_lexical(text, FETCH_LIMIT, _lexical_filters(block))
+    ]
+    vector_ids = [str(doc["_id"]) for doc in vector_hits]
+    fused = reciprocal_rank_fusion(vector_ids, lexical_ids)
+
+    documents = {str(doc["_id"]): doc for doc in vector_hits}
+    missing = [i for i in lexical_ids if i not in documents]
+    for doc in fetch_context_documents(missing):
+        documents[str(doc["_id"])] = doc
+    for complaint_id in lexical_ids:
+        if complaint_id in documents:
+            documents[complaint_id]["lexical"] = True
+    for complaint_id, doc in documents.items():
+        doc["rrf_score"] = fused[complaint_id]
+    return sorted(documents.values(), key=lambda doc: -doc["rrf_score"])
+
+def retrieve_context(query: str):
+    """
+    Embeds the query, runs the vector search (fused with lexical matches
+    in hybrid mode) and re-ranks the hits into the context set.
+    Returns (query_vector, block, documents); query_vector is None when
+    the lexical fast path answered without embedding.
+    """
+    block = extract_block(query)
+    if RETRIEVAL_MODE == "hybrid":
+        documents = lexical_fast_path(query, block)
+        if documents is not None:
+            logger.info("chatbot lexical fast path: %d documents", len(documents))
+            return None, block, rerank_context(None, documents)
 
     query_vector = embed_generator(query)
-    vector_results = vector_search_complaints(query_vector, block)
-    contents = (
+    hits = vector_search_complaints(query_vector, block)
+    if RETRIEVAL_MODE == "hybrid":
+        hits = fuse_lexical(query, block, hits)
+    return query_vector, block, rerank_context(query_vector, hits)
+
+def build_chat_contents(query: str, documents: list) -> str:
+    return (
         "CONTEXT:\n"
-        + "\n".join(
-            f"- {doc.get('resident_name')} ({doc.get('block')}): "
-            f"{doc.get('description').strip()}"
-            for doc in vector_results
-        )
+        + "\n".join(context_text(doc) for doc in documents)
         + f"\n\nUSER_QUERY:\n{query.strip()}"
     )
-    
+
+def _log_latency(path: str, started: float, first_token: float, finished: float):
+    logger.info(
+        "chatbot %s: time to first token %.3fs, total %.3fs",
+        path, first_token - started, finished - started
+    )
+
+def chatbot(query: str):
+    started = time.perf_counter()
+    structured = route_query(query)
+    if structured is not None:
+        finished = time.perf_counter()
+        _log_latency("structured", started, finished, finished)
+        return structured
+
+    query_vector, block, documents = retrieve_context(query)
+    fingerprint = context_fingerprint(documents)
+    cached = semantic_cache.lookup(query_vector, block, fingerprint)
+    if cached is not None:
+        finished = time.perf_counter()
+        _log_latency("cached", started, finished, finished)
+        return cached
+    contents = build_chat_contents(query, documents)
+
     try:
         response = client.models.generate_content(
             model="gemini-2.5-flash",
             config=types.GenerateContentConfig(
             system_instruction=CHATBOT_PROMPT),
             contents=contents)
-        text_response = response.text.strip()
-        cleaned_text = re.search(r"\{.*\}", text_response, re.DOTALL)
-        if cleaned_text:
-            text_response = cleaned_text.group(0)
+        text_response = clean_answer(response.text)
     except Exception as e:
         return {"error": str(e)}
+    semantic_cache.store(query_vector, block, fingerprint, text_response)
+    finished = time.perf_counter()
+    # Nothing is shown until the whole answer exists.
+    _log_latency("blocking", started, finished, finished)
     return text_response
 
-def embed_generator(contents:str):
+def clean_answer(text: str) -> str:
+    """
+    The answer as it is returned and cached: the JSON object when the model
+    wrapped one in other text. Both chatbot paths cache through this, so a
+    cached answer reads the same whichever path replays it.
+    """
+    text = text.strip()
+    cleaned_text = re.search(r"\{.*\}", text, re.DOTALL)
+    return cleaned_text.group(0) if cleaned_text else text
+
+def chatbot_stream(query: str):
+    """
+    Streaming variant of chatbot: yields the answer text chunk by chunk as
+    Gemini produces it (suitable for st.write_stream). Cached and
+    aggregate (see llm.query_router) answers are yielded in one piece.
+    """
+    started = time.perf_counter()
+    structured = route_query(query)
+    if structured is not None:
+        yield structured
+        finished = time.perf_counter()
+        _log_latency("structured", started, finished, finished)
+        return
+
+    query_vector, block, documents = retrieve_context(query)
+    fingerprint = context_fingerprint(documents)
+    cached = semantic_cache.lookup(query_vector, block, fingerprint)
+    if cached is not None:
+        yield cached
+        finished = time.perf_counter()
+        _log_latency("cached", started, finished, finished)
+        return
+    contents = build_chat_contents(query, documents)
+    first_token = None
+    chunks = []
+
+    try:
+        stream = client.models.generate_content_stream(
+            model="gemini-2.5-flash",
+            config=types.GenerateContentConfig(
+            system_instruction=CHATBOT_PROMPT),
+            contents=contents)
+        for chunk in stream:
+            if not chunk.text:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunks.append(chunk.text)
+            yield chunk.text
+        semantic_cache.store(query_vector, block, fingerprint, clean_answer("".join(chunks)))
+    except Exception as e:
+        yield f"\n\n⚠️ Error: {e}"
+    finished = time.perf_counter()
+    _log_latency("streaming", started, first_token or finished, finished)
+
+def normalize_embedding(values) -> list:
+    """
+    Unit-length copy of an embedding. Only full-size Gemini embeddings come
+    back normalized; reduced (Matryoshka) ones must be renormalized before
+    cosine or dot-product comparisons.
+    """
+    norm = sum(v * v for v in values) ** 0.5
+    return [v / norm for v in values] if norm else list(values)
+
+def truncate_embedding(values, dimensions: int = EMBEDDING_DIMENSIONS) -> list:
+    """The leading `dimensions` values, renormalized (what output_dimensionality returns)."""
+    return normalize_embedding(values[:dimensions])
+
+def _embed_remote(contents: str):
     try:
         response = client.models.embed_content(
-        model="gemini-embedding-001",
-        contents= contents
+        model=EMBEDDING_MODEL,
+        contents= contents,
+        config=EMBED_CONFIG
         )
-        return response.embeddings[0].values
+        return normalize_embedding(response.embeddings[0].values)
     except Exception as e:
         print(f"Error generating embedding: {str(e)}")
         return None
 
-def vector_search_complaints(query_vector: List[float], block: str = None):
+def embed_generator(contents:str):
+    """
+    Embeds text, serving repeated texts from embedding_cache.
+    """
+    return embedding_cache.get_or_compute(EMBEDDING_VERSION, contents, _embed_remote)
+
+def _embed_chunk(texts: List[str], retries: int = EMBED_BATCH_RETRIES):
+    for attempt in range(retries):
+        try:
+            response = client.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=texts,
+                config=EMBED_CONFIG
+            )
+            return [normalize_embedding(e.values) for e in response.embeddings]
+        except Exception as e:
+            print(f"[WARNING] Embedding batch attempt {attempt + 1} failed: {e}")
+            if attempt < retries - 1:
+                time.sleep(2 ** attempt + random.uniform(0, 1))
+    return None
+
+def embed_batch(texts: List[str], batch_size: int = EMBED_BATCH_SIZE, retries: int = EMBED_BATCH_RETRIES):
+    """
+    Embeds many texts with one request per chunk of batch_size.
+    Returns a list aligned with texts; entries whose chunk still failed
+    after `retries` attempts are None. Cached texts are not re-sent, and
+    a failing chunk does not affect the others.
+    """
+    results = [embedding_cache.get(EMBEDDING_VERSION, text) for text in texts]
+
+    pending = {}
+    for i, embedding in enumerate(results):
+        if embedding is None:
+            pending.setdefault(texts[i], []).append(i)
+    unique_texts = list(pending)
+
+    for start in range(0, len(unique_texts), batch_size):
+        chunk = unique_texts[start:start + batch_size]
+        embeddings = _embed_chunk(chunk, retries)
+        if embeddings is None:
+            continue
+        for text, embedding in zip(chunk, embeddings):
+            embedding_cache.put(EMBEDDING_VERSION, text, embedding)
+            for i in pending[text]:
+                results[i] = list(embedding)
+
+    return results
+
+def filter_selectivity(vector_filters: dict):
+    """
+    Returns (matching, total) complaint counts for a $vectorSearch filter,
+    reusing counts younger than SELECTIVITY_TTL.
+    """
+    key = repr(vector_filters)
+    with _selectivity_lock:
+        cached = _selectivity_cache.get(key)
+        if cached and time.monotonic() - cached[0] < SELECTIVITY_TTL:
+            _selectivity_cache.move_to_end(key)
+            return cached[1]
+    try:
+        counts = (
+            complaints_collection.count_documents(vector_filters),
+            complaints_collection.estimated_document_count()
+        )
+    except Exception as e:
+        print(f"[WARNING] Could not count complaints for filter: {e}")
+        return None
+    with _selectivity_lock:
+        _selectivity_cache[key] = (time.monotonic(), counts)
+        _selectivity_cache.move_to_end(key)
+        while len(_selectivity_cache) > SELECTIVITY_CACHE_SIZE:
+            _selectivity_cache.popitem(last=False)
+    return counts
+
+def vector_search_complaints(query_vector: List[float], block: str = None, limit: int = FETCH_LIMIT):
+    """
+    Returns up to `limit` open/pending complaints nearest to query_vector,
+    with their score and embedding (for rerank_context). numCandidates is
+    sized by how many complaints the filter matches.
+    """
     if not query_vector or not isinstance(query_vector, list):
         raise ValueError("query_vector must be a non-empty list of floats.")
 
     filters = [
-        {"status": {"$in": ["open", "pending"]}}
+        {"status": {"$in": CONTEXT_STATUSES}}
     ]
 
-    if block:
-        block = block.upper().strip()
+    blocks = block_values(block)
+    if blocks:
+        filters.append({"block": {"$in": blocks}})
 
-        if re.match(r"^[A-Z]\d+$", block):
-            filters.append({"block": {"$eq": block}})
-
-        elif re.match(r"^[A-Z]$", block):
-            possible_blocks = [f"{block}{i}" for i in range(1, 10)]  
-            filters.append({"block": {"$in": possible_blocks}})
-    
     vector_filters = {"$and": filters}
 
+    num_candidates = 300
+    counts = filter_selectivity(vector_filters)
+    if counts:
+        num_candidates, limit = candidate_settings(*counts, limit=limit)
+
     pipeline = [
     {
         "$vectorSearch": {
-            "index": "complaints_embedding_index",
+            "index": VECTOR_INDEX_NAME,
             "path": "embedding",
             "queryVector": query_vector,
-            "numCandidates": 300,
-            "limit": 20,
+            "numCandidates": num_candidates,
+            "limit": limit,
             "filter": vector_filters
         }
     },
     {
-        "$project": {
-            "_id": 0,
-            "resident_name": 1,
-            "description": 1,
-            "block": 1,
-            "score": {"$meta": "vectorSearchScore"}
-        }
+        "$project": {**CONTEXT_PROJECTION, "score": {"$meta": "vectorSearchScore"}}
     }
     ]
 
@@ -0,0 +1,159 @@
+"""
+Content-addressed cache for embeddings.
+
+Entries are keyed by (model, hash of whitespace-normalized text), kept in
+an in-memory LRU and optionally persisted to a backing store so repeated
+texts survive restarts:
+
+    EMBEDDING_CACHE_SIZE=1024          # in-memory entries
+    EMBEDDING_CACHE_STORE=mongo        # or a path to an SQLite file
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, embedding TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, model: str, embedding: list):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, embedding) VALUES (?, ?, ?)",
+                (key, model, json.dumps(embedding))
+            )
+            self._conn.commit()
+
+
+class MongoEmbeddingStore:
+    def __init__(self, collection=None):
+        if collection is None:
+            from mongodb.mongo_client import mongo_client
+            collection = mongo_client.db["embedding_cache"]
+        self.collection = collection
+
+    def get(self, key: str):
+        doc = self.collection.find_one({"_id": key}, {"embedding": 1})
+        return doc["embedding"] if doc else None
+
+    def put(self, key: str, model: str, embedding: list):
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {"model": model, "embedding": embedding}},
+            upsert=True
+        )
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        store_setting = os.getenv("EMBEDDING_CACHE_STORE", "")
+        store = None
+        if store_setting == "mongo":
+            store = MongoEmbeddingStore()
+        elif store_setting:
+            store = SQLiteEmbeddingStore(store_setting)
+        return cls(int(os.getenv("EMBEDDING_CACHE_SIZE", DEFAULT_MAX_ENTRIES)), store)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, embedding: list):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, model: str, text: str):
+        key = embedding_key(model, text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(embedding)
+
+        if self.store is not None:
+            try:
+                embedding = self.store.get(key)
+            except Exception as e:
+                print(f"Error reading embedding cache store: {e}")
+                embedding = None
+            if embedding is not None:
+                self.store_hits += 1
+                self._remember(key, embedding)
+                return list(embedding)
+
+        self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, embedding: list):
+        key = embedding_key(model, text)
+        self._remember(key, list(embedding))
+        if self.store is not None:
+            try:
+                self.store.put(key, model, list(embedding))
+            except Exception as e:
+                print(f"Error writing embedding cache store: {e}")
+
+    def get_or_compute(self, model: str, text: str, compute):
+        """
+        Returns the cached embedding or calls compute(text) and caches its
+        result. Failed computations (None) are not cached.
+        """
+        embedding = self.get(model, text)
+        if embedding is None:
+            embedding = compute(text)
+            if embedding is not None:
+                self.put(model, text, embedding)
+        return embedding
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.store_hits = self.misses = 0
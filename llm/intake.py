@@ -0,0 +1,81 @@
+"""
+Background intake for resident complaints.
+
+submit_complaint stores the complaint immediately (status
+pending_analysis) and returns; a worker pool then runs analyze_complaint,
+which classifies and embeds concurrently, and patches the document to
+status "open". Complaints left pending by a restart are picked up by
+recover_pending. After MAX_ANALYSIS_ATTEMPTS failures a complaint is
+opened unanalysed, flagged analysis_failed, for an admin to review.
+
+    INTAKE_WORKERS=4   # complaints analysed in parallel
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm.agents import analyze_complaint
+from mongodb.handlers import (
+    create_pending_complaint,
+    complete_complaint_analysis,
+    record_analysis_failure,
+    mark_analysis_failed,
+    get_pending_analysis
+)
+
+INTAKE_WORKERS = int(os.getenv("INTAKE_WORKERS", 4))
+MAX_ANALYSIS_ATTEMPTS = 3
+
+
+class IntakePipeline:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.workers = ThreadPoolExecutor(
+                max_workers=INTAKE_WORKERS, thread_name_prefix="intake"
+            )
+        return cls._instance
+
+    def submit_complaint(self, payload: dict) -> str:
+        complaint_id = create_pending_complaint(payload)
+        self.workers.submit(self._process, complaint_id, payload)
+        return complaint_id
+
+    def recover_pending(self) -> int:
+        pending = get_pending_analysis()
+        for complaint in pending:
+            if complaint.get("analysis_attempts", 0) >= MAX_ANALYSIS_ATTEMPTS:
+                mark_analysis_failed(str(complaint["_id"]))
+            else:
+                self.workers.submit(self._process, str(complaint["_id"]), complaint)
+        return len(pending)
+
+    def _analyze(self, payload: dict) -> dict:
+        analysis = analyze_complaint(payload)
+        if "error" in analysis:
+            raise ValueError(analysis["error"])
+        if analysis.get("embedding") is None:
+            raise ValueError("Embedding generation failed")
+        analysis["embedding"] = list(analysis["embedding"])
+        return analysis
+
+    def _process(self, complaint_id: str, payload: dict):
+        payload = {field: payload.get(field) for field in ("resident_name", "block", "description")}
+        while True:
+            try:
+                complete_complaint_analysis(complaint_id, self._analyze(payload))
+                return
+            except Exception as e:
+                attempts = record_analysis_failure(complaint_id, str(e))
+                print(f"[WARNING] Analysis of complaint {complaint_id} failed (attempt {attempts}): {e}")
+                if attempts >= MAX_ANALYSIS_ATTEMPTS:
+                    mark_analysis_failed(complaint_id)
+                    return
+                if not attempts:
+                    return
+                time.sleep(2 ** attempts)
+
+
+intake_pipeline = IntakePipeline()
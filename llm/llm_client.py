@@ -9,6 +9,12 @@ class GeminiClient:
 
     def __new__(cls):
         if cls._instance is None:
+            if os.getenv("GEMINI_USE_STUB"):
+                from llm.stub_client import StubGeminiClient
+                cls._instance = super().__new__(cls)
+                cls._instance.client = StubGeminiClient()
+                return cls._instance
+
             gemini_api_key = os.getenv("GEMINI_API_KEY")
             if not gemini_api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
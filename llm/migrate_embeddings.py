@@ -0,0 +1,108 @@
+"""
+Moves stored complaint embeddings to the configured EMBEDDING_DIMENSIONS.
+
+    EMBEDDING_DIMENSIONS=768 python -m llm.migrate_embeddings truncate [--batch-size 500] [--dry-run]
+    EMBEDDING_DIMENSIONS=768 python -m llm.migrate_embeddings reembed [--workers 4]
+
+truncate keeps the leading dimensions of each larger gemini-embedding-001
+vector and renormalizes them. The model is Matryoshka-trained, so this is
+what output_dimensionality would have returned, without any API calls.
+Embeddings that are smaller than the target or come from another model
+are left for reembed, which calls the API (llm.backfill_embeddings).
+
+Both are resumable: migrated complaints carry the new embedding_model
+(chat.EMBEDDING_VERSION) and no longer match. Afterwards the local
+embedding store is rebuilt; apply the vector index (python -m
+mongodb.indexes apply) and run a full theme refit.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from llm.chat import EMBEDDING_MODEL, EMBEDDING_VERSION, EMBEDDING_DIMENSIONS, truncate_embedding
+from llm.backfill_embeddings import run_backfill
+from mongodb.embedding_store import get_embedding_store
+from mongodb.mongo_client import complaints_collection
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def migration_query() -> dict:
+    return {"embedding": {"$exists": True}, "embedding_model": {"$ne": EMBEDDING_VERSION}}
+
+
+def _truncatable(complaint: dict) -> bool:
+    model = complaint.get("embedding_model") or EMBEDDING_MODEL
+    return model.split("/")[0] == EMBEDDING_MODEL and len(complaint["embedding"]) >= EMBEDDING_DIMENSIONS
+
+
+def run_truncate(batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False) -> dict:
+    total = complaints_collection.count_documents(migration_query())
+    print(f"[START] {total} embeddings to move to {EMBEDDING_VERSION} ({EMBEDDING_DIMENSIONS} dimensions).")
+
+    truncated = skipped = 0
+    last_id = None
+    started = time.perf_counter()
+    while True:
+        query = migration_query()
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        page = list(
+            complaints_collection.find(query, {"embedding": 1, "embedding_model": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not page:
+            break
+        last_id = page[-1]["_id"]
+
+        now = datetime.utcnow()
+        updates = []
+        for complaint in page:
+            if not _truncatable(complaint):
+                skipped += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": complaint["_id"]},
+                {"$set": {
+                    "embedding": truncate_embedding(complaint["embedding"], EMBEDDING_DIMENSIONS),
+                    "embedding_model": EMBEDDING_VERSION,
+                    "embedding_updated_at": now
+                }}
+            ))
+        if updates and not dry_run:
+            complaints_collection.bulk_write(updates, ordered=False)
+        truncated += len(updates)
+        print(f"[INFO] {truncated + skipped}/{total} checked ({time.perf_counter() - started:.1f}s)")
+
+    verb = "Would truncate" if dry_run else "Truncated"
+    print(f"[SUCCESS] {verb} {truncated} embeddings; {skipped} need `reembed`.")
+    return {"truncated": truncated, "needs_reembed": skipped}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["truncate", "reembed"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="truncate: only count what would change")
+    args = parser.parse_args(argv)
+
+    if args.mode == "truncate":
+        result = run_truncate(args.batch_size, args.dry_run)
+        changed, remaining = result["truncated"], result["needs_reembed"]
+    else:
+        result = run_backfill(args.workers, reembed=True)
+        changed, remaining = result["embedded"], result["remaining"]
+
+    if changed and not args.dry_run:
+        print(f"[INFO] Rebuilding the embedding store: {get_embedding_store().rebuild()}")
+        print("[INFO] Next: `python -m mongodb.indexes apply` for the vector index, then a full theme refit.")
+    return 0 if remaining == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,90 @@
+"""
+Token-budgeted selection of complaint descriptions for summary prompts.
+
+Busy blocks and large clusters can hold thousands of descriptions; only a
+representative, de-duplicated subset that fits the budget is sent.
+"""
+import math
+import re
+from collections import Counter
+import numpy as np
+
+CHARS_PER_TOKEN = 4
+SUMMARY_TOKEN_BUDGET = 6000
+DEDUPE_SIMILARITY = 0.95
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _normalized(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def select_representative(descriptions: list, embeddings=None,
+                          token_budget: int = SUMMARY_TOKEN_BUDGET,
+                          max_items: int = None,
+                          dedupe_similarity: float = DEDUPE_SIMILARITY) -> list:
+    """
+    Picks descriptions closest to the group's embedding centroid first,
+    skipping exact repeats and any whose embedding has cosine similarity
+    >= dedupe_similarity to one already picked, until token_budget or
+    max_items is reached. Without embeddings, input order is kept and
+    only exact repeats are removed. Entries of `embeddings` may be None or
+    of another size than the most common one (mid-migration); those
+    descriptions are considered after the embedded ones.
+    """
+    if not descriptions:
+        return []
+
+    order = list(range(len(descriptions)))
+    vectors = None
+    if embeddings is not None:
+        sizes = Counter(len(e) for e in embeddings if e is not None and len(e))
+        dims = sizes.most_common(1)[0][0] if sizes else 0
+        embedded = [i for i, e in enumerate(embeddings) if e is not None and len(e) == dims]
+        if embedded:
+            vectors = np.zeros((len(descriptions), dims), dtype=np.float32)
+            vectors[embedded] = np.asarray([embeddings[i] for i in embedded], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+
+            centroid = vectors[embedded].mean(axis=0)
+            distances = np.full(len(descriptions), np.inf)
+            distances[embedded] = np.linalg.norm(vectors[embedded] - centroid, axis=1)
+            order = list(np.argsort(distances, kind="stable"))
+
+    selected, seen_texts = [], set()
+    kept_vectors = None
+    if vectors is not None:
+        capacity = min(len(descriptions), max_items or len(descriptions), token_budget)
+        kept_vectors = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+    n_kept = 0
+    used_tokens = 0
+    for i in order:
+        text = descriptions[i]
+        key = _normalized(text)
+        if not key or key in seen_texts:
+            continue
+
+        has_vector = vectors is not None and vectors[i].any()
+        if has_vector and n_kept and float(np.max(kept_vectors[:n_kept] @ vectors[i])) >= dedupe_similarity:
+            continue
+
+        tokens = estimate_tokens(text) + 1
+        if used_tokens + tokens > token_budget:
+            continue
+
+        selected.append(text)
+        seen_texts.add(key)
+        if has_vector:
+            kept_vectors[n_kept] = vectors[i]
+            n_kept += 1
+        used_tokens += tokens
+        if max_items and len(selected) >= max_items:
+            break
+
+    return selected
@@ -0,0 +1,261 @@
+"""
+Answers aggregate chat questions ("how many open complaints in B3?",
+"which category has the most high-severity issues?") with MongoDB
+aggregations instead of embedding, vector search and generation.
+
+Filters (block, status, severity, category) are pulled out with regexes
+and the intent is scored by a small keyword classifier; route_query
+returns None for anything that is not confidently an aggregate, or that
+has words none of the matchers used (a name, a date, a place), and the
+chatbot then answers it from retrieved complaints as before.
+"""
+import re
+
+from mongodb.analytics import count_complaints, average_resolution_time
+from mongodb.block_summaries import BLOCK_ORDER
+
+# "block A2" / "block a", or a bare known block name in capitals ("B3"),
+# so that "vitamin B12" is not read as a block.
+BLOCK_PATTERN = rf'\b(?:block\s*([A-Z]\d*)|(?-i:({"|".join(BLOCK_ORDER)})))\b'
+
+STATUS_TERMS = [
+    (r"\b(open|pending|unresolved|active|outstanding)\b", ["open", "pending"], "open"),
+    (r"\b(resolved|closed|fixed|completed)\b", ["closed"], "resolved"),
+    (r"\b(junk|spam)\b", ["junk"], "junk"),
+]
+SEVERITY_PATTERN = (
+    r"\b(high|medium|low)[\s-]*(?:severity|priority)\b"
+    r"|\b(?:severity|priority)(?:\s+level)?(?:\s+is)?\s+(high|medium|low)\b"
+)
+CATEGORY_ALIASES = [
+    (r"\bwater\s*supply|\bwater\b", "Water Supply"),
+    (r"\bclean(?:liness|ing)?\b|\bdirty\b", "Cleanliness"),
+    (r"\belectric(?:ity|al)?\b|\bpower\b", "Electricity"),
+    (r"\broads?\b|\bpotholes?\b", "Road Maintenance"),
+    (r"\bgarbage\b|\btrash\b|\bwaste\b", "Garbage Management"),
+    (r"\bnoise\b|\bnoisy\b|\bloud\b", "Noise Pollution"),
+    (r"\bsafety\b|\bsecurity\b", "Public Safety"),
+    (r"\bstreet\s*lights?\b|\bstreet\s*lighting\b", "Street Lighting"),
+    (r"\bdrain(?:age|s)?\b", "Drainage"),
+]
+GROUP_FIELDS = {
+    "category": "category", "categories": "category", "type": "category", "types": "category",
+    "block": "block", "blocks": "block",
+    "severity": "severity_level", "severities": "severity_level",
+    "status": "status", "statuses": "status",
+}
+GROUP_LABELS = {"category": "Category", "block": "Block", "severity_level": "Severity", "status": "Status"}
+
+INTENT_CUES = {
+    "count": [
+        (r"\bhow many\b", 2.0),
+        (r"\b(number|count|total)\b", 1.5),
+    ],
+    "top": [
+        (r"\b(which|what)\s+(category|categories|block|blocks|severity|type|status)\b", 1.5),
+        (r"\b(most|highest|maximum|max|top)\b", 1.0),
+        (r"\b(breakdown|distribution|ranking|rank)\b", 2.0),
+        (r"\b(per|by|each)\s+(category|block|severity|type|status)\b", 2.0),
+    ],
+    "resolution": [
+        (r"\b(average|mean|avg|typical)\b.*\b(resolution|resolve|resolving|fix|close)", 3.0),
+        (r"\b(how long)\b.*\b(resolve|fix|close|take)", 3.0),
+        (r"\bresolution time\b", 2.0),
+    ],
+}
+# Questions about the content of complaints belong to the RAG path.
+RAG_CUES = [
+    (r"\b(why|describe|summari[sz]e|explain|details?|examples?|what (are|is) (the )?(complaints?|issues?|problems?))\b", 2.0),
+    (r"\b(who|mention|mentions|about)\b", 1.0),
+]
+INTENT_THRESHOLD = 1.5
+TOP_GROUPS = 5
+GROUP_PATTERN = (
+    r"\b(?:which|what|per|by|each|most common|top)\s+"
+    r"(category|categories|block|blocks|severity|severities|type|types|status|statuses)\b"
+)
+# Words an aggregate question may contain besides what the matchers use.
+# Anything else ("How many complaints did Rahul file?") is a constraint the
+# router can't apply, so the question goes through retrieval instead.
+FILLER_WORDS = {
+    "what", "which", "how", "number", "count", "total", "most", "average", "mean",
+    "a", "an", "the", "of", "in", "on", "at", "for", "from", "to", "with", "and", "or",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have", "had",
+    "there", "it", "its", "we", "our", "me", "us", "you", "so", "far", "currently", "right", "now",
+    "all", "overall", "any", "many", "much", "tell", "show", "give", "please",
+    "complaint", "complaints", "issue", "issues", "problem", "problems", "case", "cases",
+    "report", "reports", "reported", "file", "filed", "raised", "logged", "submitted", "registered",
+    "get", "gets", "got", "take", "takes", "time", "level", "severity", "priority", "area",
+    "one", "ones",
+}
+
+
+def extract_block(query: str):
+    block = re.search(BLOCK_PATTERN, query, re.IGNORECASE)
+    if not block:
+        return None
+    return (block.group(1) or block.group(2)).upper()
+
+
+def block_values(block: str):
+    """Block names matched by a query's block filter ("A2" or all of "A")."""
+    if not block:
+        return None
+    block = block.upper().strip()
+    if re.match(r"^[A-Z]\d+$", block):
+        return [block]
+    if re.match(r"^[A-Z]$", block):
+        return [f"{block}{i}" for i in range(1, 10)]
+    return None
+
+
+def _cue_scores(text: str, cues: list, used: list) -> float:
+    score = 0.0
+    for pattern, weight in cues:
+        match = re.search(pattern, text)
+        if match:
+            score += weight
+            _mark_used(match, used)
+    return score
+
+
+def _mark_used(match, used: list):
+    """Records the spans a matcher consumed: its groups, or the whole match."""
+    groups = [i for i in range(1, (match.re.groups or 0) + 1) if match.group(i) is not None]
+    used.extend([match.span(i) for i in groups] if groups else [match.span()])
+
+
+def _unused_words(text: str, used: list) -> list:
+    for start, end in used:
+        text = text[:start] + " " * (end - start) + text[end:]
+    return [word for word in re.findall(r"[a-z0-9]+", text) if word not in FILLER_WORDS]
+
+
+def classify_intent(query: str, used: list = None):
+    """
+    Returns (intent, margin): the best-scoring aggregate intent and its lead
+    over the RAG cues. Spans of the winning intent's cues go into `used`.
+    """
+    text = query.lower()
+    spans = {intent: [] for intent in INTENT_CUES}
+    scores = {
+        intent: _cue_scores(text, cues, spans[intent])
+        for intent, cues in INTENT_CUES.items()
+    }
+    rag_score = sum(weight for pattern, weight in RAG_CUES if re.search(pattern, text))
+    intent = max(scores, key=scores.get)
+    if used is not None:
+        used.extend(spans[intent])
+    return intent, scores[intent] - rag_score
+
+
+def parse_query(query: str):
+    """
+    Returns {"intent", "filters", "group_by", "labels"} for an aggregate
+    question, or None when the query should go through retrieval: when it
+    is not clearly an aggregate, or has words no matcher accounted for.
+    """
+    used = []
+    intent, margin = classify_intent(query, used)
+    if margin < INTENT_THRESHOLD:
+        return None
+
+    text = query.lower()
+    filters, labels = {}, {}
+
+    block = re.search(BLOCK_PATTERN, query, re.IGNORECASE)
+    blocks = block_values(extract_block(query))
+    if blocks:
+        filters["block"] = blocks
+        labels["block"] = extract_block(query)
+        used.append(block.span())
+
+    for pattern, statuses, label in STATUS_TERMS:
+        status = re.search(pattern, text)
+        if status:
+            filters["status"] = statuses
+            labels["status"] = label
+            used.append(status.span())
+            break
+
+    severity = re.search(SEVERITY_PATTERN, text)
+    if severity:
+        filters["severity_level"] = severity.group(1) or severity.group(2)
+        labels["severity"] = filters["severity_level"]
+        used.append(severity.span())
+
+    group_by = None
+    group = re.search(GROUP_PATTERN, text)
+    if group:
+        group_by = GROUP_FIELDS[group.group(1)]
+        used.append(group.span())
+    if intent == "count" and group_by and re.search(r"\b(per|by|each)\s", text):
+        intent = "top"
+    if intent == "top" and group_by is None:
+        group_by = "category"
+
+    if group_by != "category":
+        for pattern, category in CATEGORY_ALIASES:
+            category_match = re.search(pattern, text)
+            if category_match:
+                filters["category"] = category
+                labels["category"] = category
+                used.append(category_match.span())
+                break
+
+    if _unused_words(text, used):
+        return None
+    return {"intent": intent, "filters": filters, "group_by": group_by, "labels": labels}
+
+
+def _describe(labels: dict) -> str:
+    words = [labels[key] for key in ("status",) if key in labels]
+    if "severity" in labels:
+        words.append(f"{labels['severity']}-severity")
+    if "category" in labels:
+        words.append(labels["category"])
+    words.append("complaints")
+    scope = f" in block {labels['block']}" if "block" in labels else ""
+    return " ".join(words) + scope
+
+
+def answer_structured(parsed: dict) -> str:
+    filters, labels = parsed["filters"], parsed["labels"]
+    description = _describe(labels)
+
+    if parsed["intent"] == "count":
+        count = count_complaints(filters)
+        return f"There {'is' if count == 1 else 'are'} {count} {description}."
+
+    if parsed["intent"] == "resolution":
+        resolution_filters = dict(filters, status=["closed"])
+        average = average_resolution_time(resolution_filters)
+        if not average:
+            return f"No resolved {description} to measure resolution time from."
+        return (
+            f"Average resolution time for {description}: {average['hours']} hours "
+            f"({average['days']} days), over {average['count']} resolved complaints."
+        )
+
+    groups = count_complaints(filters, group_by=parsed["group_by"])
+    if not groups:
+        return f"No matching {description}."
+    label = GROUP_LABELS[parsed["group_by"]]
+    top, top_count = groups[0]
+    breakdown = ", ".join(f"{value} ({count})" for value, count in groups[:TOP_GROUPS])
+    return (
+        f"{label} with the most {description}: {top} ({top_count}).\n\n"
+        f"By {label.lower()}: {breakdown}."
+    )
+
+
+def route_query(query: str):
+    """Returns the answer for an aggregate question, or None to use retrieval."""
+    parsed = parse_query(query)
+    if parsed is None:
+        return None
+    try:
+        return answer_structured(parsed)
+    except Exception as e:
+        print(f"[WARNING] Structured query failed, using retrieval: {e}")
+        return None
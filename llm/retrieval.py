@@ -0,0 +1,121 @@
+"""
+Post-retrieval stage for the chatbot context.
+
+vector_search_complaints over-fetches (and in hybrid mode its hits are
+fused with lexical matches by reciprocal_rank_fusion); rerank_context then
+drops weak hits, collapses near-duplicates and picks a diverse, relevant
+subset with MMR (maximal marginal relevance) until the context token
+budget is spent.
+candidate_settings sizes the $vectorSearch from how selective its filter is.
+"""
+import math
+import numpy as np
+
+from llm.prompt_budget import estimate_tokens, DEDUPE_SIMILARITY
+
+CONTEXT_MAX_DOCS = 8
+CONTEXT_TOKEN_BUDGET = 1500
+CONTEXT_MIN_SCORE = 0.6      # vectorSearchScore, (1 + cosine) / 2
+CONTEXT_SCORE_MARGIN = 0.15  # drop hits this far below the best one
+MMR_LAMBDA = 0.7             # 1.0 = relevance only, 0.0 = diversity only
+RRF_K = 60
+
+FETCH_LIMIT = 20
+CANDIDATES_PER_RESULT = 15
+MAX_NUM_CANDIDATES = 10000
+
+
+def candidate_settings(matching: int, total: int, limit: int = FETCH_LIMIT):
+    """
+    Returns (numCandidates, limit) for a $vectorSearch whose filter matches
+    `matching` of `total` indexed complaints. Selective filters need more
+    candidates for the same recall; when fewer documents match than would be
+    considered anyway, the search is capped at that count.
+    """
+    if matching <= 0:
+        return limit, limit
+    limit = min(limit, matching)
+    selectivity = matching / total if total else 1.0
+    num_candidates = math.ceil(limit * CANDIDATES_PER_RESULT / math.sqrt(max(selectivity, 1e-4)))
+    num_candidates = min(num_candidates, matching, MAX_NUM_CANDIDATES)
+    return max(num_candidates, limit), limit
+
+
+def context_text(doc: dict) -> str:
+    return f"- {doc.get('resident_name')} ({doc.get('block')}): {(doc.get('description') or '').strip()}"
+
+
+def reciprocal_rank_fusion(*rankings, k: int = RRF_K) -> dict:
+    """
+    Fuses ranked id lists into {id: sum of 1 / (k + rank)}; ids ranked
+    well by several lists come out on top.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def rerank_context(query_vector, documents: list,
+                   max_docs: int = CONTEXT_MAX_DOCS,
+                   token_budget: int = CONTEXT_TOKEN_BUDGET,
+                   min_score: float = CONTEXT_MIN_SCORE,
+                   score_margin: float = CONTEXT_SCORE_MARGIN,
+                   mmr_lambda: float = MMR_LAMBDA,
+                   dedupe_similarity: float = DEDUPE_SIMILARITY) -> list:
+    """
+    Selects the context documents for a query from retrieval hits.
+    Vector hits carry a "score"; lexical matches are flagged "lexical" and
+    skip the score cutoff. Relevance is the fused "rrf_score" when every
+    hit has one, else cosine similarity to query_vector, else "score".
+    Hits may carry their "embedding" for de-duplication; the returned
+    documents have it removed.
+    """
+    if not documents:
+        return []
+
+    scored = [doc["score"] for doc in documents if "score" in doc]
+    cutoff = max(min_score, max(scored) - score_margin) if scored else 0.0
+    hits = [doc for doc in documents if doc.get("lexical") or doc.get("score", 0.0) >= cutoff]
+    if not hits:
+        return []
+
+    embedded = all(doc.get("embedding") for doc in hits)
+    if embedded:
+        vectors = np.asarray([doc["embedding"] for doc in hits], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        pairwise = vectors @ vectors.T
+
+    if all("rrf_score" in doc for doc in hits):
+        relevance = np.asarray([doc["rrf_score"] for doc in hits], dtype=np.float32)
+        relevance /= relevance.max()
+    elif embedded and query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        relevance = vectors @ query
+    else:
+        relevance = np.asarray([doc.get("score", 0.0) for doc in hits], dtype=np.float32)
+
+    selected, used_tokens = [], 0
+    remaining = list(range(len(hits)))
+    while remaining and len(selected) < max_docs:
+        if embedded and selected:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        mmr = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        pick = int(np.argmax(mmr))
+        i = remaining.pop(pick)
+
+        if redundancy[pick] >= dedupe_similarity:
+            continue
+        tokens = estimate_tokens(context_text(hits[i])) + 1
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += tokens
+
+    return [{k: v for k, v in hits[i].items() if k != "embedding"} for i in selected]
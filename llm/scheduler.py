@@ -0,0 +1,129 @@
+"""
+Scheduler for batch Gemini requests (block and cluster summaries).
+
+All callers in one process draw from one token bucket and one concurrency
+cap. Theme jobs run in a separate worker process (mongodb.jobs) with its
+own scheduler, so the budget is split between the two rather than shared:
+the job worker gets LLM_JOB_SHARE of it and the app process the rest.
+
+    LLM_REQUESTS_PER_MINUTE=60   # total for batch summaries, both processes
+    LLM_MAX_CONCURRENCY=4
+    LLM_JOB_SHARE=0.5
+
+Interactive calls (complaint intake, chat) are not scheduled; keep
+LLM_REQUESTS_PER_MINUTE below the project quota to leave room for them.
+
+Callers parallelise with their own threads; call() blocks each request
+until a token and a slot are free. A 429 pauses every caller in the
+process for the delay the API asked for (Retry-After header or RetryInfo
+detail) and does not use up a retry; other failures are retried with
+capped, jittered exponential backoff.
+"""
+import os
+import random
+import re
+import threading
+import time
+
+from llm.rate_limit import TokenBucket
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+MAX_BACKOFF_SECONDS = 8
+DEFAULT_RETRY_AFTER = 10  # seconds, for a 429 that carries no hint
+MAX_RATE_LIMIT_WAITS = 10  # 429 pauses per call before giving up (e.g. daily quota spent)
+JOB_SHARE = float(os.getenv("LLM_JOB_SHARE", 0.5))
+# Set by mongodb.jobs for the worker processes it starts.
+ROLE_ENV = "LLM_SCHEDULER_ROLE"
+JOB_ROLE = "job"
+
+
+def retry_after(error):
+    """Seconds to wait before retrying a rate-limited (429) request, or None for other errors."""
+    if getattr(error, "code", None) != 429 and getattr(error, "status", None) != "RESOURCE_EXHAUSTED":
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    delay = re.search(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s", str(getattr(error, "details", "")))
+    return float(delay.group(1)) if delay else DEFAULT_RETRY_AFTER
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 retries: int = DEFAULT_RETRIES,
+                 max_backoff: float = MAX_BACKOFF_SECONDS):
+        self.bucket = TokenBucket(requests_per_minute)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls):
+        """This process's part of the budget: JOB_SHARE in a job worker, the rest elsewhere."""
+        share = JOB_SHARE if os.getenv(ROLE_ENV) == JOB_ROLE else 1 - JOB_SHARE
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)) * share,
+            max_concurrency=max(1, round(int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)) * share))
+        )
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_until_resumed(self):
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def call(self, fn, *args, retries: int = None, **kwargs):
+        """
+        Runs fn(*args, **kwargs) once a rate token and a concurrency slot
+        are free. Failures other than 429s are retried up to `retries`
+        attempts in all; the last error is re-raised.
+        """
+        retries = retries or self.retries
+        attempt = rate_limit_waits = 0
+        while True:
+            self._wait_until_resumed()
+            self.bucket.acquire()
+            with self._slots:
+                self._count("requests")
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    error = e
+
+            delay = retry_after(error)
+            if delay is not None and rate_limit_waits < MAX_RATE_LIMIT_WAITS:
+                rate_limit_waits += 1
+                self._count("rate_limited")
+                print(f"[WAIT] Rate limited, pausing LLM requests for {delay:.1f}s")
+                self.pause(delay)
+                continue
+
+            attempt += 1
+            if attempt >= retries or delay is not None:
+                self._count("failures")
+                raise error
+            self._count("retries")
+            print(f"[WARNING] LLM request attempt {attempt} failed: {error}")
+            time.sleep(min(self.max_backoff, 2 ** (attempt - 1)) + random.uniform(0, 1))
+
+
+llm_scheduler = LLMScheduler.from_env()
@@ -0,0 +1,102 @@
+"""
+Semantic cache for chatbot answers.
+
+An answer is reused when a new query (1) has the same block filter,
+(2) embeds within `threshold` cosine similarity of a cached query, (3) is
+answered from the same retrieved complaint set, and (4) the entry is
+younger than `ttl_seconds` and has not been invalidated by a change to a
+complaint in one of the blocks it covers.
+
+    SEMANTIC_CACHE_THRESHOLD=0.93
+    SEMANTIC_CACHE_TTL=600        # seconds
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def context_fingerprint(documents: list) -> str:
+    ids = sorted(str(doc.get("_id")) for doc in documents)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+def _covers(block_filter: str, block: str) -> bool:
+    """Whether a query filtered on block_filter can see complaints from block."""
+    if block_filter is None or block is None:
+        return True
+    return block == block_filter or (len(block_filter) == 1 and block.startswith(block_filter))
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.93, ttl_seconds: float = 600, max_entries: int = 256):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.93)),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", 600))
+        )
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        self._entries = [e for e in self._entries if e["created_at"] >= cutoff]
+
+    def lookup(self, query_vector, block: str, fingerprint: str):
+        """Returns the cached answer, or None. Queries without a vector always miss."""
+        if query_vector is None:
+            return None
+        with self._lock:
+            self._expire()
+            candidates = [
+                e for e in self._entries
+                if e["block"] == block and e["fingerprint"] == fingerprint
+            ]
+            if candidates:
+                scores = np.stack([e["vector"] for e in candidates]) @ self._unit(query_vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return candidates[best]["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, block: str, fingerprint: str, answer: str):
+        if query_vector is None:
+            return
+        with self._lock:
+            self._entries.append({
+                "vector": self._unit(query_vector),
+                "block": block,
+                "fingerprint": fingerprint,
+                "answer": answer,
+                "created_at": time.monotonic()
+            })
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+
+    def invalidate_block(self, block: str):
+        with self._lock:
+            self._entries = [e for e in self._entries if not _covers(e["block"], block)]
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
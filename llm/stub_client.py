@@ -0,0 +1,106 @@
+"""
+Offline stand-in for the google-genai client, for benchmarks and local runs
+without network access (GEMINI_USE_STUB=1).
+
+Embeddings are deterministic hashed bag-of-words vectors, so identical
+texts embed identically and texts sharing words land close together.
+Responses and per-call delays are configurable, and every call is counted.
+With quota_per_minute set, calls beyond the quota fail with the 429
+RESOURCE_EXHAUSTED error the real API returns, including its retryDelay.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+from google.genai import errors
+
+DEFAULT_DIMENSIONS = 3072
+DEFAULT_RESPONSE = (
+    '{"category": "Other", "sentiment": "neutral", "severity_level": "low", '
+    '"urgency_score": 1, "llm_summary": "Stub summary", '
+    '"action_recommendation": "Stub recommendation"}'
+)
+
+
+def stub_embedding(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> list:
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token in re.findall(r"\w+", (text or "").lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimensions
+        vector[bucket] += 1.0 if digest[4] % 2 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+class _StubModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def embed_content(self, model: str, contents, config=None):
+        owner = self._owner
+        owner._record("embed_content")
+        time.sleep(owner.embed_delay)
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        dimensions = getattr(config, "output_dimensionality", None) or owner.dimensions
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=stub_embedding(t, dimensions)) for t in texts]
+        )
+
+    def generate_content(self, model: str, contents, config=None):
+        owner = self._owner
+        owner._record("generate_content")
+        time.sleep(owner.generate_delay)
+        text = owner.response(contents) if callable(owner.response) else owner.response
+        return SimpleNamespace(text=text)
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        owner = self._owner
+        owner._record("generate_content_stream")
+        text = owner.response(contents) if callable(owner.response) else owner.response
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(owner.generate_delay / len(words))
+            yield SimpleNamespace(text=word if i == 0 else " " + word)
+
+
+class StubGeminiClient:
+    def __init__(self, embed_delay: float = 0.0, generate_delay: float = 0.0,
+                 response=DEFAULT_RESPONSE, dimensions: int = DEFAULT_DIMENSIONS,
+                 quota_per_minute: int = None):
+        self.embed_delay = embed_delay
+        self.generate_delay = generate_delay
+        self.response = response
+        self.dimensions = dimensions
+        self.quota_per_minute = quota_per_minute
+        self.calls = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.models = _StubModels(self)
+
+    def _record(self, method: str):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if not self.quota_per_minute:
+                return
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota_per_minute:
+                self.calls["rate_limited"] = self.calls.get("rate_limited", 0) + 1
+                retry_delay = 60 - (now - self._recent[0])
+                raise errors.ClientError(429, {"error": {
+                    "code": 429,
+                    "status": "RESOURCE_EXHAUSTED",
+                    "message": "Resource has been exhausted (e.g. check quota).",
+                    "details": [{
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": f"{retry_delay:.0f}s"
+                    }]
+                }})
+            self._recent.append(now)
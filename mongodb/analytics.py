@@ -1,9 +1,173 @@
-from mongodb.handlers import get_all_complaints
+from mongodb.mongo_client import complaints_collection
+from mongodb.handlers import COMPLAINT_VIEWS
 from collections import Counter
 from datetime import datetime
 
+STATUS_KEYS = {
+    "open": "open_complaints",
+    "closed": "resolved_complaints",
+    "junk": "junk_complaints",
+}
+
+
+def build_analytics_pipeline():
+    """
+    Single-pass aggregation: every counter and the resolution average
+    are computed by MongoDB in one $facet, so only a few small
+    documents cross the wire regardless of collection size.
+    """
+    def group_count(field):
+        return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+
+    return [
+        {"$project": COMPLAINT_VIEWS["analytics"]},
+        {
+            "$facet": {
+                "statuses": group_count("status"),
+                "categories": group_count("category"),
+                "severities": group_count("severity_level"),
+                "blocks": group_count("block"),
+                "resolution": [
+                    {"$match": {"created_at": {"$type": "date"}, "resolved_at": {"$type": "date"}}},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "total_ms": {"$sum": {"$subtract": ["$resolved_at", "$created_at"]}},
+                            "count": {"$sum": 1}
+                        }
+                    }
+                ],
+                # Older documents may hold ISO strings; these are few, so
+                # they are returned as-is and parsed client-side.
+                "resolution_strings": [
+                    {
+                        "$match": {
+                            "created_at": {"$ne": None},
+                            "resolved_at": {"$ne": None},
+                            "$or": [
+                                {"created_at": {"$type": "string"}},
+                                {"resolved_at": {"$type": "string"}}
+                            ]
+                        }
+                    },
+                    {"$project": {"created_at": 1, "resolved_at": 1}}
+                ]
+            }
+        }
+    ]
+
+
+def _resolution_seconds(created_at, resolved_at):
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    if isinstance(resolved_at, str):
+        resolved_at = datetime.fromisoformat(resolved_at)
+    return (resolved_at - created_at).total_seconds()
+
+
+def _facet_counts(buckets):
+    return {b["_id"]: b["count"] for b in buckets if b["_id"] is not None}
+
+
 def get_analytics_data():
-    list_complaints = get_all_complaints()
+    try:
+        facets = next(complaints_collection.aggregate(build_analytics_pipeline()), {})
+    except Exception as e:
+        print(f"Error aggregating analytics: {e}")
+        facets = {}
+
+    status_counts = _facet_counts(facets.get("statuses", []))
+
+    resolution = (facets.get("resolution") or [{}])[0]
+    total_seconds = resolution.get("total_ms", 0) / 1000
+    resolved_count = resolution.get("count", 0)
+    for complaint in facets.get("resolution_strings", []):
+        total_seconds += _resolution_seconds(complaint["created_at"], complaint["resolved_at"])
+        resolved_count += 1
+
+    avg_resolution_time = None
+    if resolved_count > 0:
+        avg_resolution_time = {
+            "hours": round((total_seconds / resolved_count) / 3600, 2),
+            "days": round((total_seconds / resolved_count) / 86400, 2)
+        }
+
+    analytics = {
+        "total_complaints": sum(b["count"] for b in facets.get("statuses", [])),
+        "open_complaints": 0,
+        "resolved_complaints": 0,
+        "junk_complaints": 0,
+        "category_counts": _facet_counts(facets.get("categories", [])),
+        "severity_counts": _facet_counts(facets.get("severities", [])),
+        "block_counts": _facet_counts(facets.get("blocks", [])),
+        "average_resolution_time": avg_resolution_time
+    }
+    for status, key in STATUS_KEYS.items():
+        analytics[key] = status_counts.get(status, 0)
+
+    return analytics
+
+
+def _match(filters: dict = None) -> dict:
+    return {
+        field: {"$in": value} if isinstance(value, list) else value
+        for field, value in (filters or {}).items()
+    }
+
+
+def count_complaints(filters: dict = None, group_by: str = None, limit: int = None):
+    """
+    Counts complaints matching filters ({field: value or [values]}).
+    With group_by, returns [(value, count)] largest first; otherwise an int.
+    """
+    match = _match(filters)
+    if group_by is None:
+        return complaints_collection.count_documents(match)
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": f"${group_by}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    return [
+        (bucket["_id"], bucket["count"])
+        for bucket in complaints_collection.aggregate(pipeline)
+        if bucket["_id"] is not None
+    ]
+
+
+def average_resolution_time(filters: dict = None):
+    """Average created_at -> resolved_at for matching complaints, as in get_analytics_data."""
+    match = _match(filters)
+    match.update({"created_at": {"$type": "date"}, "resolved_at": {"$type": "date"}})
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": None,
+                "total_ms": {"$sum": {"$subtract": ["$resolved_at", "$created_at"]}},
+                "count": {"$sum": 1}
+            }
+        }
+    ]
+    result = next(complaints_collection.aggregate(pipeline), None)
+    if not result or not result["count"]:
+        return None
+    seconds = result["total_ms"] / 1000 / result["count"]
+    return {
+        "hours": round(seconds / 3600, 2),
+        "days": round(seconds / 86400, 2),
+        "count": result["count"]
+    }
+
+
+def compute_analytics_from_documents(list_complaints):
+    """
+    Client-side reference implementation of get_analytics_data.
+    Kept for the benchmark and for callers that already hold documents.
+    """
     totals = len(list_complaints)
     all_statuses = [complaint['status'] for complaint in list_complaints]
     category_counts = dict(Counter(
@@ -15,7 +179,7 @@ def get_analytics_data():
     block_complain_counts = dict(Counter(
         complaint['block'] for complaint in list_complaints
     ))
-    
+
     open_sts = all_statuses.count('open')
     closed_sts = all_statuses.count('closed')
     junk_sts = all_statuses.count('junk')
@@ -28,18 +192,8 @@ def get_analytics_data():
 
         if not created_at or not resolved_at:
             continue
-        
-        if isinstance(created_at, str):
-            created_dt = datetime.fromisoformat(created_at)
-        else:
-            created_dt = created_at  
-
-        if isinstance(resolved_at, str):
-            resolved_dt = datetime.fromisoformat(resolved_at)
-        else:
-            resolved_dt = resolved_at  
-
-        total_resolution_seconds += (resolved_dt - created_dt).total_seconds()
+
+        total_resolution_seconds += _resolution_seconds(created_at, resolved_at)
         resolved_count += 1
 
     avg_resolution_time = None
@@ -48,7 +202,7 @@ def get_analytics_data():
             "hours": round((total_resolution_seconds / resolved_count) / 3600, 2),
             "days": round((total_resolution_seconds / resolved_count) / 86400, 2)
         }
-    
+
     return {
         "total_complaints": totals,
         "open_complaints": open_sts,
@@ -58,4 +212,4 @@ def get_analytics_data():
         "severity_counts": severity_counts,
         "block_counts": block_complain_counts,
         "average_resolution_time": avg_resolution_time
-    }
\ No newline at end of file
+    }
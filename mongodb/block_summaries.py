@@ -0,0 +1,85 @@
+from datetime import datetime
+from mongodb.mongo_client import complaints_collection, block_summaries_collection
+
+BLOCK_ORDER = ["A1", "A2", "A3", "A4", "A5", "B1", "B2", "B3", "B4"]
+
+# Complaints without a block are keyed by None, which no block name can
+# collide with (a resident may well type "Unknown"); UNKNOWN_BLOCK is only
+# how that group is displayed.
+MISSING_BLOCK = None
+UNKNOWN_BLOCK = "Unknown"
+# Its summary's _id: not a string, and a null _id isn't usable as an upsert key.
+MISSING_BLOCK_ID = 0
+
+
+def _summary_id(block):
+    return MISSING_BLOCK_ID if block is MISSING_BLOCK else block
+
+
+def block_label(block) -> str:
+    return block if block else UNKNOWN_BLOCK
+
+
+def get_block_watermarks() -> dict:
+    """
+    Cheap per-block fingerprint of the complaint set: count, latest
+    updated_at and highest _id. Any insert, delete or update in a block
+    changes at least one of them. Complaints without a block are under
+    MISSING_BLOCK.
+    """
+    pipeline = [
+        {
+            "$group": {
+                "_id": "$block",
+                "count": {"$sum": 1},
+                "last_updated_at": {"$max": "$updated_at"},
+                "last_id": {"$max": "$_id"}
+            }
+        }
+    ]
+    try:
+        return {
+            doc["_id"]: {
+                "count": doc["count"],
+                "last_updated_at": doc["last_updated_at"],
+                "last_id": doc["last_id"]
+            }
+            for doc in complaints_collection.aggregate(pipeline)
+        }
+    except Exception as e:
+        print(f"Error computing block watermarks: {e}")
+        return {}
+
+
+def get_block_summaries() -> list:
+    try:
+        summaries = list(block_summaries_collection.find({}))
+        for summary in summaries:
+            if summary["_id"] == MISSING_BLOCK_ID:
+                summary["_id"] = MISSING_BLOCK
+        return summaries
+    except Exception as e:
+        print(f"Error fetching block summaries: {e}")
+        return []
+
+
+def save_block_summary(block: str, watermark: dict, input_hash: str, summary: str = None):
+    """
+    Stores the watermark and input hash for a block; the summary text is
+    only replaced when one is given.
+    """
+    fields = {
+        "watermark": watermark,
+        "input_hash": input_hash,
+        "checked_at": datetime.utcnow()
+    }
+    if summary is not None:
+        fields["summary"] = summary
+        fields["generated_at"] = datetime.utcnow()
+
+    block_summaries_collection.update_one({"_id": _summary_id(block)}, {"$set": fields}, upsert=True)
+
+
+def delete_block_summaries(blocks: list):
+    if blocks:
+        block_summaries_collection.delete_many({"_id": {"$in": [_summary_id(block) for block in blocks]}})
@@ -0,0 +1,183 @@
+"""
+Persisted UMAP + DBSCAN model behind run_clustering_pipeline.
+
+fit() reduces every embedding with UMAP and clusters the result with
+DBSCAN. The fitted reducer, every complaint's reduced point and label and
+DBSCAN's core samples are saved, so later runs only project new
+complaints with reducer.transform and attach each one to the cluster of
+its nearest core sample within eps (noise otherwise), which is how DBSCAN
+itself would label a point that does not change the core structure.
+drift() reports when that approximation should be replaced by a refit.
+"""
+import json
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.cluster import DBSCAN
+import umap.umap_ as umap
+
+ASSIGN_CHUNK = 4096
+MIN_POINTS_FOR_DRIFT = 20
+
+
+class ClusterModel:
+    def __init__(self, n_neighbors: int = 15, n_components: int = 5, metric: str = "cosine",
+                 eps: float = 0.5, min_samples: int = 3, random_state: int = 42):
+        self.params = {
+            "n_neighbors": n_neighbors, "n_components": n_components, "metric": metric,
+            "eps": eps, "min_samples": min_samples, "random_state": random_state
+        }
+        self.reducer = None
+        self.dims = None
+        self.ids = []
+        self.reduced = None
+        self.labels = None
+        self.core_points = None
+        self.core_labels = None
+        self.fitted_at = None
+        self.fit_size = 0
+        self.fit_noise_rate = 0.0
+        self.added_since_fit = 0
+        self.noise_since_fit = 0
+
+    def fit(self, ids: list, X) -> np.ndarray:
+        p = self.params
+        self.reducer = umap.UMAP(
+            n_neighbors=p["n_neighbors"],
+            n_components=p["n_components"],
+            metric=p["metric"],
+            random_state=p["random_state"]
+        )
+        X = np.asarray(X)
+        self.dims = X.shape[1]
+        self.reduced = self.reducer.fit_transform(X)
+        clusterer = DBSCAN(eps=p["eps"], min_samples=p["min_samples"])
+        self.labels = clusterer.fit_predict(self.reduced)
+
+        core = clusterer.core_sample_indices_
+        self.core_points = self.reduced[core]
+        self.core_labels = self.labels[core]
+        self.ids = [str(i) for i in ids]
+        self.fitted_at = time.time()
+        self.fit_size = len(self.ids)
+        self.fit_noise_rate = float(np.mean(self.labels == -1)) if len(self.labels) else 0.0
+        self.added_since_fit = 0
+        self.noise_since_fit = 0
+        return self.labels
+
+    def assign(self, reduced) -> np.ndarray:
+        """Label of the nearest core sample within eps for each reduced point, else -1."""
+        reduced = np.asarray(reduced, dtype=np.float32)
+        labels = np.full(len(reduced), -1, dtype=int)
+        if self.core_points is None or not len(self.core_points):
+            return labels
+        core = np.asarray(self.core_points, dtype=np.float32)
+        core_sq = (core ** 2).sum(axis=1)
+        for start in range(0, len(reduced), ASSIGN_CHUNK):
+            chunk = reduced[start:start + ASSIGN_CHUNK]
+            d2 = (chunk ** 2).sum(axis=1)[:, None] - 2 * chunk @ core.T + core_sq[None, :]
+            nearest = np.argmin(d2, axis=1)
+            within = d2[np.arange(len(chunk)), nearest] <= self.params["eps"] ** 2
+            labels[start:start + len(chunk)][within] = self.core_labels[nearest[within]]
+        return labels
+
+    def add(self, ids: list, X) -> np.ndarray:
+        """Projects new complaints with the fitted reducer and assigns them to existing clusters."""
+        if not len(ids):
+            return np.array([], dtype=int)
+        reduced = self.reducer.transform(np.asarray(X))
+        labels = self.assign(reduced)
+        self.ids.extend(str(i) for i in ids)
+        self.reduced = np.vstack([self.reduced, reduced])
+        self.labels = np.concatenate([self.labels, labels])
+        self.added_since_fit += len(ids)
+        self.noise_since_fit += int(np.sum(labels == -1))
+        return labels
+
+    def remove(self, ids):
+        ids = {str(i) for i in ids}
+        if not ids:
+            return
+        keep = np.array([i not in ids for i in self.ids], dtype=bool)
+        self.ids = [i for i, k in zip(self.ids, keep) if k]
+        self.reduced = self.reduced[keep]
+        self.labels = self.labels[keep]
+
+    def drift(self) -> dict:
+        """
+        growth: complaints added since the fit, relative to the fit size.
+        noise_increase: how much more often new complaints land in noise
+        than fitted ones did (new themes the model has no cluster for).
+        """
+        noise_rate = self.noise_since_fit / self.added_since_fit if self.added_since_fit else 0.0
+        return {
+            "growth": self.added_since_fit / self.fit_size if self.fit_size else float("inf"),
+            "noise_increase": noise_rate - self.fit_noise_rate
+            if self.added_since_fit >= MIN_POINTS_FOR_DRIFT else 0.0,
+            "age_days": (time.time() - self.fitted_at) / 86400 if self.fitted_at else float("inf")
+        }
+
+    def refit_reason(self, max_growth: float, max_noise_increase: float, max_age_days: float):
+        """Returns why the model should be refitted, or None."""
+        drift = self.drift()
+        if drift["age_days"] >= max_age_days:
+            return f"model is {drift['age_days']:.1f} days old"
+        if drift["growth"] >= max_growth:
+            return f"{drift['growth']:.0%} more complaints than at fit time"
+        if drift["noise_increase"] >= max_noise_increase:
+            return f"new complaints land in noise {drift['noise_increase']:.0%} more often"
+        return None
+
+    def labels_by_id(self) -> dict:
+        return dict(zip(self.ids, (int(label) for label in self.labels)))
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self.reducer, directory / "reducer.joblib")
+        np.savez(
+            directory / "state.npz",
+            ids=np.array(self.ids, dtype=str),
+            reduced=self.reduced,
+            labels=self.labels,
+            core_points=self.core_points,
+            core_labels=self.core_labels
+        )
+        with open(directory / "meta.json", "w") as f:
+            json.dump({
+                "params": self.params,
+                "dims": self.dims,
+                "fitted_at": self.fitted_at,
+                "fit_size": self.fit_size,
+                "fit_noise_rate": self.fit_noise_rate,
+                "added_since_fit": self.added_since_fit,
+                "noise_since_fit": self.noise_since_fit
+            }, f, indent=4)
+
+    @classmethod
+    def load(cls, directory):
+        """Returns the saved model, or None if there is none (or it cannot be read)."""
+        directory = Path(directory)
+        try:
+            with open(directory / "meta.json") as f:
+                meta = json.load(f)
+            state = np.load(directory / "state.npz")
+            model = cls(**meta["params"])
+            model.reducer = joblib.load(directory / "reducer.joblib")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[WARNING] Could not load cluster model from {directory}: {e}")
+            return None
+
+        model.ids = [str(i) for i in state["ids"]]
+        model.reduced = state["reduced"]
+        model.labels = state["labels"]
+        model.core_points = state["core_points"]
+        model.core_labels = state["core_labels"]
+        for key in ("fitted_at", "fit_size", "fit_noise_rate", "added_since_fit", "noise_since_fit"):
+            setattr(model, key, meta[key])
+        model.dims = meta.get("dims")
+        return model
@@ -0,0 +1,178 @@
+"""
+Clustering results in MongoDB.
+
+Every run of the clustering pipeline is recorded in `cluster_runs` with an
+increasing version, and writes one document per cluster to `clusters`
+(name, summary and count). Membership is stored only on the complaints
+(indexed by cluster_run_id, cluster_id): a member id array in the cluster
+document would outgrow the 16 MB document limit for a large cluster or
+the noise bucket.
+
+A run becomes visible once it is marked complete; readers always use the
+latest complete run. Only then does each complaint get `cluster_id`,
+`cluster_name` and `cluster_run_id`, so complaint pointers never reference
+an unfinished run and the Kanban card shows a theme without another query.
+A run left `writing` by a crashed job is discarded by the next save.
+Cluster documents of the last CLUSTER_RUN_HISTORY runs are kept for
+comparison, older runs keep only their summary record.
+"""
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from mongodb.mongo_client import complaints_collection, clusters_collection, cluster_runs_collection
+
+RUN_HISTORY = int(os.getenv("CLUSTER_RUN_HISTORY", 10))
+NOISE_CLUSTER_ID = -1
+
+CLUSTER_INDEXES = [
+    IndexModel([("run_id", ASCENDING), ("rank", ASCENDING)], name="run_rank"),
+    IndexModel([("run_id", ASCENDING), ("cluster_id", ASCENDING)], name="run_cluster", unique=True),
+]
+RUN_INDEXES = [
+    IndexModel([("state", ASCENDING), ("version", DESCENDING)], name="state_version"),
+]
+MEMBER_BATCH = 10_000  # complaint ids per pointer update, keeps each command small
+# Cluster documents of older runs still carry member_ids.
+CARD_PROJECTION = {"member_ids": 0}
+
+
+def ensure_cluster_indexes():
+    try:
+        clusters_collection.create_indexes(CLUSTER_INDEXES)
+        cluster_runs_collection.create_indexes(RUN_INDEXES)
+    except OperationFailure as e:
+        print(f"Error creating cluster indexes: {e}")
+
+
+def _next_version() -> int:
+    latest = cluster_runs_collection.find_one({}, {"version": 1}, sort=[("version", -1)])
+    return (latest["version"] + 1) if latest else 1
+
+
+def save_cluster_run(clusters: list, mode: str, stats: dict = None) -> ObjectId:
+    """
+    Stores a pipeline run. clusters: [{"cluster_id", "cluster_name",
+    "cluster_summary", "member_ids"}] in display order. Returns the run id.
+    """
+    _discard_abandoned_runs()
+    run_id = ObjectId()
+    now = datetime.utcnow()
+    cluster_runs_collection.insert_one({
+        "_id": run_id,
+        "version": _next_version(),
+        "state": "writing",
+        "mode": mode,
+        "created_at": now,
+        "stats": stats or {},
+        "cluster_count": sum(c["cluster_id"] != NOISE_CLUSTER_ID for c in clusters),
+        "complaint_count": sum(len(c["member_ids"]) for c in clusters),
+        "noise_count": sum(len(c["member_ids"]) for c in clusters if c["cluster_id"] == NOISE_CLUSTER_ID),
+        "clusters": [
+            {"cluster_id": c["cluster_id"], "cluster_name": c["cluster_name"], "count": len(c["member_ids"])}
+            for c in clusters
+        ]
+    })
+
+    if clusters:
+        clusters_collection.insert_many([
+            {
+                "run_id": run_id,
+                "rank": rank,
+                "cluster_id": c["cluster_id"],
+                "cluster_name": c["cluster_name"],
+                "cluster_summary": c["cluster_summary"],
+                "count": len(c["member_ids"])
+            }
+            for rank, c in enumerate(clusters)
+        ])
+
+    cluster_runs_collection.update_one(
+        {"_id": run_id},
+        {"$set": {"state": "complete", "completed_at": datetime.utcnow()}}
+    )
+
+    for c in clusters:
+        for start in range(0, len(c["member_ids"]), MEMBER_BATCH):
+            complaints_collection.update_many(
+                {"_id": {"$in": [ObjectId(i) for i in c["member_ids"][start:start + MEMBER_BATCH]]}},
+                {"$set": {"cluster_id": c["cluster_id"], "cluster_name": c["cluster_name"], "cluster_run_id": run_id}}
+            )
+    # Complaints that are no longer clustered (e.g. lost their embedding).
+    complaints_collection.update_many(
+        {"cluster_run_id": {"$exists": True, "$ne": run_id}},
+        {"$unset": {"cluster_id": "", "cluster_name": "", "cluster_run_id": ""}}
+    )
+    _prune_history()
+    return run_id
+
+
+def _discard_abandoned_runs():
+    # Theme jobs hold a lock, so a run still writing when the next one starts has crashed.
+    abandoned = [run["_id"] for run in cluster_runs_collection.find({"state": "writing"}, {"_id": 1})]
+    if abandoned:
+        print(f"[WARNING] Discarding {len(abandoned)} unfinished cluster run(s).")
+        clusters_collection.delete_many({"run_id": {"$in": abandoned}})
+        cluster_runs_collection.update_many(
+            {"_id": {"$in": abandoned}}, {"$set": {"state": "abandoned", "clusters": []}}
+        )
+
+
+def _prune_history():
+    kept = [
+        run["_id"] for run in
+        cluster_runs_collection.find({"state": "complete"}, {"_id": 1}, sort=[("version", -1)]).limit(RUN_HISTORY)
+    ]
+    clusters_collection.delete_many({"run_id": {"$nin": kept}})
+
+
+def get_current_run() -> dict:
+    """The latest complete run (without its per-cluster list), or None."""
+    try:
+        return cluster_runs_collection.find_one(
+            {"state": "complete"}, {"clusters": 0}, sort=[("version", -1)]
+        )
+    except Exception as e:
+        print(f"Error fetching cluster run: {e}")
+        return None
+
+
+def get_run_history(limit: int = RUN_HISTORY) -> list:
+    try:
+        return list(
+            cluster_runs_collection.find({"state": "complete"}, sort=[("version", -1)]).limit(limit)
+        )
+    except Exception as e:
+        print(f"Error fetching cluster run history: {e}")
+        return []
+
+
+def get_clusters_page(run_id: ObjectId, page: int, per_page: int) -> list:
+    """One page of a run's clusters in display order."""
+    try:
+        return list(
+            clusters_collection.find({"run_id": run_id}, CARD_PROJECTION)
+            .sort("rank", 1).skip(page * per_page).limit(per_page)
+        )
+    except Exception as e:
+        print(f"Error fetching clusters: {e}")
+        return []
+
+
+def compare_runs(old_run: dict, new_run: dict) -> list:
+    """
+    Per theme name: its complaint count in each run (0 when absent).
+    Names carry over between runs through the summary cache, so a theme
+    keeps its name while its membership is mostly unchanged.
+    """
+    counts = {}
+    for key, run in (("old", old_run), ("new", new_run)):
+        for c in run.get("clusters", []):
+            if c["cluster_id"] == NOISE_CLUSTER_ID:
+                continue
+            entry = counts.setdefault(c["cluster_name"], {"cluster_name": c["cluster_name"], "old": 0, "new": 0})
+            entry[key] += c["count"]
+    return sorted(counts.values(), key=lambda e: -(e["new"] - e["old"]))
@@ -0,0 +1,95 @@
+"""
+Cache of cluster names and summaries, keyed by cluster membership.
+
+Each entry keeps the member ids the summary was generated from. A cluster
+reuses an entry when its members match exactly (same fingerprint) or
+overlap it by at least CLUSTER_SUMMARY_MIN_OVERLAP (Jaccard). Reused
+entries keep their original members, so a summary is regenerated once a
+cluster has drifted far enough from what was actually summarized.
+"""
+import hashlib
+import os
+from datetime import datetime
+
+from mongodb.mongo_client import cluster_summaries_collection
+
+# Current clusters never share members, but cached entries can: a reused
+# entry keeps the members it was summarized from, which may now belong to
+# other clusters too. Overlap is therefore counted per cached entry.
+MIN_OVERLAP = float(os.getenv("CLUSTER_SUMMARY_MIN_OVERLAP", 0.8))
+
+
+def cluster_fingerprint(member_ids) -> str:
+    digest = hashlib.sha256()
+    for member_id in sorted(str(i) for i in member_ids):
+        digest.update(f"{member_id}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cluster_summaries() -> list:
+    try:
+        return list(cluster_summaries_collection.find({}))
+    except Exception as e:
+        print(f"[WARNING] Could not fetch cached cluster summaries: {e}")
+        return []
+
+
+def match_cluster_summaries(clusters: dict, cached: list, min_overlap: float = MIN_OVERLAP) -> dict:
+    """
+    clusters maps label -> member ids. Returns label -> (cached entry,
+    overlap) for every cluster that can reuse a summary; each entry is
+    used at most once, best overlap first.
+    """
+    by_fingerprint = {entry["_id"]: entry for entry in cached}
+    owners = {}
+    for index, entry in enumerate(cached):
+        for member_id in entry.get("member_ids", []):
+            owners.setdefault(member_id, []).append(index)
+
+    candidates = []
+    for label, member_ids in clusters.items():
+        members = {str(i) for i in member_ids}
+        exact = by_fingerprint.get(cluster_fingerprint(members))
+        if exact is not None:
+            candidates.append((1.0, label, exact))
+            continue
+        shared = {}
+        for member_id in members:
+            for index in owners.get(member_id, ()):
+                shared[index] = shared.get(index, 0) + 1
+        for index, intersection in shared.items():
+            union = len(members) + len(cached[index]["member_ids"]) - intersection
+            overlap = intersection / union
+            if overlap >= min_overlap:
+                candidates.append((overlap, label, cached[index]))
+
+    matches = {}
+    used = set()
+    for overlap, label, entry in sorted(candidates, key=lambda c: -c[0]):
+        if label in matches or entry["_id"] in used:
+            continue
+        matches[label] = (entry, overlap)
+        used.add(entry["_id"])
+    return matches
+
+
+def replace_cluster_summaries(entries: list):
+    """
+    Stores the summaries of the current clusters and drops the rest.
+    entries: [{"member_ids", "cluster_name", "cluster_summary", "generated_at"?}]
+    """
+    fingerprints = []
+    for entry in entries:
+        fingerprint = cluster_fingerprint(entry["member_ids"])
+        fingerprints.append(fingerprint)
+        cluster_summaries_collection.update_one(
+            {"_id": fingerprint},
+            {"$set": {
+                "member_ids": sorted(str(i) for i in entry["member_ids"]),
+                "cluster_name": entry["cluster_name"],
+                "cluster_summary": entry["cluster_summary"],
+                "generated_at": entry.get("generated_at") or datetime.utcnow()
+            }},
+            upsert=True
+        )
+    cluster_summaries_collection.delete_many({"_id": {"$nin": fingerprints}})
@@ -1,18 +1,25 @@
 import json
 import os
 import sys
-import time
-import numpy as np
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from sklearn.cluster import DBSCAN
-import umap.umap_ as umap
 from google.genai import types
 
 from mongodb.handlers import get_all_complaints
+from mongodb.cluster_model import ClusterModel
+from mongodb.embedding_store import get_embedding_store
+from mongodb.cluster_store import save_cluster_run
+from mongodb.cluster_summaries import (
+    get_cluster_summaries,
+    match_cluster_summaries,
+    replace_cluster_summaries
+)
 from llm.llm_client import gemini_client
 from llm.prompts import CLUSTER_SUMMARY_PROMPT
+from llm.prompt_budget import select_representative, SUMMARY_TOKEN_BUDGET
+from llm.scheduler import llm_scheduler
 
 UMAP_NEIGHBORS = 15
 UMAP_COMPONENTS = 5
@@ -20,72 +27,94 @@ UMAP_METRIC = 'cosine'
 DBSCAN_EPS = 0.5
 DBSCAN_MIN_SAMPLES = 3
 TOP_DOCS_FOR_SUMMARY = 30
-OUTPUT_FILE = "clusters.json"
+MODEL_DIR = Path(__file__).parent / "cluster_model"
+# A full refit runs when any of these is reached; otherwise new complaints
+# are projected into the saved model.
+REFIT_MAX_GROWTH = float(os.getenv("CLUSTER_REFIT_MAX_GROWTH", 0.3))
+REFIT_MAX_NOISE_INCREASE = 0.15
+REFIT_INTERVAL_DAYS = float(os.getenv("CLUSTER_REFIT_INTERVAL_DAYS", 7))
 
-def generate_cluster_summary(descriptions, retries=5):
-    formatted_prompt = CLUSTER_SUMMARY_PROMPT.format(descriptions=descriptions)
-    
-    for attempt in range(retries):
-        try:
-            response = gemini_client.client.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                ),
-                contents=formatted_prompt
-            )
-            return json.loads(response.text)
-        except Exception as e:
-            print(f"[WARNING] Attempt {attempt + 1} failed: {e}")
-            if attempt < retries - 1:
-                wait_time = (2 ** (attempt + 1)) + np.random.uniform(0, 1)
-                print(f"[WAIT] Retrying in {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"[ERROR] All {retries} attempts failed.")
-                return {"cluster_name": "Unknown", "cluster_summary": "Error generating summary after multiple retries."}
-
-def run_clustering_pipeline():
-    print("[START] Starting Clustering Pipeline...")
-
-    print("[INFO] Fetching complaints from MongoDB...")
-    complaints = get_all_complaints({"embedding": {"$exists": True}})
-    
-    if not complaints:
-        print("[ERROR] No complaints with embeddings found. Exiting.")
-        return
+SUMMARY_FALLBACK = {"cluster_name": "Unknown", "cluster_summary": "Error generating summary after multiple retries."}
 
-    print(f"[SUCCESS] Fetched {len(complaints)} complaints.")
-
-    embeddings = [c["embedding"] for c in complaints]
-    ids = [str(c["_id"]) for c in complaints]
-    descriptions = [c.get("description", "") for c in complaints]
-    
-    X = np.array(embeddings)
-    
-    print(f"[INFO] Reducing dimensions for {len(X)} documents using UMAP...")
-    reducer = umap.UMAP(
-        n_neighbors=UMAP_NEIGHBORS, 
-        n_components=UMAP_COMPONENTS,
-        metric=UMAP_METRIC,
-        random_state=42
+def _request_cluster_summary(formatted_prompt: str) -> dict:
+    response = gemini_client.client.models.generate_content(
+        model="gemini-2.5-flash",
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json"
+        ),
+        contents=formatted_prompt
     )
-    X_reduced = reducer.fit_transform(X)
+    # Invalid JSON raises here, so the scheduler retries it like any failed call.
+    return json.loads(response.text)
 
-    print("[INFO] Clustering data using DBSCAN...")
-    clusterer = DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES)
-    labels = clusterer.fit_predict(X_reduced)
+def generate_cluster_summary(descriptions, retries=5):
+    """
+    Names and summarizes one cluster. Requests go through llm_scheduler, which
+    rate limits them, honours 429 Retry-After and retries other failures.
+    """
+    formatted_prompt = CLUSTER_SUMMARY_PROMPT.format(descriptions=descriptions)
+    try:
+        return llm_scheduler.call(_request_cluster_summary, formatted_prompt, retries=retries)
+    except Exception as e:
+        print(f"[ERROR] All {retries} attempts failed: {e}")
+        return dict(SUMMARY_FALLBACK)
 
-    clusters = defaultdict(list)
-    for idx, label in enumerate(labels):
-        clusters[label].append({
-            "description": descriptions[idx],
-            "vector": X_reduced[idx]
-        })
-    
+def _report(progress, fraction: float, message: str):
+    print(f"[INFO] {message}")
+    if progress is not None:
+        progress(fraction, message)
+
+def _build_output(clusters: dict, progress=None):
+    """
+    clusters maps label -> [{"id", "description", "embedding"}]. Clusters
+    whose members match a cached summary (see mongodb.cluster_summaries)
+    keep its name and summary; others are summarized, and the cache is
+    replaced by the current clusters. Returns (clusters in display order,
+    summary stats).
+    """
     final_output = []
     print(f"[INFO] Found {len(clusters)} clusters (including noise). Processing summaries...")
-    
+
+    members = {label: [item["id"] for item in items] for label, items in clusters.items() if label != -1}
+    matches = match_cluster_summaries(members, get_cluster_summaries())
+    summaries = {label: entry for label, (entry, _) in matches.items()}
+    to_summarize = [label for label in members if label not in summaries]
+    exact = sum(overlap == 1.0 for _, overlap in matches.values())
+    _report(progress, 0.5, f"Reusing {len(matches)} cached theme summaries ({exact} unchanged, "
+                           f"{len(matches) - exact} by overlap): saved {len(matches)} of {len(members)} LLM calls.")
+
+    if to_summarize:
+        # Summaries are independent; llm_scheduler caps concurrency and rate.
+        with ThreadPoolExecutor(max_workers=llm_scheduler.max_concurrency,
+                                thread_name_prefix="cluster-summary") as executor:
+            futures = {}
+            for label in to_summarize:
+                items = clusters[label]
+                top_descriptions = select_representative(
+                    [item["description"] for item in items],
+                    [item.get("embedding") for item in items],
+                    token_budget=SUMMARY_TOKEN_BUDGET,
+                    max_items=TOP_DOCS_FOR_SUMMARY
+                )
+                print(f"   - Summarizing Cluster {label} ({len(items)} items)...")
+                futures[executor.submit(generate_cluster_summary, "\n- ".join(top_descriptions))] = label
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                summaries[futures[future]] = future.result()
+                if progress is not None:
+                    progress(0.5 + 0.45 * done / len(futures), f"Summarizing themes ({done}/{len(futures)})")
+
+    cache_entries = []
+    for label, summary_data in summaries.items():
+        if summary_data.get("cluster_name") == SUMMARY_FALLBACK["cluster_name"]:
+            continue  # retried on the next run
+        # Reused entries keep the members they were generated from, so drift accumulates.
+        cache_entries.append({**summary_data, "member_ids": summary_data.get("member_ids") or members[label]})
+    try:
+        replace_cluster_summaries(cache_entries)
+    except Exception as e:
+        print(f"[WARNING] Could not update the cluster summary cache: {e}")
+
     for label, items in clusters.items():
         if label == -1:
             print(f"   - Processing Uncategorized ({len(items)} items)")
@@ -93,40 +122,129 @@ def run_clustering_pipeline():
                 "cluster_id": -1,
                 "cluster_name": "Uncategorized",
                 "cluster_summary": "Miscellaneous complaints that do not fit into distinct clusters.",
-                "count": len(items),
-                "complaints": [item["description"] for item in items]
+                "member_ids": [item["id"] for item in items]
             })
             continue
-            
-        vectors = np.array([item["vector"] for item in items])
-        centroid = np.mean(vectors, axis=0)
-        
-        distances = np.linalg.norm(vectors - centroid, axis=1)
-        top_indices = np.argsort(distances)[:TOP_DOCS_FOR_SUMMARY]
-        top_descriptions = [items[i]["description"] for i in top_indices]
-        
-        print(f"   - Summarizing Cluster {label} ({len(items)} items)...")
-        
-        summary_data = generate_cluster_summary("\n- ".join(top_descriptions))
-        
+
+        summary_data = summaries[label]
         final_output.append({
             "cluster_id": int(label),
             "cluster_name": summary_data.get("cluster_name", f"Cluster {label}"),
             "cluster_summary": summary_data.get("cluster_summary", "No summary available."),
-            "count": len(items),
-            "complaints": [item["description"] for item in items]
+            "member_ids": members[label]
         })
-        
-        time.sleep(2)
-        
+
     final_output.sort(key=lambda x: x['cluster_id'] if x['cluster_id'] != -1 else float('inf'))
+    stats = {"summarized": len(to_summarize), "reused": len(matches), "reused_exact": exact}
+    return final_output, stats
 
-    output_path = Path(__file__).parent / OUTPUT_FILE
-    with open(output_path, "w") as f:
-        json.dump(final_output, f, indent=4)
-        
-    print(f"[SUCCESS] Clustering complete! Results saved to: {output_path}")
-    return output_path
+def _save_output(clusters: dict, mode: str, progress=None):
+    final_output, stats = _build_output(clusters, progress)
+    _report(progress, 0.95, "Saving themes...")
+    run_id = save_cluster_run(final_output, mode, stats)
+    print(f"[SUCCESS] Clustering complete! Saved {len(final_output)} clusters as run {run_id}.")
+    return run_id
 
+def _full_refit(progress=None):
+    _report(progress, 0.05, "Syncing embeddings from MongoDB...")
+    store = get_embedding_store()
+    store.sync()
+    ids, X = store.vectors()
+
+    if not ids:
+        print("[ERROR] No complaints with embeddings found. Exiting.")
+        return
+
+    texts = {
+        str(c["_id"]): c.get("description", "")
+        for c in get_all_complaints({"embedding": {"$exists": True}}, view="text")
+    }
+    descriptions = [texts.get(complaint_id, "") for complaint_id in ids]
+    print(f"[SUCCESS] Loaded {len(ids)} embeddings.")
+
+    _report(progress, 0.1, f"Reducing dimensions for {len(X)} documents using UMAP and clustering with DBSCAN...")
+    model = ClusterModel(
+        n_neighbors=UMAP_NEIGHBORS,
+        n_components=UMAP_COMPONENTS,
+        metric=UMAP_METRIC,
+        eps=DBSCAN_EPS,
+        min_samples=DBSCAN_MIN_SAMPLES
+    )
+    labels = model.fit(ids, X)
+    model.save(MODEL_DIR)
+
+    clusters = defaultdict(list)
+    for idx, label in enumerate(labels):
+        clusters[label].append({
+            "id": ids[idx],
+            "description": descriptions[idx],
+            "embedding": X[idx]
+        })
+
+    return _save_output(clusters, "refit", progress)
+
+def _incremental_update(model: ClusterModel, progress=None):
+    """
+    Projects complaints added since the last run into the saved model's
+    clusters and drops deleted ones. Returns None when drift calls for a
+    full refit instead.
+    """
+    _report(progress, 0.05, "Syncing embeddings from MongoDB...")
+    store = get_embedding_store()
+    store.sync()
+    complaints = get_all_complaints({"embedding": {"$exists": True}}, view="text")
+    if not complaints:
+        print("[ERROR] No complaints with embeddings found. Exiting.")
+        return
+
+    current = {str(c["_id"]): c for c in complaints}
+    known = set(model.ids)
+    model.remove(known - set(current))
+    new_ids = [complaint_id for complaint_id in current if complaint_id not in known]
+
+    if new_ids:
+        _report(progress, 0.1, f"Projecting {len(new_ids)} new complaints into existing clusters...")
+        new_ids, X_new = store.vectors(new_ids)
+        if len(new_ids) and model.dims not in (None, X_new.shape[1]):
+            print(f"[INFO] Refitting clusters: embeddings changed from {model.dims} to {X_new.shape[1]} dimensions.")
+            return None
+        model.add(new_ids, X_new)
+
+    reason = model.refit_reason(REFIT_MAX_GROWTH, REFIT_MAX_NOISE_INCREASE, REFIT_INTERVAL_DAYS)
+    if reason:
+        print(f"[INFO] Refitting clusters: {reason}.")
+        return None
+    model.save(MODEL_DIR)
+
+    labels = model.labels_by_id()
+    ids, X = store.vectors(list(labels))
+    rows = {complaint_id: idx for idx, complaint_id in enumerate(ids)}
+    clusters = defaultdict(list)
+    for complaint_id, label in labels.items():
+        clusters[label].append({
+            "id": complaint_id,
+            "description": current[complaint_id].get("description", ""),
+            "embedding": X[rows[complaint_id]] if complaint_id in rows else None
+        })
+
+    return _save_output(clusters, "incremental", progress)
+
+def run_clustering_pipeline(force_refit: bool = False, progress=None):
+    """
+    Stores a new clustering run (see mongodb.cluster_store) and returns its
+    id. Normally new complaints are projected into the
+    saved model's clusters, which takes seconds; the model is refitted on
+    every embedding when none is saved, force_refit is set, or its drift
+    exceeds REFIT_MAX_GROWTH / REFIT_MAX_NOISE_INCREASE / REFIT_INTERVAL_DAYS.
+    progress(fraction, message) is called as the run advances (see
+    mongodb.jobs, which runs this in a worker process).
+    """
+    print("[START] Starting Clustering Pipeline...")
 
+    model = None if force_refit else ClusterModel.load(MODEL_DIR)
+    if model is not None:
+        run_id = _incremental_update(model, progress)
+        if run_id is not None:
+            return run_id
 
+    return _full_refit(progress)
@@ -0,0 +1,629 @@
+"""
+On-disk embedding matrix shared by clustering and similarity search.
+
+Vectors are stored L2-normalized in one contiguous memory-mapped file
+(EMBEDDING_STORE_DTYPE: float32, float16, or int8 with a per-row scale).
+The id -> row map, each row's status and block, the sync watermark and
+the name of the vectors file live in state.npz next to it:
+
+    mongodb/embedding_store/vectors.dat      (vectors.<n>.dat after compaction)
+    mongodb/embedding_store/state.npz
+
+Compaction writes a new vectors file and switches to it by replacing
+state.npz, so a crash at any point leaves a consistent pair. Status/block
+changes (a Kanban move), single deletions and a watermark that moved
+without new vectors are appended to changes.log instead of rewriting
+state.npz; the log is folded into the state by the next commit.
+
+sync() only reads complaints whose updated_at or embedding_updated_at
+moved past the watermark (plus an id scan when the counts disagree, to
+catch deletions), so opening the store maps a file instead of decoding
+every embedding from MongoDB. Writes hold a file lock, so the Streamlit
+app and the clustering worker can share one store.
+
+    python -m mongodb.embedding_store sync|rebuild|stats
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from bson import ObjectId
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads are serialised
+    fcntl = None
+
+from mongodb.mongo_client import complaints_collection
+
+STORE_DIR = Path(os.getenv("EMBEDDING_STORE_DIR", Path(__file__).parent / "embedding_store"))
+STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+SYNC_INTERVAL_SECONDS = 30
+SYNC_BATCH = 1000
+SEARCH_CHUNK = 8192
+COMPACT_DEAD_RATIO = 0.25
+MIN_CAPACITY = 1024
+VECTORS_FILE = "vectors.dat"
+VECTORS_GLOB = "vectors*.dat"
+STATE_FILE = "state.npz"
+LOG_FILE = "changes.log"
+LOG_FOLD_ENTRIES = 1000  # logged changes before they are folded into state.npz
+LOCK_FILE = ".lock"
+METADATA_FIELDS = ("status", "block")
+
+
+class EmbeddingStore:
+    def __init__(self, directory=STORE_DIR, dtype: str = STORE_DTYPE):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding store dtype: {dtype}")
+        self.directory = Path(directory)
+        self._lock = threading.RLock()
+        self._state_key = None
+        self._log_offset = 0
+        self._log_entries = 0
+        self.last_sync = 0.0
+        self._reset(dtype)
+        self._reload()
+
+    def _reset(self, dtype: str = None):
+        self.dtype = dtype or self.dtype
+        self.dims = None
+        self.generation = 0
+        self.vectors_file = VECTORS_FILE
+        self.capacity = 0
+        self.size = 0
+        self.watermark = None
+        self.ids = []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.codes = {field: np.zeros(0, dtype=np.int16) for field in METADATA_FIELDS}
+        self.vocab = {field: [] for field in METADATA_FIELDS}
+        self._vectors = None
+
+    # --- persistence -------------------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus the store's file lock, with the latest state loaded."""
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / LOCK_FILE, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload()
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self):
+        """
+        Loads state.npz (and remaps the vectors) if another writer replaced
+        it, then applies changes.log entries not seen yet.
+        """
+        path = self.directory / STATE_FILE
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return
+        key = (stat.st_ino, stat.st_mtime_ns)
+        if key != self._state_key:
+            self._load_state(path)
+            self._state_key = key
+            self._log_offset = self._log_entries = 0
+        self._replay_log()
+
+    def _load_state(self, path):
+        with np.load(path, allow_pickle=False) as state:
+            meta = json.loads(str(state["meta"]))
+            self._reset(meta["dtype"])
+            self.dims = meta["dims"]
+            self.generation = meta.get("generation", 0)
+            self.vectors_file = meta.get("vectors_file", VECTORS_FILE)
+            self.capacity = meta["capacity"]
+            self.size = meta["size"]
+            self.watermark = meta["watermark"]
+            self.vocab = meta["vocab"]
+            self.ids = [i.decode() for i in state["ids"]]
+            self.alive = _grow(state["alive"], self.capacity)
+            self.scales = _grow(state["scales"], self.capacity)
+            self.codes = {field: _grow(state[field], self.capacity) for field in METADATA_FIELDS}
+        self.rows = {complaint_id: row for row, complaint_id in enumerate(self.ids)}
+        if self.capacity:
+            self._vectors = np.memmap(
+                self.directory / self.vectors_file, dtype=DTYPES[self.dtype], mode="r+",
+                shape=(self.capacity, self.dims)
+            )
+
+    def _replay_log(self):
+        path = self.directory / LOG_FILE
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size < self._log_offset:  # truncated by a commit
+            self._log_offset = 0
+        if size == self._log_offset:
+            return
+        with open(path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(size - self._log_offset)
+        complete = data[:data.rfind(b"\n") + 1]  # a line may still be being written
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            # Entries of an older generation are already part of state.npz.
+            if entry["gen"] == self.generation:
+                self._apply_entry(entry)
+        self._log_offset += len(complete)
+
+    def _apply_entry(self, entry: dict):
+        self._log_entries += 1
+        if "watermark" in entry:
+            self.watermark = entry["watermark"]
+        row = self.rows.get(entry.get("id"))
+        if row is None:
+            return
+        if entry.get("deleted"):
+            self.alive[row] = False
+        for field in METADATA_FIELDS:
+            if field in entry:
+                self.codes[field][row] = self._code(field, entry[field])
+
+    def _append_log(self, entry: dict):
+        """Applies and logs one row change (caller holds _locked, so the log is replayed to its end)."""
+        entry = {"gen": self.generation, **entry}
+        self._apply_entry(entry)
+        with open(self.directory / LOG_FILE, "ab") as f:
+            f.write(json.dumps(entry).encode("utf-8") + b"\n")
+            self._log_offset = f.tell()
+        if self._log_entries >= LOG_FOLD_ENTRIES:
+            self._commit()
+
+    def _commit(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        n = self.size
+        self.generation += 1
+        meta = {
+            "dtype": self.dtype, "dims": self.dims, "capacity": self.capacity, "size": n,
+            "watermark": self.watermark, "vocab": self.vocab, "vectors_file": self.vectors_file,
+            "generation": self.generation
+        }
+        tmp_path = self.directory / f".{STATE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                ids=np.array(self.ids, dtype="S24"),
+                alive=self.alive[:n],
+                scales=self.scales[:n],
+                **{field: self.codes[field][:n] for field in METADATA_FIELDS}
+            )
+        os.replace(tmp_path, self.directory / STATE_FILE)
+        stat = (self.directory / STATE_FILE).stat()
+        self._state_key = (stat.st_ino, stat.st_mtime_ns)
+        # The new state includes every logged change.
+        with open(self.directory / LOG_FILE, "wb"):
+            pass
+        self._log_offset = self._log_entries = 0
+        self._remove_stale_vectors()
+
+    def _remove_stale_vectors(self):
+        """Deletes vectors files state.npz no longer points at (replaced by compaction)."""
+        for path in self.directory.glob(VECTORS_GLOB):
+            if path.name != self.vectors_file:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # still mapped elsewhere (Windows); removed by a later commit
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = max(MIN_CAPACITY, self.capacity * 2, rows)
+        path = self.directory / self.vectors_file
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(path, "r+b" if path.exists() and self.capacity else "wb") as f:
+            f.truncate(capacity * self.dims * np.dtype(DTYPES[self.dtype]).itemsize)
+        self._vectors = np.memmap(path, dtype=DTYPES[self.dtype], mode="r+", shape=(capacity, self.dims))
+        self.alive = _grow(self.alive, capacity)
+        self.scales = _grow(self.scales, capacity)
+        self.codes = {field: _grow(codes, capacity) for field, codes in self.codes.items()}
+        self.capacity = capacity
+
+    def _compact(self):
+        """
+        Copies the live rows into a new vectors file. The old file stays in
+        use until the caller's _commit() points state.npz at the new one.
+        """
+        keep = np.flatnonzero(self.alive[:self.size])
+        print(f"[INFO] Compacting embedding store: {self.size - len(keep)} deleted rows.")
+        capacity = max(MIN_CAPACITY, len(keep))
+        vectors_file = f"vectors.{time.time_ns()}.dat"
+        compacted = np.memmap(
+            self.directory / vectors_file, dtype=DTYPES[self.dtype], mode="w+", shape=(capacity, self.dims)
+        )
+        for start in range(0, len(keep), SEARCH_CHUNK):
+            rows = keep[start:start + SEARCH_CHUNK]
+            compacted[start:start + len(rows)] = self._vectors[rows]
+        compacted.flush()
+        del compacted
+        self.vectors_file = vectors_file
+
+        self.ids = [self.ids[row] for row in keep]
+        self.rows = {complaint_id: row for row, complaint_id in enumerate(self.ids)}
+        self.scales = _grow(self.scales[keep], capacity)
+        self.codes = {field: _grow(codes[keep], capacity) for field, codes in self.codes.items()}
+        self.alive = _grow(np.ones(len(keep), dtype=bool), capacity)
+        self.size = len(keep)
+        self.capacity = capacity
+        self._vectors = np.memmap(
+            self.directory / vectors_file, dtype=DTYPES[self.dtype], mode="r+", shape=(capacity, self.dims)
+        )
+
+    # --- writes ------------------------------------------------------------
+
+    def _code(self, field: str, value) -> int:
+        vocab = self.vocab[field]
+        if value not in vocab:
+            vocab.append(value)
+        return vocab.index(value)
+
+    def _write(self, ids: list, vectors: list, metadata: list) -> int:
+        """Upserts rows (caller holds _locked). Vectors of another dimensionality are skipped."""
+        if not ids:
+            return 0
+        if self.dims is None:
+            self.dims = len(vectors[0])
+        keep = [i for i, vector in enumerate(vectors) if len(vector) == self.dims]
+        if len(keep) < len(ids):
+            print(f"[WARNING] Skipped {len(ids) - len(keep)} embeddings that are not {self.dims}-dimensional; "
+                  f"rebuild the store after changing the embedding size.")
+        if not keep:
+            return 0
+
+        matrix = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        rows = []
+        for i in keep:
+            complaint_id = str(ids[i])
+            row = self.rows.get(complaint_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.ids.append(complaint_id)
+                self.rows[complaint_id] = row
+            rows.append(row)
+        rows = np.asarray(rows)
+        self._ensure_capacity(self.size)
+
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1)
+            scales[scales == 0] = 1.0
+            self.scales[rows] = scales
+            self._vectors[rows] = np.round(matrix / scales[:, None] * 127).astype(np.int8)
+        else:
+            self._vectors[rows] = matrix.astype(DTYPES[self.dtype])
+        self.alive[rows] = True
+        for row, i in zip(rows, keep):
+            for field in METADATA_FIELDS:
+                self.codes[field][row] = self._code(field, metadata[i].get(field))
+        return len(keep)
+
+    def _delete(self, ids) -> int:
+        deleted = 0
+        for complaint_id in ids:
+            row = self.rows.get(str(complaint_id))
+            if row is not None and self.alive[row]:
+                self.alive[row] = False
+                deleted += 1
+        return deleted
+
+    def apply(self, complaint_id: str, embedding=None, metadata: dict = None, deleted: bool = False):
+        """
+        Applies one complaint change immediately (the next sync() also sees
+        it). Status/block changes and deletions only append to changes.log;
+        a new or changed embedding commits the state.
+        """
+        with self._locked():
+            complaint_id = str(complaint_id)
+            if deleted:
+                if complaint_id in self.rows and self.alive[self.rows[complaint_id]]:
+                    self._append_log({"id": complaint_id, "deleted": True})
+            elif embedding is not None:
+                previous = self.metadata([complaint_id]).get(complaint_id, {})
+                self._write([complaint_id], [embedding], [{**previous, **(metadata or {})}])
+                self._commit()
+            elif metadata and complaint_id in self.rows:
+                current = self.metadata([complaint_id])[complaint_id]
+                changed = {
+                    field: value for field, value in metadata.items()
+                    if field in METADATA_FIELDS and current.get(field) != value
+                }
+                if changed:
+                    self._append_log({"id": complaint_id, **changed})
+
+    def upsert_many(self, ids: list, vectors, metadata: list = None):
+        with self._locked():
+            self._write(list(ids), list(vectors), metadata or [{}] * len(ids))
+            self._commit()
+
+    def sync(self, collection=None) -> dict:
+        """
+        Applies complaints changed since the last sync. The first sync reads
+        every embedding once.
+        """
+        collection = collection if collection is not None else complaints_collection
+        with self._locked():
+            started = time.perf_counter()
+            query = {}
+            if self.watermark is not None:
+                since = datetime.fromisoformat(self.watermark)
+                query = {"$or": [{"updated_at": {"$gte": since}}, {"embedding_updated_at": {"$gte": since}}]}
+            projection = {"embedding": 1, "updated_at": 1, "embedding_updated_at": 1, **{f: 1 for f in METADATA_FIELDS}}
+
+            written = removed = updated = 0
+            watermark = self.watermark
+            batch = []
+            cursor = collection.find(query, projection).batch_size(SYNC_BATCH)
+            for doc in cursor:
+                batch.append(doc)
+                for field in ("updated_at", "embedding_updated_at"):
+                    if doc.get(field) is not None:
+                        stamp = doc[field].isoformat()
+                        watermark = stamp if watermark is None or stamp > watermark else watermark
+                if len(batch) >= SYNC_BATCH:
+                    w, r, u = self._apply_docs(batch)
+                    written, removed, updated, batch = written + w, removed + r, updated + u, []
+            w, r, u = self._apply_docs(batch)
+            written, removed, updated = written + w, removed + r, updated + u
+
+            live = int(self.alive[:self.size].sum())
+            expected = collection.count_documents(self._storable_query())
+            if expected != live:
+                w, r = self._reconcile(collection)
+                written, removed = written + w, removed + r
+
+            compact = (self.size > MIN_CAPACITY
+                       and self.size - self.alive[:self.size].sum() > COMPACT_DEAD_RATIO * self.size)
+            if written or removed or compact:
+                self.watermark = watermark
+                if compact:
+                    self._compact()
+                self._commit()
+            elif watermark != self.watermark:
+                self._append_log({"watermark": watermark})
+            self.last_sync = time.monotonic()
+            return {
+                "written": written, "removed": removed, "updated": updated,
+                "rows": int(self.alive[:self.size].sum()), "seconds": time.perf_counter() - started
+            }
+
+    def _apply_docs(self, docs: list):
+        """
+        Writes new or changed vectors, logs status/block-only changes and
+        drops complaints that lost their embedding. Returns (written,
+        removed, updated).
+        """
+        to_write, updated = [], 0
+        for doc in docs:
+            if not doc.get("embedding"):
+                continue
+            stored = self._stored_metadata(doc)
+            if stored is None:
+                to_write.append(doc)
+                continue
+            changed = {f: doc.get(f) for f in METADATA_FIELDS if stored[f] != doc.get(f)}
+            if changed:
+                self._append_log({"id": str(doc["_id"]), **changed})
+                updated += 1
+        written = self._write(
+            [str(d["_id"]) for d in to_write],
+            [d["embedding"] for d in to_write],
+            [{f: d.get(f) for f in METADATA_FIELDS} for d in to_write]
+        )
+        removed = self._delete(str(d["_id"]) for d in docs if not d.get("embedding"))
+        return written, removed, updated
+
+    def _stored_metadata(self, doc: dict):
+        """The stored status/block of a complaint whose vector is stored unchanged, else None."""
+        complaint_id = str(doc["_id"])
+        row = self.rows.get(complaint_id)
+        if row is None or not self.alive[row] or len(doc["embedding"]) != self.dims:
+            return None
+        vector = np.asarray(doc["embedding"], dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        # int8/float16 rows differ from the source by their rounding error.
+        if not np.allclose(self._dequantize([row])[0], vector, atol=1e-2):
+            return None
+        return self.metadata([complaint_id])[complaint_id]
+
+    def _storable_query(self) -> dict:
+        """
+        Complaints whose embedding fits the store. Other sizes (mid-migration)
+        are skipped by _write and must not count as missing rows.
+        """
+        if self.dims is None:
+            return {"embedding": {"$exists": True}}
+        return {"embedding": {"$size": self.dims}}
+
+    def _reconcile(self, collection):
+        """Drops rows of deleted complaints and loads any the watermark missed."""
+        current = {str(d["_id"]) for d in collection.find(self._storable_query(), {"_id": 1})}
+        removed = self._delete(
+            complaint_id for complaint_id, row in self.rows.items()
+            if self.alive[row] and complaint_id not in current
+        )
+        missing = [
+            complaint_id for complaint_id in current
+            if complaint_id not in self.rows or not self.alive[self.rows[complaint_id]]
+        ]
+        written = 0
+        for start in range(0, len(missing), SYNC_BATCH):
+            docs = list(collection.find(
+                {"_id": {"$in": [ObjectId(i) for i in missing[start:start + SYNC_BATCH]]}},
+                {"embedding": 1, **{f: 1 for f in METADATA_FIELDS}}
+            ))
+            written += self._apply_docs(docs)[0]
+        return written, removed
+
+    def sync_if_stale(self, max_age: float = SYNC_INTERVAL_SECONDS):
+        if time.monotonic() - self.last_sync >= max_age:
+            self.sync()
+
+    def rebuild(self, collection=None) -> dict:
+        """Discards the store and reads every embedding again."""
+        with self._locked():
+            (self.directory / STATE_FILE).unlink(missing_ok=True)
+            (self.directory / LOG_FILE).unlink(missing_ok=True)
+            for path in self.directory.glob(VECTORS_GLOB):
+                path.unlink(missing_ok=True)
+            self._reset()
+            self._state_key = None
+        return self.sync(collection)
+
+    # --- reads -------------------------------------------------------------
+
+    def _dequantize(self, rows) -> np.ndarray:
+        """float32 copies of rows (an index array or a slice); float32 slices are views."""
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= (self.scales[rows] / 127)[:, None]
+        return vectors
+
+    def vectors(self, ids: list = None):
+        """
+        (ids, float32 matrix) of the given complaints, or of every stored
+        one. A float32 store with no deleted rows returns the memory map
+        itself, without copying.
+        """
+        with self._lock:
+            self._reload()
+            if ids is None:
+                rows = np.flatnonzero(self.alive[:self.size])
+                if self.dtype == "float32" and len(rows) == self.size and self.size:
+                    return list(self.ids), self._vectors[:self.size]
+            else:
+                rows = np.asarray([self.rows[str(i)] for i in ids if str(i) in self.rows], dtype=int)
+                rows = rows[self.alive[rows]] if len(rows) else rows
+            if not len(rows):
+                return [], np.zeros((0, self.dims or 0), dtype=np.float32)
+            return [self.ids[row] for row in rows], self._dequantize(rows)
+
+    def get(self, complaint_id: str):
+        with self._lock:
+            self._reload()
+            row = self.rows.get(str(complaint_id))
+            if row is None or not self.alive[row]:
+                return None
+            return self._dequantize([row])[0]
+
+    def metadata(self, ids) -> dict:
+        with self._lock:
+            self._reload()
+            result = {}
+            for complaint_id in ids:
+                row = self.rows.get(str(complaint_id))
+                if row is not None:
+                    result[str(complaint_id)] = {
+                        field: self.vocab[field][self.codes[field][row]] for field in METADATA_FIELDS
+                    }
+            return result
+
+    def search(self, vector, top_k: int = 5, exclude: str = None, filters: dict = None) -> list:
+        """
+        [(complaint_id, cosine)] best first. filters maps status/block to
+        allowed values. The matrix is scored in chunks, so only one chunk
+        is dequantized at a time.
+        """
+        with self._lock:
+            self._reload()
+            n = self.size
+            if not n or top_k <= 0:
+                return []
+            query = np.array(vector, dtype=np.float32).ravel()
+            if len(query) != self.dims:
+                return []
+            query /= np.linalg.norm(query) or 1.0
+
+            valid = self.alive[:n].copy()
+            if exclude is not None and str(exclude) in self.rows:
+                valid[self.rows[str(exclude)]] = False
+            for field, allowed in (filters or {}).items():
+                codes = [self.vocab[field].index(v) for v in allowed if v in self.vocab[field]]
+                valid &= np.isin(self.codes[field][:n], codes)
+
+            scores = np.full(n, -np.inf, dtype=np.float32)
+            for start in range(0, n, SEARCH_CHUNK):
+                stop = min(n, start + SEARCH_CHUNK)
+                if valid[start:stop].any():
+                    scores[start:stop] = self._dequantize(slice(start, stop)) @ query
+            scores[~valid] = -np.inf
+
+            k = min(top_k, int(valid.sum()))
+            if not k:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.ids[row], float(scores[row])) for row in best]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._reload()
+            itemsize = np.dtype(DTYPES[self.dtype]).itemsize
+            return {
+                "dtype": self.dtype, "dims": self.dims, "rows": int(self.alive[:self.size].sum()),
+                "deleted": int(self.size - self.alive[:self.size].sum()),
+                "data_mb": self.size * (self.dims or 0) * itemsize / 1e6,
+                "watermark": self.watermark
+            }
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros(capacity, dtype=array.dtype)
+    grown[:min(len(array), capacity)] = array[:capacity]
+    return grown
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore()
+        return _store
+
+
+def main(argv):
+    command = argv[0] if argv else "sync"
+    store = get_embedding_store()
+    if command == "sync":
+        print(f"[SUCCESS] {store.sync()}")
+    elif command == "rebuild":
+        print(f"[SUCCESS] {store.rebuild()}")
+    elif command == "stats":
+        print(store.stats())
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
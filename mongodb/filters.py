@@ -0,0 +1,31 @@
+"""
+Status/block filters shared by the similarity and lexical backends.
+
+Callers pass {"status": ..., "block": ...} with a single value, a list of
+values or None (no restriction); backends work on the normalized form,
+field -> list of allowed values, with unrestricted fields left out.
+"""
+
+FILTER_FIELDS = ("status", "block")
+
+
+def as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def normalize_filters(filters: dict = None) -> dict:
+    filters = filters or {}
+    return {
+        field: as_list(filters.get(field))
+        for field in FILTER_FIELDS
+        if filters.get(field) is not None
+    }
+
+
+def matches_filters(metadata: dict, filters: dict) -> bool:
+    """Whether a complaint's {status, block} passes normalized filters."""
+    return all(metadata.get(field) in allowed for field, allowed in filters.items())
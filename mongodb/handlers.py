@@ -1,46 +1,253 @@
+import logging
 from mongodb.mongo_client import complaints_collection
+from mongodb import similarity
 from datetime import datetime
+import bson
 from bson import ObjectId
-from sklearn.metrics.pairwise import cosine_similarity 
-import numpy as np 
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Named projections. Pick the smallest view a caller needs; only the
+# "vector" and "full" views return the (large) embedding field.
+COMPLAINT_VIEWS = {
+    "card": {
+        "_id": 1,
+        "resident_name": 1,
+        "block": 1,
+        "description": 1,
+        "llm_summary": 1,
+        "action_recommendation": 1,
+        "category": 1,
+        "severity_level": 1,
+        "status": 1,
+        "created_at": 1,
+        "updated_at": 1,
+        "resolved_at": 1,
+        "analysis_failed": 1,
+        "cluster_id": 1,
+        "cluster_name": 1
+    },
+    "analytics": {
+        "_id": 0,
+        "status": 1,
+        "category": 1,
+        "severity_level": 1,
+        "block": 1,
+        "created_at": 1,
+        "resolved_at": 1
+    },
+    "text": {
+        "_id": 1,
+        "resident_name": 1,
+        "block": 1,
+        "description": 1
+    },
+    "vector": {
+        "_id": 1,
+        "resident_name": 1,
+        "block": 1,
+        "description": 1,
+        "status": 1,
+        "embedding": 1
+    },
+    "full": None
+}
+DEFAULT_VIEW = {"embedding": 0}
+
+PENDING_ANALYSIS_STATUS = "pending_analysis"
+RESIDENT_FIELDS = {
+    "resident_name": str,
+    "block": str,
+    "description": str
+}
+ANALYSIS_FIELDS = {
+    "category": str,
+    "sentiment": str,
+    "severity_level": str,
+    "urgency_score": int,
+    "llm_summary": str,
+    "action_recommendation": str,
+    "embedding": list,
+    "status": str
+}
+# Stand-ins for a complaint the LLM could not analyse, so it still reaches
+# the open column (flagged analysis_failed) instead of staying pending.
+ANALYSIS_FAILED_FIELDS = {
+    "category": "Unclassified",
+    "sentiment": "Unknown",
+    "severity_level": "Unknown",
+    "urgency_score": 0,
+    "llm_summary": "Automatic analysis failed; please review this complaint manually.",
+    "action_recommendation": "Review and classify this complaint manually.",
+    "status": "open"
+}
 
-def create_complaint(complaint_data: dict) -> str:
-    required_fields = {
-        "resident_name": str,
-        "block": str,
-        "description": str,
-        "category": str,
-        "sentiment": str,
-        "severity_level": str,
-        "urgency_score": int,
-        "llm_summary": str,
-        "action_recommendation": str,
-        "embedding": list,
-        "status": str
-    }
 
+def resolve_projection(view: str = None, projection: dict = None):
+    """
+    Returns the projection for a named view, an explicit projection,
+    or the default (everything except the embedding).
+    """
+    if projection is not None:
+        return projection
+    if view is None:
+        return DEFAULT_VIEW
+    if view not in COMPLAINT_VIEWS:
+        raise ValueError(f"Unknown complaint view: {view}")
+    return COMPLAINT_VIEWS[view]
+
+
+def _log_transfer(call: str, docs: list, projection):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    size = sum(len(bson.encode(doc)) for doc in docs)
+    logger.info(
+        "%s returned %d docs, %d bytes (projection=%s)",
+        call, len(docs), size, projection
+    )
+
+_change_listeners = []
+
+def register_change_listener(listener):
+    """
+    Registers listener(complaint_id, block), called after a complaint is
+    created, analysed, updated or deleted in this process.
+    """
+    _change_listeners.append(listener)
+
+def _notify_change(complaint_id: str, block: str = None):
+    if not _change_listeners:
+        return
+    if block is None:
+        block = (complaints_collection.find_one({"_id": ObjectId(complaint_id)}, {"block": 1}) or {}).get("block")
+    for listener in _change_listeners:
+        try:
+            listener(str(complaint_id), block)
+        except Exception as e:
+            print(f"Error in complaint change listener: {e}")
+
+def _validate_fields(complaint_data: dict, required_fields: dict):
     for field, field_type in required_fields.items():
         if field not in complaint_data:
             raise ValueError(f"Missing required field: {field}")
         if not isinstance(complaint_data[field], field_type):
             raise TypeError(f"Invalid type for {field}. Expected {field_type}")
 
+def create_complaint(complaint_data: dict) -> str:
+    _validate_fields(complaint_data, {**RESIDENT_FIELDS, **ANALYSIS_FIELDS})
+
     complaint_data["created_at"] = datetime.utcnow()
     complaint_data["updated_at"] = datetime.utcnow()
 
     result = complaints_collection.insert_one(complaint_data)
+    similarity.notify_complaint_changed(
+        str(result.inserted_id),
+        complaint_data["embedding"],
+        {"status": complaint_data["status"], "block": complaint_data["block"]}
+    )
+    _notify_change(result.inserted_id, complaint_data["block"])
     return str(result.inserted_id)
 
-def get_complaint(complaint_id: str) -> dict:
+def create_pending_complaint(complaint_data: dict) -> str:
+    """
+    Stores a complaint as submitted, before any LLM analysis, with status
+    pending_analysis. complete_complaint_analysis fills in the rest.
+    """
+    _validate_fields(complaint_data, RESIDENT_FIELDS)
+
+    complaint = {field: complaint_data[field] for field in RESIDENT_FIELDS}
+    complaint["status"] = PENDING_ANALYSIS_STATUS
+    complaint["analysis_attempts"] = 0
+    complaint["created_at"] = datetime.utcnow()
+    complaint["updated_at"] = datetime.utcnow()
+
+    result = complaints_collection.insert_one(complaint)
+    return str(result.inserted_id)
+
+def complete_complaint_analysis(complaint_id: str, analysis: dict) -> bool:
+    """
+    Patches a pending_analysis complaint with its classification and
+    embedding. Returns False if the complaint is no longer pending.
+    """
+    _validate_fields(analysis, ANALYSIS_FIELDS)
+
+    update_fields = {
+        field: value for field, value in analysis.items()
+        if field not in RESIDENT_FIELDS and field != "_id"
+    }
+    update_fields["updated_at"] = datetime.utcnow()
+
+    result = complaints_collection.find_one_and_update(
+        {"_id": ObjectId(complaint_id), "status": PENDING_ANALYSIS_STATUS},
+        {"$set": update_fields, "$unset": {"analysis_error": "", "analysis_failed": ""}},
+        projection={"block": 1}
+    )
+    if not result:
+        return False
+
+    similarity.notify_complaint_changed(
+        complaint_id,
+        update_fields["embedding"],
+        {"status": update_fields["status"], "block": result.get("block")}
+    )
+    _notify_change(complaint_id, result.get("block"))
+    return True
+
+def record_analysis_failure(complaint_id: str, error: str) -> int:
+    """
+    Notes a failed analysis attempt and returns the attempt count so far.
+    """
+    try:
+        result = complaints_collection.find_one_and_update(
+            {"_id": ObjectId(complaint_id)},
+            {"$inc": {"analysis_attempts": 1}, "$set": {"analysis_error": error}},
+            projection={"analysis_attempts": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return (result or {}).get("analysis_attempts", 0)
+    except Exception as e:
+        print(f"Error recording analysis failure: {e}")
+        return 0
+
+def mark_analysis_failed(complaint_id: str) -> bool:
+    """
+    Gives up on analysing a pending complaint: it becomes an open complaint
+    with placeholder fields and analysis_failed set (analysis_error keeps
+    the last error). Returns False if the complaint is no longer pending.
+    """
+    result = complaints_collection.find_one_and_update(
+        {"_id": ObjectId(complaint_id), "status": PENDING_ANALYSIS_STATUS},
+        {"$set": {**ANALYSIS_FAILED_FIELDS, "analysis_failed": True, "updated_at": datetime.utcnow()}},
+        projection={"block": 1}
+    )
+    if not result:
+        return False
+    _notify_change(complaint_id, result.get("block"))
+    return True
+
+def get_pending_analysis() -> list:
+    return get_all_complaints(
+        {"status": PENDING_ANALYSIS_STATUS},
+        projection={"_id": 1, "analysis_attempts": 1, **{field: 1 for field in RESIDENT_FIELDS}}
+    )
+
+def get_complaint(complaint_id: str, view: str = None, projection: dict = None) -> dict:
     try:
-        return complaints_collection.find_one({"_id": ObjectId(complaint_id)}) or {}
+        projection = resolve_projection(view, projection)
+        complaint = complaints_collection.find_one({"_id": ObjectId(complaint_id)}, projection) or {}
+        _log_transfer("get_complaint", [complaint] if complaint else [], projection)
+        return complaint
     except Exception as e:
         print(f"Error fetching complaint: {e}")
         return {}
 
-def get_all_complaints(query: dict = None) -> list:
+def get_all_complaints(query: dict = None, view: str = None, projection: dict = None) -> list:
     try:
-        return list(complaints_collection.find(query or {}))
+        projection = resolve_projection(view, projection)
+        complaints = list(complaints_collection.find(query or {}, projection))
+        _log_transfer("get_all_complaints", complaints, projection)
+        return complaints
     except Exception as e:
         print(f"Error fetching complaints: {e}")
         return []
@@ -58,6 +265,13 @@ def update_complaint(complaint_id: str, update_data: dict) -> bool:
             {"$set": update_data}
         )
 
+        similarity.notify_complaint_changed(
+            complaint_id,
+            update_data.get("embedding"),
+            {k: update_data[k] for k in ("status", "block") if k in update_data}
+        )
+        if result.modified_count:
+            _notify_change(complaint_id, update_data.get("block"))
         return result.modified_count > 0
     except Exception as e:
         print(f"Error updating complaint: {e}")
@@ -65,20 +279,87 @@ def update_complaint(complaint_id: str, update_data: dict) -> bool:
 
 def delete_complaint(complaint_id: str) -> bool:
     try:
-        result = complaints_collection.delete_one({"_id": ObjectId(complaint_id)})
-        return result.deleted_count > 0
+        deleted = complaints_collection.find_one_and_delete(
+            {"_id": ObjectId(complaint_id)},
+            projection={"block": 1}
+        )
+        similarity.notify_complaint_changed(complaint_id, deleted=True)
+        if deleted:
+            _notify_change(complaint_id, deleted.get("block"))
+        return deleted is not None
     except Exception as e:
         print(f"Error deleting complaint: {e}")
         return False
 
-def get_complaints_by_status(status: str) -> list:
+def get_complaints_by_status(status: str, view: str = None, projection: dict = None) -> list:
     try:
-        return list(complaints_collection.find({"status": status}))
+        projection = resolve_projection(view, projection)
+        complaints = list(complaints_collection.find({"status": status}, projection))
+        _log_transfer("get_complaints_by_status", complaints, projection)
+        return complaints
     except Exception as e:
         print(f"Error fetching complaints by status: {e}")
         return []
 
 
+def count_complaints_by_status(status: str) -> int:
+    try:
+        return complaints_collection.count_documents({"status": status})
+    except Exception as e:
+        print(f"Error counting complaints by status: {e}")
+        return 0
+
+
+def page_cursor(complaint: dict, sort_field: str = "updated_at") -> tuple:
+    """
+    Keyset cursor for a complaint: (sort value, id). Passing the cursor of
+    the last item of a page as `after` returns the page that follows it.
+    """
+    return (complaint.get(sort_field), str(complaint["_id"]))
+
+
+def get_complaints_page(status: str, sort_field: str = "updated_at", page_size: int = 6,
+                        after: tuple = None, view: str = "card") -> dict:
+    """
+    Returns one page of complaints with the given status, newest first by
+    (sort_field, _id). Uses range conditions instead of skip, so the cost of
+    a page does not grow with its position or the collection size.
+    Documents without sort_field come last, as MongoDB sorts them.
+    """
+    query = {"status": status}
+    if after:
+        after_value, after_id = after
+        after_id = ObjectId(after_id)
+        if after_value is None:
+            query[sort_field] = None
+            query["_id"] = {"$lt": after_id}
+        else:
+            query["$or"] = [
+                {sort_field: {"$lt": after_value}},
+                {sort_field: after_value, "_id": {"$lt": after_id}},
+                {sort_field: None}
+            ]
+
+    try:
+        projection = resolve_projection(view)
+        complaints = list(
+            complaints_collection.find(query, projection)
+            .sort([(sort_field, -1), ("_id", -1)])
+            .limit(page_size + 1)
+        )
+        _log_transfer("get_complaints_page", complaints, projection)
+    except Exception as e:
+        print(f"Error fetching complaints page: {e}")
+        complaints = []
+
+    has_next = len(complaints) > page_size
+    complaints = complaints[:page_size]
+    return {
+        "items": complaints,
+        "next_cursor": page_cursor(complaints[-1], sort_field) if has_next else None
+    }
+
+
 def update_complaint_status(complaint_id: str, new_status: str, extra_fields: dict = None) -> bool:
     """
     Updates complaint status and timestamps.
@@ -101,41 +382,55 @@ def update_complaint_status(complaint_id: str, new_status: str, extra_fields: di
             {"$set": update_fields}
         )
 
+        similarity.notify_complaint_changed(complaint_id, metadata={"status": new_status})
+        if result.modified_count:
+            _notify_change(complaint_id)
         return result.modified_count > 0
     except Exception as e:
         print(f"Error updating complaint status: {e}")
         return False
 
-def find_similar_complaints(complaint_id: str, top_k: int = 5):
+def find_similar_complaints(complaint_id: str, top_k: int = 5, status=None, block=None,
+                            backend: str = None):
     """
-    Finds top K similar complaints using cosine similarity on embeddings.
+    Finds top K similar complaints by embedding cosine similarity, optionally
+    restricted to a status and/or block (a value or a list of values).
     Summary is NOT used. Only embedding → similarity.
+    See mongodb.similarity for the available backends.
     """
-    target = complaints_collection.find_one({"_id": ObjectId(complaint_id)})
-    if not target:
-        return []
+    complaint_id = str(complaint_id)
 
-    target_embedding = np.array(target["embedding"]).reshape(1, -1)
+    target_embedding = similarity.get_cached_vector(complaint_id)
+    if target_embedding is None:
+        target = get_complaint(complaint_id, projection={"embedding": 1})
+        if not target or not target.get("embedding"):
+            return []
+        target_embedding = target["embedding"]
 
-    all_complaints = list(
-        complaints_collection.find({"_id": {"$ne": ObjectId(complaint_id)}})
+    hits = similarity.search_similar(
+        target_embedding,
+        top_k,
+        exclude=complaint_id,
+        filters={"status": status, "block": block},
+        backend=backend
     )
-
-    if not all_complaints:
+    if not hits:
         return []
 
-    embeddings = np.array([c["embedding"] for c in all_complaints])
-    similarities = cosine_similarity(target_embedding, embeddings)[0]
-
-    sorted_idx = similarities.argsort()[::-1][:top_k]
+    complaints = {
+        str(c["_id"]): c
+        for c in get_all_complaints(
+            {"_id": {"$in": [ObjectId(hit_id) for hit_id, _ in hits]}},
+            view="text"
+        )
+    }
 
-    similar = [
+    return [
         {
-            "name": all_complaints[i]["resident_name"],
-            "description": all_complaints[i]["description"],
-            "similarity": float(similarities[i])
+            "name": complaints[hit_id]["resident_name"],
+            "description": complaints[hit_id]["description"],
+            "similarity": score
         }
-        for i in sorted_idx
+        for hit_id, score in hits
+        if hit_id in complaints
     ]
-
-    return similar
\ No newline at end of file
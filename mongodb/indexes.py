@@ -0,0 +1,200 @@
+"""
+Declares and applies the indexes the app's complaint queries rely on.
+
+    python -m mongodb.indexes apply   # create missing indexes (idempotent)
+    python -m mongodb.indexes check   # explain the app's queries, flag scans
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
+
+from mongodb.mongo_client import complaints_collection
+from mongodb.cluster_store import ensure_cluster_indexes
+
+REQUIRED_INDEXES = [
+    # Kanban pages: get_complaints_page(status, "updated_at") and status counts
+    IndexModel(
+        [("status", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+        name="status_updated_at"
+    ),
+    # Resolved column: get_complaints_page("closed", "resolved_at")
+    IndexModel(
+        [("status", ASCENDING), ("resolved_at", DESCENDING), ("_id", DESCENDING)],
+        name="status_resolved_at"
+    ),
+    # Block-filtered queries (chatbot filters, block summaries)
+    IndexModel([("block", ASCENDING), ("status", ASCENDING)], name="block_status"),
+    IndexModel([("created_at", ASCENDING)], name="created_at"),
+    # Incremental embedding store sync (mongodb.embedding_store)
+    IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    IndexModel([("embedding_updated_at", ASCENDING)], name="embedding_updated_at", sparse=True),
+    # Complaints of a theme (mongodb.cluster_store)
+    IndexModel([("cluster_run_id", ASCENDING), ("cluster_id", ASCENDING)], name="cluster_run_id", sparse=True),
+    # Chatbot lexical retrieval (mongodb.lexical)
+    IndexModel(
+        [("resident_name", TEXT), ("description", TEXT)],
+        name="complaints_text",
+        weights={"resident_name": 5, "description": 1}
+    ),
+]
+
+FULL_EMBEDDING_DIMENSIONS = 3072
+# gemini-embedding-001 output_dimensionality; 768 and 1536 are the reduced
+# sizes Google recommends. Changing it needs a migration (llm.migrate_embeddings).
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", FULL_EMBEDDING_DIMENSIONS))
+VECTOR_INDEX_NAME = "complaints_embedding_index"
+VECTOR_INDEX_DEFINITION = {
+    "fields": [
+        {
+            "type": "vector",
+            "path": "embedding",
+            "numDimensions": EMBEDDING_DIMENSIONS,
+            "similarity": "cosine"
+        },
+        {"type": "filter", "path": "status"},
+        {"type": "filter", "path": "block"}
+    ]
+}
+
+# (description, filter, sort) for every query shape the app issues.
+APP_QUERIES = [
+    ("Kanban pending page", {"status": "open"}, [("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ("Kanban resolved page", {"status": "closed"}, [("resolved_at", DESCENDING), ("_id", DESCENDING)]),
+    ("Kanban junk page", {"status": "junk"}, [("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ("Status count", {"status": "open"}, None),
+    ("Block + status filter", {"block": "A1", "status": {"$in": ["open", "pending"]}}, None),
+    ("Recent complaints", {"created_at": {"$gte": datetime.utcnow() - timedelta(days=7)}}, None),
+]
+
+
+def ensure_indexes(collection=complaints_collection) -> list:
+    """
+    Creates the regular indexes. create_indexes is a no-op for indexes that
+    already exist with the same spec, so this is safe to call on every start.
+    """
+    try:
+        return collection.create_indexes(REQUIRED_INDEXES)
+    except OperationFailure as e:
+        print(f"Error creating indexes: {e}")
+        return []
+
+
+def _vector_dimensions(definition):
+    for field in (definition or {}).get("fields", []):
+        if field.get("type") == "vector":
+            return field.get("numDimensions")
+    return None
+
+
+def ensure_vector_index(collection=complaints_collection, resize: bool = False) -> bool:
+    """
+    Creates or updates the Atlas vector search index. Returns False when the
+    server does not support search indexes (e.g. a local mongod), or when
+    the index has a different numDimensions and resize is not set: resizing
+    drops every stored embedding of the old size out of $vectorSearch, so it
+    is left to `python -m mongodb.indexes apply` after llm.migrate_embeddings.
+    """
+    try:
+        existing = list(collection.list_search_indexes(VECTOR_INDEX_NAME))
+        if not existing:
+            collection.create_search_index(
+                SearchIndexModel(
+                    definition=VECTOR_INDEX_DEFINITION,
+                    name=VECTOR_INDEX_NAME,
+                    type="vectorSearch"
+                )
+            )
+            return True
+        definition = existing[0].get("latestDefinition")
+        if definition == VECTOR_INDEX_DEFINITION:
+            return True
+        indexed = _vector_dimensions(definition)
+        if indexed != EMBEDDING_DIMENSIONS and not resize:
+            print(
+                f"[ERROR] Vector index {VECTOR_INDEX_NAME} has {indexed} dimensions but "
+                f"EMBEDDING_DIMENSIONS is {EMBEDDING_DIMENSIONS}; leaving it unchanged. Run "
+                "`python -m llm.migrate_embeddings`, then `python -m mongodb.indexes apply`."
+            )
+            return False
+        collection.update_search_index(VECTOR_INDEX_NAME, VECTOR_INDEX_DEFINITION)
+        return True
+    except OperationFailure as e:
+        print(f"Vector search index not applied: {e}")
+        return False
+
+
+def apply_all(collection=complaints_collection):
+    """Applied on every app start; never changes the vector index dimensions."""
+    ensure_indexes(collection)
+    ensure_cluster_indexes()
+    ensure_vector_index(collection)
+
+
+def _plan_stages(plan) -> list:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def check_query_plans(collection=complaints_collection) -> list:
+    """
+    Explains each query in APP_QUERIES and reports whether its winning plan
+    uses an index. Collection scans and in-memory sorts are flagged.
+    """
+    report = []
+    for description, query, sort in APP_QUERIES:
+        cursor = collection.find(query).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        except OperationFailure as e:
+            print(f"Error explaining '{description}': {e}")
+            continue
+
+        stages = _plan_stages(winning_plan)
+        report.append({
+            "query": description,
+            "stages": stages,
+            "indexed": "COLLSCAN" not in stages,
+            "in_memory_sort": "SORT" in stages
+        })
+    return report
+
+
+def main(argv):
+    command = argv[0] if argv else "apply"
+
+    if command == "apply":
+        created = ensure_indexes()
+        ensure_cluster_indexes()
+        print(f"[SUCCESS] Indexes ensured: {', '.join(created)}")
+        if ensure_vector_index(resize=True):
+            print(f"[SUCCESS] Vector index ensured: {VECTOR_INDEX_NAME}")
+    elif command == "check":
+        unsupported = 0
+        for entry in check_query_plans():
+            ok = entry["indexed"] and not entry["in_memory_sort"]
+            unsupported += not ok
+            label = "OK" if ok else "NO INDEX SUPPORT"
+            print(f"[{label}] {entry['query']}: {' -> '.join(entry['stages'])}")
+        return 1 if unsupported else 0
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""
+In-process inverted index over complaint descriptions with BM25 scoring,
+the local counterpart of the Mongo text index (see mongodb.lexical).
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "of", "on", "or", "that", "the", "there", "this", "to", "was", "were",
+    "with", "any", "all", "about", "what", "which", "who", "how", "many", "much", "me",
+    "show", "list", "tell", "give", "find", "regarding", "related", "near", "please",
+    "complaint", "complaints", "issue", "issues", "problem", "problems", "reported",
+    "block", "blocks", "resident", "residents", "mention", "mentions",
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list:
+    return [t for t in re.findall(r"\w\w+", (text or "").lower()) if t not in STOPWORDS]
+
+
+class InvertedIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # term -> {id: term frequency}
+        self._doc_terms = {}                # id -> {term: term frequency}
+        self._lengths = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def build(self, ids: list, texts: list):
+        for doc_id, text in zip(ids, texts):
+            self.add(doc_id, text)
+        return self
+
+    def add(self, doc_id: str, text: str):
+        terms = defaultdict(int)
+        for term in tokenize(text):
+            terms[term] += 1
+        with self._lock:
+            self._remove(doc_id)
+            self._doc_terms[doc_id] = dict(terms)
+            self._lengths[doc_id] = sum(terms.values())
+            self._total_length += self._lengths[doc_id]
+            for term, tf in terms.items():
+                self._postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings.get(term)
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def match_all(self, terms: list, allowed=None) -> set:
+        """Ids of documents containing every term (optionally restricted to allowed(id))."""
+        with self._lock:
+            postings = sorted((self._postings.get(t, {}) for t in set(terms)), key=len)
+            if not postings or not postings[0]:
+                return set()
+            ids = set(postings[0])
+            for p in postings[1:]:
+                ids.intersection_update(p)
+        return {doc_id for doc_id in ids if allowed is None or allowed(doc_id)}
+
+    def search(self, terms: list, top_k: int = 20, allowed=None) -> list:
+        """[(id, bm25 score)] for documents containing any term, best first."""
+        with self._lock:
+            n = len(self._doc_terms)
+            if not n:
+                return []
+            avg_length = self._total_length / n or 1.0
+            scores = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._lengths[doc_id]
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    )
+        ranked = sorted(
+            ((doc_id, score) for doc_id, score in scores.items() if allowed is None or allowed(doc_id)),
+            key=lambda hit: -hit[1]
+        )
+        return ranked[:top_k]
@@ -0,0 +1,197 @@
+"""
+Background jobs that run in a separate worker process, so long tasks such
+as clustering do not block a Streamlit session.
+
+start_job records the job in the `jobs` collection, takes the per-type
+lock in `job_locks` (only one job of a type runs at a time) and spawns
+
+    python -m mongodb.jobs run <job_id>
+
+The worker reports progress on the job record and a heartbeat thread
+refreshes the lock while it runs; a lock whose worker died expires after
+LOCK_TTL_SECONDS. Worker output goes to job_logs/<job_id>.log, and a job
+whose worker exits without finishing it is marked failed.
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from llm.scheduler import ROLE_ENV, JOB_ROLE
+from mongodb.mongo_client import jobs_collection, job_locks_collection
+
+JOB_TYPES = {
+    "clustering": "mongodb.clustering_pipeline:run_clustering_pipeline",
+}
+LOCK_TTL_SECONDS = 120
+LOG_DIR = Path(os.getenv("JOB_LOG_DIR", Path(__file__).parent / "job_logs"))
+LOG_TAIL_LINES = 20  # worker output kept in the job's error when it dies
+
+
+def _acquire_lock(job_type: str, job_id: ObjectId) -> bool:
+    now = datetime.utcnow()
+    try:
+        job_locks_collection.find_one_and_update(
+            {"_id": job_type, "$or": [{"job_id": None}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"job_id": job_id, "expires_at": now + timedelta(seconds=LOCK_TTL_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock document exists and is held by a live job.
+        return False
+
+
+def _refresh_lock(job_type: str, job_id: ObjectId):
+    job_locks_collection.update_one(
+        {"_id": job_type, "job_id": job_id},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=LOCK_TTL_SECONDS)}}
+    )
+
+
+def _release_lock(job_type: str, job_id: ObjectId):
+    job_locks_collection.update_one(
+        {"_id": job_type, "job_id": job_id},
+        {"$set": {"job_id": None, "expires_at": None}}
+    )
+
+
+def get_job(job_id) -> dict:
+    return jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+
+def get_latest_job(job_type: str) -> dict:
+    return jobs_collection.find_one({"type": job_type}, sort=[("created_at", -1)])
+
+
+def get_running_job(job_type: str):
+    lock = job_locks_collection.find_one({"_id": job_type})
+    if not lock or not lock.get("job_id") or lock["expires_at"] < datetime.utcnow():
+        return None
+    return get_job(lock["job_id"])
+
+
+def start_job(job_type: str, params: dict = None) -> dict:
+    """
+    Starts a job in a worker process. Returns {"job_id", "started"}:
+    started is False (and job_id the running job's) when a job of this
+    type is already in progress.
+    """
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    job_id = ObjectId()
+    if not _acquire_lock(job_type, job_id):
+        running = get_running_job(job_type)
+        return {"job_id": str(running["_id"]) if running else None, "started": False}
+
+    now = datetime.utcnow()
+    jobs_collection.insert_one({
+        "_id": job_id,
+        "type": job_type,
+        "params": params or {},
+        "state": "queued",
+        "progress": 0.0,
+        "message": "Waiting for worker",
+        "created_at": now,
+        "updated_at": now
+    })
+    log_path = LOG_DIR / f"{job_id}.log"
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "wb") as log_file:
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "mongodb.jobs", "run", str(job_id)],
+                cwd=Path(__file__).resolve().parent.parent,
+                env={**os.environ, ROLE_ENV: JOB_ROLE},
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+    except OSError as e:
+        _finish(job_type, job_id, "failed", error=f"Could not start worker: {e}")
+        raise
+    threading.Thread(target=_watch_worker, args=(job_type, job_id, worker, log_path), daemon=True).start()
+    return {"job_id": str(job_id), "started": True}
+
+
+def _watch_worker(job_type: str, job_id: ObjectId, worker: subprocess.Popen, log_path: Path):
+    """
+    Fails the job when its worker exits without recording an outcome (an
+    import error, a missing setting, a crash), instead of leaving it queued
+    until the lock expires.
+    """
+    code = worker.wait()
+    job = jobs_collection.find_one({"_id": job_id}, {"state": 1})
+    if job is None or job["state"] not in ("queued", "running"):
+        return
+    try:
+        output = log_path.read_text(errors="replace").strip().splitlines()[-LOG_TAIL_LINES:]
+    except OSError:
+        output = []
+    print(f"[ERROR] Worker of job {job_id} exited with code {code}; see {log_path}.")
+    _finish(job_type, job_id, "failed", error="\n".join(output + [f"Worker exited with code {code} (log: {log_path})"]))
+
+
+def _finish(job_type: str, job_id: ObjectId, state: str, error: str = None):
+    update = {"state": state, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    if state == "succeeded":
+        update.update({"progress": 1.0, "message": "Done"})
+    if error:
+        update.update({"error": error, "message": error.strip().splitlines()[-1]})
+    jobs_collection.update_one({"_id": job_id}, {"$set": update})
+    _release_lock(job_type, job_id)
+
+
+def run_job(job_id: str):
+    """Worker entry point: runs the job and records its outcome."""
+    job = jobs_collection.find_one_and_update(
+        {"_id": ObjectId(job_id), "state": "queued"},
+        {"$set": {"state": "running", "started_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        print(f"[ERROR] Job {job_id} not found or already started.")
+        return
+
+    job_type = job["type"]
+
+    def progress(fraction: float, message: str):
+        jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"progress": float(fraction), "message": message, "updated_at": datetime.utcnow()}}
+        )
+
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(LOCK_TTL_SECONDS / 4):
+            _refresh_lock(job_type, job["_id"])
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        module_name, function_name = JOB_TYPES[job_type].split(":")
+        function = getattr(importlib.import_module(module_name), function_name)
+        function(progress=progress, **job.get("params", {}))
+    except Exception:
+        print(f"[ERROR] Job {job_id} failed.")
+        _finish(job_type, job["_id"], "failed", error=traceback.format_exc())
+        return
+    finally:
+        stop_heartbeat.set()
+    _finish(job_type, job["_id"], "succeeded")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "run":
+        print("Usage: python -m mongodb.jobs run <job_id>")
+        sys.exit(1)
+    run_job(sys.argv[2])
@@ -0,0 +1,141 @@
+"""
+Backends for lexical (exact-term) complaint search, used by the chatbot's
+hybrid retrieval alongside vector search.
+
+Every backend returns [(complaint_id, score)], best first:
+
+- text:  MongoDB text index complaints_text (default)
+- local: in-process InvertedIndex with BM25 (see mongodb.inverted_index)
+
+Select one with LEXICAL_BACKEND. When the text index is unavailable
+(e.g. an in-memory test double) searches fall back to the local backend.
+"""
+import os
+import threading
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from mongodb.mongo_client import complaints_collection
+from mongodb.handlers import register_change_listener
+from mongodb.inverted_index import InvertedIndex, tokenize
+from mongodb.filters import normalize_filters, matches_filters
+
+DEFAULT_BACKEND = os.getenv("LEXICAL_BACKEND", "text")
+FALLBACK_BACKEND = "local"
+
+
+def _indexed_text(complaint: dict) -> str:
+    """The fields covered by the complaints_text index."""
+    return f"{complaint.get('resident_name') or ''} {complaint.get('description') or ''}"
+
+
+class TextIndexBackend:
+    name = "text"
+
+    def search(self, terms: list, top_k: int = 20, filters: dict = None, match_all: bool = False) -> list:
+        if not terms:
+            return []
+        filters = normalize_filters(filters)
+        # Quoted terms must all be present; bare terms are OR-ed.
+        search = " ".join(f'"{t}"' for t in terms) if match_all else " ".join(terms)
+        query = {"$text": {"$search": search}}
+        query.update({field: {"$in": allowed} for field, allowed in filters.items()})
+        cursor = complaints_collection.find(
+            query, {"score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(top_k)
+        return [(str(doc["_id"]), doc["score"]) for doc in cursor]
+
+
+class LocalInvertedIndexBackend:
+    """
+    Indexes every name and description (with status and block, for filtering) on
+    first use and is then kept current through handlers' change listeners.
+    """
+    name = "local"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._metadata = {}
+        self._index = InvertedIndex()
+        register_change_listener(self.on_change)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            complaints = list(complaints_collection.find(
+                {}, {"_id": 1, "resident_name": 1, "description": 1, "status": 1, "block": 1}
+            ))
+            ids = [str(c["_id"]) for c in complaints]
+            self._metadata = {
+                complaint_id: {"status": c.get("status"), "block": c.get("block")}
+                for complaint_id, c in zip(ids, complaints)
+            }
+            self._index = InvertedIndex().build(ids, [_indexed_text(c) for c in complaints])
+            self._loaded = True
+
+    def on_change(self, complaint_id: str, block: str = None):
+        with self._lock:
+            if not self._loaded:
+                return
+            complaint = complaints_collection.find_one(
+                {"_id": ObjectId(complaint_id)},
+                {"resident_name": 1, "description": 1, "status": 1, "block": 1}
+            )
+            if complaint is None:
+                self._metadata.pop(complaint_id, None)
+                self._index.remove(complaint_id)
+                return
+            self._metadata[complaint_id] = {"status": complaint.get("status"), "block": complaint.get("block")}
+            self._index.add(complaint_id, _indexed_text(complaint))
+
+    def search(self, terms: list, top_k: int = 20, filters: dict = None, match_all: bool = False) -> list:
+        self._ensure_loaded()
+        filters = normalize_filters(filters)
+        allowed = (lambda complaint_id: matches_filters(self._metadata.get(complaint_id, {}), filters)) if filters else None
+        if not match_all:
+            return self._index.search(terms, top_k, allowed)
+        ids = self._index.match_all(terms, allowed)
+        return self._index.search(terms, top_k, ids.__contains__)
+
+
+BACKENDS = {
+    "text": TextIndexBackend,
+    "local": LocalInvertedIndexBackend,
+}
+
+_instances = {}
+_unavailable = set()
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: str = None):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown lexical backend: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def search_lexical(query: str, top_k: int = 20, filters: dict = None,
+                   match_all: bool = False, backend: str = None) -> list:
+    """
+    Searches names and descriptions for the query's terms (stopwords dropped).
+    With match_all, only complaints containing every term are returned.
+    """
+    terms = tokenize(query)
+    name = backend or DEFAULT_BACKEND
+    if name in _unavailable:
+        name = FALLBACK_BACKEND
+    try:
+        return get_backend(name).search(terms, top_k, filters, match_all)
+    except (OperationFailure, NotImplementedError) as e:
+        # NotImplementedError: in-memory test doubles without $text
+        if name == FALLBACK_BACKEND:
+            raise
+        print(f"[WARNING] Lexical backend '{name}' unavailable, using '{FALLBACK_BACKEND}': {e}")
+        _unavailable.add(name)
+        return get_backend(FALLBACK_BACKEND).search(terms, top_k, filters, match_all)
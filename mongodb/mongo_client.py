@@ -16,7 +16,19 @@ class MongoDBClient:
             cls._instance.client = client
             cls._instance.db = db
             cls._instance.complaints = db["complaints"]
+            cls._instance.block_summaries = db["block_summaries"]
+            cls._instance.cluster_summaries = db["cluster_summaries"]
+            cls._instance.clusters = db["clusters"]
+            cls._instance.cluster_runs = db["cluster_runs"]
+            cls._instance.jobs = db["jobs"]
+            cls._instance.job_locks = db["job_locks"]
         return cls._instance
 
 mongo_client = MongoDBClient()
 complaints_collection = mongo_client.complaints
+block_summaries_collection = mongo_client.block_summaries
+cluster_summaries_collection = mongo_client.cluster_summaries
+clusters_collection = mongo_client.clusters
+cluster_runs_collection = mongo_client.cluster_runs
+jobs_collection = mongo_client.jobs
+job_locks_collection = mongo_client.job_locks
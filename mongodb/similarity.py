@@ -0,0 +1,222 @@
+"""
+Backends for "Similar Cases" lookups.
+
+Every backend returns [(complaint_id, cosine_similarity)], best first, so
+callers get the same scores whichever one answered:
+
+- atlas: Atlas $vectorSearch on complaints_embedding_index (default)
+- exact: the memory-mapped embedding store (mongodb.embedding_store),
+         scored in chunked matmuls
+- ivf:   approximate IVFIndex (see mongodb.vector_index), built from the store
+
+Select one with SIMILARITY_BACKEND. When Atlas search is not supported (for
+example against a local mongod) searches fall back to the exact backend;
+other Atlas errors (timeouts, failovers) only fail the search at hand.
+"""
+import os
+import threading
+from pymongo.errors import OperationFailure
+
+from mongodb.mongo_client import complaints_collection
+from mongodb.embedding_store import get_embedding_store
+from mongodb.vector_index import IVFIndex
+from mongodb.indexes import VECTOR_INDEX_NAME
+from mongodb.filters import normalize_filters, matches_filters
+
+DEFAULT_BACKEND = os.getenv("SIMILARITY_BACKEND", "atlas")
+FALLBACK_BACKEND = "exact"
+NUM_CANDIDATES_PER_RESULT = 20
+IVF_OVERSAMPLE = 4
+# Server errors meaning $vectorSearch can't work here, as opposed to transient
+# ones: unrecognized stage, search not enabled, Atlas-only stage, unsupported.
+UNSUPPORTED_ERROR_CODES = {40324, 31082, 6047401, 115}
+
+
+class AtlasVectorSearchBackend:
+    name = "atlas"
+
+    def search(self, vector, top_k: int = 5, exclude: str = None, filters: dict = None) -> list:
+        filters = normalize_filters(filters)
+        limit = top_k + (exclude is not None)
+
+        vector_search = {
+            "index": VECTOR_INDEX_NAME,
+            "path": "embedding",
+            "queryVector": [float(v) for v in vector],
+            "numCandidates": max(100, limit * NUM_CANDIDATES_PER_RESULT),
+            "limit": limit
+        }
+        if filters:
+            vector_search["filter"] = {
+                "$and": [{field: {"$in": allowed}} for field, allowed in filters.items()]
+            }
+
+        pipeline = [
+            {"$vectorSearch": vector_search},
+            {"$project": {"_id": 1, "score": {"$meta": "vectorSearchScore"}}}
+        ]
+
+        # Atlas reports cosine scores as (1 + cosine) / 2.
+        results = [
+            (str(doc["_id"]), 2 * doc["score"] - 1)
+            for doc in complaints_collection.aggregate(pipeline)
+        ]
+        return [r for r in results if r[0] != exclude][:top_k]
+
+    def get_vector(self, complaint_id: str):
+        return None
+
+    def on_change(self, complaint_id: str, embedding=None, metadata: dict = None, deleted: bool = False):
+        pass
+
+
+class _InMemoryBackend:
+    """
+    Loads every embedding (with status and block, for filtering) from the
+    embedding store on first use and is then kept current through on_change.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._metadata = {}
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            store = get_embedding_store()
+            store.sync_if_stale()
+            ids, vectors = store.vectors()
+            self._metadata = store.metadata(ids)
+            self._load(ids, vectors)
+            self._loaded = True
+
+    def on_change(self, complaint_id: str, embedding=None, metadata: dict = None, deleted: bool = False):
+        with self._lock:
+            if not self._loaded:
+                return
+            if deleted:
+                self._metadata.pop(complaint_id, None)
+                self._remove(complaint_id)
+                return
+            if metadata:
+                self._metadata.setdefault(complaint_id, {}).update(metadata)
+            if embedding:
+                self._add(complaint_id, embedding)
+
+
+class ExactMatrixBackend:
+    """
+    Exact cosine search over the shared embedding store. The store is
+    synced from MongoDB at most every SYNC_INTERVAL_SECONDS, and changes
+    made through the handlers are applied to it immediately.
+    """
+    name = "exact"
+
+    def __init__(self):
+        self._store = get_embedding_store()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        self._store.sync_if_stale()
+        self._loaded = True
+
+    def get_vector(self, complaint_id: str):
+        self._ensure_loaded()
+        return self._store.get(complaint_id)
+
+    def search(self, vector, top_k: int = 5, exclude: str = None, filters: dict = None) -> list:
+        self._ensure_loaded()
+        return self._store.search(vector, top_k, exclude, normalize_filters(filters))
+
+    def on_change(self, complaint_id: str, embedding=None, metadata: dict = None, deleted: bool = False):
+        if self._loaded:
+            self._store.apply(complaint_id, embedding, metadata, deleted)
+
+
+class IVFBackend(_InMemoryBackend):
+    name = "ivf"
+
+    def _load(self, ids: list, vectors):
+        self._index = IVFIndex().build(ids, vectors)
+
+    def _add(self, complaint_id: str, embedding):
+        self._index.add(complaint_id, embedding)
+
+    def _remove(self, complaint_id: str):
+        self._index.remove(complaint_id)
+
+    def get_vector(self, complaint_id: str):
+        self._ensure_loaded()
+        return self._index.get_vector(complaint_id)
+
+    def search(self, vector, top_k: int = 5, exclude: str = None, filters: dict = None) -> list:
+        self._ensure_loaded()
+        filters = normalize_filters(filters)
+        with self._lock:
+            if self._index.needs_rebuild:
+                self._loaded = False
+                self._ensure_loaded()
+
+            fetch = top_k
+            while True:
+                hits = self._index.search(vector, fetch * (IVF_OVERSAMPLE if filters else 1), exclude=exclude)
+                results = [hit for hit in hits if matches_filters(self._metadata.get(hit[0], {}), filters)]
+                if len(results) >= top_k or len(hits) < fetch * (IVF_OVERSAMPLE if filters else 1):
+                    return results[:top_k]
+                fetch *= 2
+
+
+BACKENDS = {
+    "atlas": AtlasVectorSearchBackend,
+    "exact": ExactMatrixBackend,
+    "ivf": IVFBackend,
+}
+
+_instances = {}
+_unavailable = set()
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: str = None):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown similarity backend: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def search_similar(vector, top_k: int = 5, exclude: str = None, filters: dict = None, backend: str = None) -> list:
+    name = backend or DEFAULT_BACKEND
+    if name in _unavailable:
+        name = FALLBACK_BACKEND
+    try:
+        return get_backend(name).search(vector, top_k, exclude, filters)
+    except (OperationFailure, NotImplementedError) as e:
+        # NotImplementedError: in-memory test doubles without $vectorSearch
+        if name == FALLBACK_BACKEND:
+            raise
+        if isinstance(e, OperationFailure) and e.code not in UNSUPPORTED_ERROR_CODES:
+            print(f"[WARNING] Similarity search on '{name}' failed: {e}")
+            return []
+        print(f"[WARNING] Similarity backend '{name}' unavailable, using '{FALLBACK_BACKEND}': {e}")
+        _unavailable.add(name)
+        return get_backend(FALLBACK_BACKEND).search(vector, top_k, exclude, filters)
+
+
+def get_cached_vector(complaint_id: str):
+    """Returns the embedding from an already loaded local backend, if any."""
+    for backend in list(_instances.values()):
+        if getattr(backend, "_loaded", False):
+            vector = backend.get_vector(complaint_id)
+            if vector is not None:
+                return vector
+    return None
+
+
+def notify_complaint_changed(complaint_id: str, embedding=None, metadata: dict = None, deleted: bool = False):
+    for backend in list(_instances.values()):
+        backend.on_change(str(complaint_id), embedding, metadata, deleted)
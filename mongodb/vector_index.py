@@ -0,0 +1,169 @@
+import threading
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _spherical_kmeans(x: np.ndarray, k: int, iterations: int, rng) -> np.ndarray:
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(x @ centroids.T, axis=1)
+        for j in range(k):
+            members = x[assignment == j]
+            if len(members):
+                centroids[j] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    In-memory inverted-file (IVF) index for cosine similarity.
+
+    Vectors are L2-normalized float32 rows. A spherical k-means quantizer
+    splits them into `n_lists` buckets; a query only scores the rows in the
+    `n_probe` buckets whose centroids are closest to it. Vectors can be added
+    and removed incrementally without retraining; `needs_rebuild` turns True
+    once the index has grown well past the data it was trained on.
+    """
+
+    TRAIN_SAMPLE = 20000
+    KMEANS_ITERATIONS = 10
+    REBUILD_GROWTH = 4
+
+    def __init__(self, n_lists: int = None, n_probe: int = 8, seed: int = 42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.centroids = None
+        self.trained_size = 0
+        self._vectors = None
+        self._assignment = None
+        self._ids = []
+        self._rows = {}
+        self._free = []
+        self._lists = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return len(self) > max(self.trained_size, 1) * self.REBUILD_GROWTH
+
+    def build(self, ids: list, vectors):
+        with self._lock:
+            self._reset()
+            if not len(ids):
+                return self
+
+            x = normalize_rows(vectors)
+            rng = np.random.default_rng(self.seed)
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(x))))
+            n_lists = min(n_lists, len(x))
+
+            sample = x
+            if len(x) > self.TRAIN_SAMPLE:
+                sample = x[rng.choice(len(x), self.TRAIN_SAMPLE, replace=False)]
+            self.centroids = _spherical_kmeans(sample, n_lists, self.KMEANS_ITERATIONS, rng)
+            self.trained_size = len(x)
+
+            self._vectors = x
+            self._assignment = self._nearest_lists(x)
+            self._ids = list(ids)
+            self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+            self._lists = [[] for _ in range(n_lists)]
+            for row, list_no in enumerate(self._assignment):
+                self._lists[list_no].append(row)
+            return self
+
+    def _nearest_lists(self, x: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(x[i:i + chunk] @ self.centroids.T, axis=1)
+            for i in range(0, len(x), chunk)
+        ])
+
+    def add(self, item_id, vector):
+        with self._lock:
+            if self.centroids is None:
+                return self.build([item_id], [vector])
+            if item_id in self._rows:
+                self.remove(item_id)
+
+            x = normalize_rows(vector)
+            list_no = int(self._nearest_lists(x)[0])
+
+            if self._free:
+                row = self._free.pop()
+                self._ids[row] = item_id
+            else:
+                row = len(self._ids)
+                self._ids.append(item_id)
+                if row >= len(self._vectors):
+                    capacity = max(16, len(self._vectors) * 2)
+                    self._vectors = np.resize(self._vectors, (capacity, self._vectors.shape[1]))
+                    self._assignment = np.resize(self._assignment, capacity)
+
+            self._vectors[row] = x[0]
+            self._assignment[row] = list_no
+            self._rows[item_id] = row
+            self._lists[list_no].append(row)
+
+    def remove(self, item_id) -> bool:
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+            self._lists[self._assignment[row]].remove(row)
+            self._ids[row] = None
+            self._free.append(row)
+            return True
+
+    def get_vector(self, item_id):
+        row = self._rows.get(item_id)
+        return None if row is None else self._vectors[row]
+
+    def search(self, vector, top_k: int = 5, exclude=None) -> list:
+        """
+        Returns up to top_k (id, cosine similarity) pairs, best first.
+        """
+        with self._lock:
+            if self.centroids is None or not self._rows:
+                return []
+
+            q = normalize_rows(vector)[0]
+            n_probe = min(self.n_probe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ q), n_probe - 1)[:n_probe]
+            rows = np.fromiter(
+                (row for list_no in probe for row in self._lists[list_no]),
+                dtype=np.int64
+            )
+            if not len(rows):
+                return []
+
+            scores = self._vectors[rows] @ q
+            k = min(top_k + (exclude is not None), len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+
+            results = []
+            for i in best:
+                item_id = self._ids[rows[i]]
+                if item_id == exclude:
+                    continue
+                results.append((item_id, float(scores[i])))
+            return results[:top_k]
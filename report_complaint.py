@@ -1,6 +1,5 @@
-from mongodb.handlers import create_complaint
 import streamlit as st
-from llm import agents
+from llm.intake import intake_pipeline
 import sys
 from pathlib import Path
 
@@ -32,11 +31,10 @@ def report_complaint_tab():
 
         if st.button("🚀 Submit Complaint"):
             if name and location and complaint_text:
-                with st.spinner("Processing your complaint..."):
+                with st.spinner("Submitting your complaint..."):
                     try:
-                        processed_complaint = agents.analyze_complaint(user_data)
-                        create_complaint(processed_complaint)
-                        st.success("✅ Complaint submitted successfully!")
+                        intake_pipeline.submit_complaint(user_data)
+                        st.success("✅ Complaint submitted successfully! It will appear on the dashboard once analysed.")
                     except Exception as e:
                         st.error(f"⚠️ Error processing complaint: {str(e)}")
             else:
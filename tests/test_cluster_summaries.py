@@ -0,0 +1,34 @@
+from mongodb.cluster_summaries import cluster_fingerprint, match_cluster_summaries
+
+
+def entry(members, name):
+    members = [str(m) for m in members]
+    return {"_id": cluster_fingerprint(members), "member_ids": members, "cluster_name": name}
+
+
+def overlaps(matches):
+    return {label: (e["cluster_name"], round(overlap, 3)) for label, (e, overlap) in matches.items()}
+
+
+def test_overlap_threshold_is_inclusive():
+    cached = [entry(range(8), "eight")]
+    assert overlaps(match_cluster_summaries({0: range(10)}, cached, 0.8)) == {0: ("eight", 0.8)}
+    assert match_cluster_summaries({0: range(11)}, cached, 0.8) == {}
+
+
+def test_exact_membership_matches_by_fingerprint():
+    cached = [entry([3, 1, 2], "same")]
+    assert overlaps(match_cluster_summaries({5: [1, 2, 3]}, cached, 0.99)) == {5: ("same", 1.0)}
+
+
+def test_overlap_counts_members_shared_by_cached_entries():
+    # A reused entry may keep members that another entry also holds.
+    cached = [entry(range(10), "ten"), entry(range(9), "nine")]
+    matches = match_cluster_summaries({0: range(11), 1: range(1, 9)}, cached, 0.8)
+    assert overlaps(matches) == {0: ("ten", 0.909), 1: ("nine", 0.889)}
+
+
+def test_each_entry_is_used_once_best_overlap_first():
+    cached = [entry(range(10), "ten")]
+    matches = match_cluster_summaries({0: range(9), 1: range(10)}, cached, 0.5)
+    assert overlaps(matches) == {1: ("ten", 1.0)}
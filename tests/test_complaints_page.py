@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from mongodb import handlers
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = mongomock.MongoClient().db.complaints
+    monkeypatch.setattr(handlers, "complaints_collection", collection)
+    return collection
+
+
+def all_pages(sort_field: str, page_size: int) -> list:
+    ids, cursor = [], None
+    while True:
+        page = handlers.get_complaints_page("closed", sort_field, page_size, after=cursor)
+        ids.extend(c["_id"] for c in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_pages_cover_equal_and_missing_sort_keys_once(collection):
+    start = datetime(2025, 1, 1)
+    docs = []
+    for i in range(17):
+        doc = {"status": "closed", "resident_name": f"R{i}", "description": "d"}
+        if i % 4:
+            doc["resolved_at"] = start + timedelta(days=i % 3)  # many ties
+        docs.append(doc)
+    collection.insert_many(docs)
+    collection.insert_one({"status": "open", "resolved_at": start})
+
+    expected = [
+        d["_id"] for d in sorted(
+            docs, key=lambda d: (d.get("resolved_at") is not None, d.get("resolved_at") or start, d["_id"]),
+            reverse=True
+        )
+    ]
+    for page_size in (1, 3, 5, 17):
+        assert all_pages("resolved_at", page_size) == expected
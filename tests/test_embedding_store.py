@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from mongodb import embedding_store
+from mongodb.embedding_store import EmbeddingStore
+
+mongomock = pytest.importorskip("mongomock")
+
+DIMS = 8
+START = datetime(2025, 1, 1)
+
+
+def make_collection(n: int, dims: int = DIMS):
+    collection = mongomock.MongoClient().db.complaints
+    rng = np.random.default_rng(0)
+    collection.insert_many([
+        {
+            "embedding": rng.standard_normal(dims).tolist(),
+            "status": "open",
+            "block": f"B{i % 3}",
+            "updated_at": START + timedelta(seconds=i),
+            "embedding_updated_at": START + timedelta(seconds=i)
+        }
+        for i in range(n)
+    ])
+    return collection
+
+
+def test_sync_applies_updates_and_deletions(tmp_path):
+    collection = make_collection(20)
+    store = EmbeddingStore(tmp_path)
+    assert store.sync(collection)["written"] == 20
+
+    doc = collection.find_one({"block": "B1"})
+    collection.update_one({"_id": doc["_id"]}, {"$set": {"status": "closed", "updated_at": START + timedelta(days=1)}})
+    removed = collection.find_one({"block": "B2"})
+    collection.delete_one({"_id": removed["_id"]})
+
+    result = store.sync(collection)
+    assert (result["written"], result["removed"], result["updated"]) == (0, 1, 1)
+    assert store.metadata([doc["_id"]])[str(doc["_id"])]["status"] == "closed"
+    assert store.get(removed["_id"]) is None
+
+    reopened = EmbeddingStore(tmp_path)
+    assert reopened.stats()["rows"] == 19
+    assert reopened.metadata([doc["_id"]])[str(doc["_id"])]["status"] == "closed"
+    expected = np.asarray(doc["embedding"], dtype=np.float32)
+    assert np.allclose(reopened.get(doc["_id"]), expected / np.linalg.norm(expected), atol=1e-6)
+
+
+def test_reconcile_loads_documents_the_watermark_missed(tmp_path):
+    collection = make_collection(10)
+    store = EmbeddingStore(tmp_path)
+    store.sync(collection)
+    late = make_collection(1).find_one()
+    late["updated_at"] = late["embedding_updated_at"] = START - timedelta(days=1)
+    collection.insert_one(late)
+
+    assert store.sync(collection)["written"] == 1
+    assert store.get(late["_id"]) is not None
+
+
+def test_compaction_keeps_live_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_store, "MIN_CAPACITY", 4)
+    collection = make_collection(12)
+    store = EmbeddingStore(tmp_path)
+    store.sync(collection)
+    before = dict(zip(*store.vectors()))
+
+    gone = [d["_id"] for d in collection.find({"block": {"$ne": "B0"}})]
+    collection.delete_many({"_id": {"$in": gone}})
+    assert store.sync(collection)["removed"] == len(gone)
+
+    assert store.stats()["deleted"] == 0
+    assert len(list(tmp_path.glob(embedding_store.VECTORS_GLOB))) == 1
+    ids, X = EmbeddingStore(tmp_path).vectors()
+    assert len(ids) == 4
+    for complaint_id, vector in zip(ids, X):
+        assert np.array_equal(vector, before[complaint_id])
+
+
+def test_other_dimensions_do_not_trigger_reconcile(tmp_path, monkeypatch):
+    collection = make_collection(5)
+    store = EmbeddingStore(tmp_path)
+    store.sync(collection)
+    collection.insert_one({"embedding": [1.0, 0.0], "status": "open", "block": "B0",
+                           "updated_at": START, "embedding_updated_at": START})
+
+    calls = []
+    reconcile = store._reconcile
+    monkeypatch.setattr(store, "_reconcile", lambda c: calls.append(1) or reconcile(c))
+    store.sync(collection)
+    store.sync(collection)
+    assert calls == []
+    assert store.stats()["rows"] == 5
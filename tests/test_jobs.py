@@ -0,0 +1,55 @@
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from mongodb import jobs
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture(autouse=True)
+def collections(monkeypatch):
+    db = mongomock.MongoClient().db
+    monkeypatch.setattr(jobs, "jobs_collection", db.jobs)
+    monkeypatch.setattr(jobs, "job_locks_collection", db.job_locks)
+    return db
+
+
+def test_lock_is_exclusive_until_released():
+    first, second = ObjectId(), ObjectId()
+    assert jobs._acquire_lock("clustering", first)
+    assert not jobs._acquire_lock("clustering", second)
+    jobs._release_lock("clustering", first)
+    assert jobs._acquire_lock("clustering", second)
+
+
+def test_expired_lock_is_taken_over_and_heartbeat_needs_the_holder(collections):
+    stale, fresh = ObjectId(), ObjectId()
+    assert jobs._acquire_lock("clustering", stale)
+    collections.job_locks.update_one({"_id": "clustering"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert jobs._acquire_lock("clustering", fresh)
+
+    jobs._refresh_lock("clustering", stale)
+    lock = collections.job_locks.find_one({"_id": "clustering"})
+    assert lock["job_id"] == fresh
+    assert lock["expires_at"] > datetime.utcnow()
+
+
+def test_worker_that_dies_fails_the_job(collections, tmp_path):
+    job_id = ObjectId()
+    assert jobs._acquire_lock("clustering", job_id)
+    collections.jobs.insert_one({"_id": job_id, "type": "clustering", "state": "queued"})
+    log_path = tmp_path / "worker.log"
+    with open(log_path, "wb") as log_file:
+        worker = subprocess.Popen([sys.executable, "-c", "import missing_module"],
+                                  stdout=log_file, stderr=subprocess.STDOUT)
+
+    jobs._watch_worker("clustering", job_id, worker, log_path)
+    job = collections.jobs.find_one({"_id": job_id})
+    assert job["state"] == "failed"
+    assert "missing_module" in job["error"]
+    assert job["message"].startswith("Worker exited with code 1")
+    assert jobs.get_running_job("clustering") is None
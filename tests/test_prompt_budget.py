@@ -0,0 +1,14 @@
+from llm.prompt_budget import select_representative
+
+
+def test_near_duplicates_are_skipped():
+    descriptions = ["Leaking tap", "Tap is leaking", "Broken lift"]
+    embeddings = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]]
+    assert select_representative(descriptions, embeddings) == ["Tap is leaking", "Broken lift"]
+
+
+def test_ragged_embeddings_fall_back_to_unembedded():
+    descriptions = ["Leaking tap", "Tap is leaking", "Broken lift", "No water"]
+    embeddings = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0], [1.0, 0.0, 0.0, 0.0]]
+    selected = select_representative(descriptions, embeddings)
+    assert selected == ["Tap is leaking", "Broken lift", "No water"]
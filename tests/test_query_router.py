@@ -0,0 +1,22 @@
+from llm.query_router import parse_query, extract_block
+
+
+def test_aggregate_questions_are_routed():
+    parsed = parse_query("How many open complaints in B3?")
+    assert parsed["intent"] == "count"
+    assert parsed["filters"] == {"block": ["B3"], "status": ["open", "pending"]}
+
+    parsed = parse_query("Which block has the most open complaints?")
+    assert parsed["intent"] == "top"
+    assert parsed["group_by"] == "block"
+
+
+def test_unrecognised_constraint_falls_back_to_retrieval():
+    assert parse_query("How many complaints did Rahul file?") is None
+    assert parse_query("How many complaints in the last 7 days?") is None
+
+
+def test_bare_block_names_must_be_known_blocks():
+    assert extract_block("Is Vitamin B12 deficiency reported in the hostel?") is None
+    assert extract_block("Water leak in B3") == "B3"
+    assert extract_block("Water leak in block a2") == "A2"
@@ -0,0 +1,29 @@
+import numpy as np
+
+from mongodb.vector_index import IVFIndex, normalize_rows
+
+
+def vectors(n: int, dims: int = 16, seed: int = 0) -> np.ndarray:
+    return normalize_rows(np.random.default_rng(seed).standard_normal((n, dims)))
+
+
+def test_probing_every_list_is_exact():
+    X = vectors(300)
+    ids = [f"c{i}" for i in range(len(X))]
+    index = IVFIndex(n_lists=10, n_probe=10).build(ids, X)
+    for q in range(0, 300, 37):
+        expected = [ids[i] for i in np.argsort(-(X @ X[q]))[1:6]]
+        assert [item_id for item_id, _ in index.search(X[q], 5, exclude=ids[q])] == expected
+
+
+def test_add_and_remove_reuse_rows():
+    X = vectors(50)
+    index = IVFIndex(n_lists=4, n_probe=4).build([f"c{i}" for i in range(40)], X[:40])
+    assert index.remove("c3") and not index.remove("c3")
+    index.add("new", X[45])
+    assert len(index) == 40 and "c3" not in index
+    assert index.search(X[45], 1)[0][0] == "new"
+    for i in range(40, 45):
+        index.add(f"c{i}", X[i])
+    assert index.search(X[44], 1)[0][0] == "c44"
+    assert "c3" not in [item_id for item_id, _ in index.search(X[3], 40)]